@@ -0,0 +1,85 @@
+import socket
+import struct
+
+"""
+本文件负责紧凑地址块 (Address Block) 的打包和解包，以及地址字符串的驻留 (intern)
+同一个网段的地址前几个字节相同，只写一次公共前缀，每个地址只写剩下的后缀:
+    Count(2B) + Head Length(1B) + Head(Head Length 字节) + Count 个后缀(每个 4 - Head Length 字节)
+部署中全部节点在同一个 /24 (10.0.0.x)，N 个地址从 4N 字节缩小到 3 + 3 + N 字节
+HELLO/TC 通过 Reserved 字段里的标志位表示消息体使用了地址块，见 constants.py
+"""
+
+ADDRESS_BLOCK_HEADER_SIZE = 3
+ADDRESS_CACHE_MAX = 65536
+
+# 4 字节地址 -> 驻留后的地址字符串，同一个地址在各个表里共用同一个对象，解析时也省去 inet_ntoa
+_address_cache = {}
+
+
+def address_from_bytes(addr_bytes):
+    """把 4 字节地址转换为驻留的地址字符串"""
+    ip_str = _address_cache.get(addr_bytes)
+    if ip_str is None:
+        if len(_address_cache) >= ADDRESS_CACHE_MAX:
+            # 正常网络里地址数量有限，超过上限说明收到了大量异常地址，直接清空防止无限增长
+            _address_cache.clear()
+        ip_str = _address_cache[bytes(addr_bytes)] = socket.inet_ntoa(addr_bytes)
+    return ip_str
+
+
+def common_head_length(packed_addresses):
+    """计算所有地址公共前缀的字节数 (0 ~ 3，至少留一个字节区分地址)"""
+    if not packed_addresses:
+        return 0
+    first = packed_addresses[0]
+    head_len = 3
+    for packed in packed_addresses[1:]:
+        while head_len and packed[:head_len] != first[:head_len]:
+            head_len -= 1
+        if not head_len:
+            break
+    return head_len
+
+
+def create_address_block(ip_list):
+    """
+    把地址列表打包成地址块
+    :param ip_list: list of IP strings
+    """
+    packed_addresses = [socket.inet_aton(ip_str) for ip_str in ip_list]
+    head_len = common_head_length(packed_addresses)
+    head = packed_addresses[0][:head_len] if packed_addresses else b''
+    return (
+        struct.pack('!HB', len(packed_addresses), head_len)
+        + head
+        + b''.join(packed[head_len:] for packed in packed_addresses)
+    )
+
+
+def address_block_size(count, head_len):
+    return ADDRESS_BLOCK_HEADER_SIZE + head_len + count * (4 - head_len)
+
+
+def parse_address_block(data, offset=0):
+    """
+    从 data[offset:] 解析一个地址块
+    :return: ([ip_str, ...], 地址块之后的偏移)，数据不完整时返回 None
+    """
+    if len(data) - offset < ADDRESS_BLOCK_HEADER_SIZE:
+        return None
+    count, head_len = struct.unpack('!HB', data[offset : offset + ADDRESS_BLOCK_HEADER_SIZE])
+    if head_len > 3:
+        return None
+    end = offset + address_block_size(count, head_len)
+    if end > len(data):
+        return None
+
+    cursor = offset + ADDRESS_BLOCK_HEADER_SIZE
+    head = bytes(data[cursor : cursor + head_len])
+    cursor += head_len
+    suffix_len = 4 - head_len
+    ip_list = [
+        address_from_bytes(head + data[pos : pos + suffix_len])
+        for pos in range(cursor, end, suffix_len)
+    ]
+    return ip_list, end
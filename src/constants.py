@@ -15,6 +15,112 @@ TC_INTERVAL      = 5            # —— 发送TC（拓扑控制）消息的默
 MID_INTERVAL     = TC_INTERVAL  # 等同于 TC_INTERVAL (5秒) 
 HNA_INTERVAL     = TC_INTERVAL  # 等同于 TC_INTERVAL (5秒) 
 
+# 触发式发送 (Triggered Emission):
+HELLO_MIN_INTERVAL = 0.5        # —— 两次 HELLO 之间的最小间隔，防止状态抖动引发广播风暴
+TC_MIN_INTERVAL    = 1.0        # —— 两次 TC 之间的最小间隔
+TRIGGER_JITTER     = 0.25       # —— 触发式发送前附加的随机抖动上限（秒）
+
+# 自适应发射间隔 (Adaptive Emission):
+# 启动和状态变化后从 *_MIN_INTERVAL 开始，状态稳定时每次乘以 INTERVAL_BACKOFF，直到 *_MAX_INTERVAL
+HELLO_MAX_INTERVAL = 2 * HELLO_INTERVAL  # —— HELLO 退避上限 (4秒)
+TC_MAX_INTERVAL    = 2 * TC_INTERVAL     # —— TC 退避上限 (10秒)
+INTERVAL_BACKOFF   = 2.0                 # —— 每轮稳定后的间隔放大倍数
+HOLD_TIME_FACTOR   = 3                   # —— 宣告的 Vtime = 该倍数 * 接收方可能等待的最长间隔
+
+# Fish-eye TC 作用域:
+# 依次使用序列中的 TTL 发送 TC，近处节点每轮都能收到，远处节点只在 TTL=255 的那一轮收到
+TC_FISHEYE_TTLS  = (2, 4, 255)
+TC_DEFAULT_TTL   = 255
+
+# TC 冗余度 (RFC 3626 Section 15.1 TC_REDUNDANCY):
+TC_REDUNDANCY_SELECTORS = 0  # —— 只宣告 MPR Selector（默认）
+TC_REDUNDANCY_MPRS      = 1  # —— 宣告 MPR Selector + 自己选出的 MPR
+TC_REDUNDANCY_ALL       = 2  # —— 宣告全部对称邻居
+TC_REDUNDANCY = TC_REDUNDANCY_SELECTORS
+
+# 增量 TC (Delta TC):
+# TC 的 Reserved 字段置 TC_FLAG_DELTA 时，消息体只携带相对最近一次完整 TC (Base ANSN) 的新增和删除
+# 每发 TC_FULL_EVERY 个 TC 至少有一个完整 TC，供错过基准的节点重新同步
+TC_FLAG_DELTA = 0x0001
+TC_FULL_EVERY = 4
+
+# 紧凑地址编码 (Compact Address Block):
+# HELLO 的 Reserved 字段宣告本节点能解析地址块；所有链路邻居都宣告了这个能力后才发送紧凑 HELLO/TC
+# 转发紧凑 TC 时只要有一个邻居不支持，就先转换回普通编码再转发
+HELLO_FLAG_COMPACT_CAPABLE = 0x0001
+HELLO_FLAG_COMPACT         = 0x0002
+TC_FLAG_COMPACT            = 0x0002
+
+# 抖动 (RFC 5148 Jitter):
+MAXJITTER_FRACTION = 0.25   # —— 周期消息提前发送的最大抖动 = 发射间隔 * 该比例 (RFC 5148 Section 5.4 建议 interval/4)
+FORWARD_MAX_JITTER = 0.1    # —— 转发消息重传前的最大随机等待（秒），期间到达的待转发消息合并到同一个包
+MAX_PACKET_SIZE    = 1472   # —— 单个 OLSR 包的上限: 1500 MTU - 20 IP - 8 UDP
+
+# 分片 (Fragmentation):
+PACKET_HEADER_SIZE  = 4                                  # —— Packet Header 长度
+MESSAGE_HEADER_SIZE = 12                                 # —— Message Header 长度
+MAX_MESSAGE_BODY    = MAX_PACKET_SIZE - PACKET_HEADER_SIZE - MESSAGE_HEADER_SIZE  # —— 单条消息体的上限，超过则拆成多条 HELLO/TC
+MAX_RECV_SIZE       = 65535                              # —— Packet Length 字段为 16 位，合法包最大 65535 字节
+
+# 数据面反馈探测 (Link Probing):
+# 转发程序报告某个下一跳连续发送/ACK 失败后，立即向该邻居单播 PROBE，全部尝试都没有回应则立刻判定链路断开
+PROBE_TIMEOUT  = 0.2   # —— 单次 PROBE 等待 PROBE_REPLY 的时间（秒）
+PROBE_ATTEMPTS = 3     # —— 判定链路断开前的 PROBE 尝试次数
+
+# BFD 风格的存活检测 (Liveness Probing):
+# 只对活跃路由的下一跳按固定间隔发送 PROBE，连续丢失 LIVENESS_MISS_THRESHOLD 个回应立即将链路降为非对称
+LIVENESS_PROBE_INTERVAL = 0.1   # —— 探测间隔（秒），建议 0.05 ~ 0.2，0 表示关闭
+LIVENESS_MISS_THRESHOLD = 3     # —— 连续未回应的轮数阈值
+ACTIVE_ROUTE_TIMEOUT    = 5.0   # —— 转发程序最近这么多秒内查询过的路由视为活跃
+
+# 加入时的拓扑同步 (Topology Sync):
+# 邻居刚变为对称时向它请求整个拓扑集，不必等每个源节点的下一轮 TC 洪泛经过
+TOPO_SYNC_HOLDOFF = TC_INTERVAL  # —— 两次拓扑请求之间的最小间隔（秒），避免多个邻居同时对称时重复拉取
+
+# 热重启快照 (Warm Restart):
+SNAPSHOT_INTERVAL    = 5.0   # —— 状态快照的写入间隔（秒）
+SNAPSHOT_SEQ_MARGIN  = 1000  # —— 加载快照时消息/包序列号的前跳余量，覆盖上次快照之后发出的消息
+SNAPSHOT_ANSN_MARGIN = 100   # —— 加载快照时 ANSN 的前跳余量
+
+# 日志 (Logging):
+# 协议路径上只把日志记录追加到环形缓冲区，由后台线程格式化并写出
+LOG_DEFAULT_LEVEL  = "info"  # —— 默认级别，逐条消息的日志 (转发/HELLO/MPR 重算/完整路由表) 都是 debug
+LOG_RING_SIZE      = 8192    # —— 环形缓冲区容量（条），写线程来不及取走的旧记录会被丢弃
+LOG_FLUSH_INTERVAL = 0.2     # —— 写线程的刷新间隔（秒），warning 及以上立即唤醒
+
+# 控制端口 (Control Port):
+CONTROL_API_VERSION  = 2      # —— 结构化 (JSON) 控制协议的版本号，请求里的 "v" 必须与之相同
+MAX_CONTROL_RESPONSE = 65507  # —— 单个 UDP 响应的上限，超过时返回错误而不是发送失败
+CONTROL_UNIX_BACKLOG = 16     # —— Unix 控制端点 (--control-unix) 的待接受连接队列长度
+CONTROL_PAGE_MAX     = 1000   # —— 分页查询 (limit/cursor) 单页行数上限
+CONTROL_STREAM_CHUNK = 8192   # —— 流式回应每个报文的字节上限，不超过客户端最小的接收缓冲 (recvfrom(8192))
+
+# 共享内存路由表 (Route Table Export):
+ROUTE_SHM_CAPACITY = 4096     # —— 导出的路由条数上限 (主机路由 + 前缀路由)，文件大小 64 + 16 * 该值字节
+ROUTE_SHM_STALE_AFTER = 9 * REFRESH_INTERVAL  # —— 心跳超过该时间 (3 倍邻居保持时间) 未刷新时读者视为守护进程已退出，回退到控制端口
+
+# 路由变化订阅 (Route Subscription):
+# 订阅者在租期内收到每次路由表变化的推送，客户端每 1/3 租期续订一次
+ROUTE_SUBSCRIPTION_LEASE = 30.0  # —— 订阅租期上限（秒）
+ROUTE_SUBSCRIBERS_MAX    = 64    # —— 同时订阅的客户端数上限
+
+# 等待路由 (Route Wait):
+# WAIT_ROUTE 请求在没有路由时挂起，路由表装入该目的地址的路由时立即回应，超时则回应未找到
+ROUTE_WAIT_MAX_TIMEOUT = 60.0  # —— 单个请求的最长等待（秒）
+ROUTE_WAITS_MAX        = 256   # —— 同时挂起的请求数上限
+
+# 事件延迟跟踪 (Event Latency):
+# HELLO/TC 从收到到解析、状态更新、MPR 重算、路由重算各阶段的耗时，保留最近若干条用于分位数和明细
+EVENT_TRACE_RECENT = 1024  # —— 每种消息保留的最近事件数
+
+# 性能剖析 (Profiling):
+# 控制命令按需开启 cProfile / tracemalloc / 线程栈采样，结果写入剖析目录下的文件
+PROFILE_DIR              = "/tmp"  # —— 结果文件目录，可用 --profile-dir 覆盖
+PROFILE_TOP_ENTRIES      = 15      # —— 回应里附带的热点条目数
+TRACEMALLOC_FRAMES       = 10      # —— tracemalloc 每次分配记录的栈深度
+STACK_SAMPLE_INTERVAL    = 0.01    # —— 线程栈采样间隔（秒）
+STACK_SAMPLE_MAX_SECONDS = 300.0   # —— 单次采样的最长时间（秒）
+
 # 保持时间 (Holding Times):
 NEIGHB_HOLD_TIME = 3 * REFRESH_INTERVAL # 邻居记录的有效期
 TOP_HOLD_TIME    = 3 * TC_INTERVAL      # 拓扑信息的有效期
@@ -28,6 +134,10 @@ TC_MESSAGE    = 2
 MID_MESSAGE   = 3
 HNA_MESSAGE   = 4
 DATA_MESSAGE  = 5  # 新增数据消息类型
+PROBE_MESSAGE       = 6  # 单播链路探测，只在一跳内使用，不转发
+PROBE_REPLY_MESSAGE = 7  # 对 PROBE 的回应
+TOPO_REQUEST_MESSAGE = 8 # 向新的对称邻居请求拓扑集，只在一跳内单播
+TOPO_DUMP_MESSAGE    = 9 # 对 TOPO_REQUEST 的回应，携带拓扑集和 ANSN
 
 # Link Types
 UNSPEC_LINK = 0
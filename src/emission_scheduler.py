@@ -0,0 +1,32 @@
+# src/emission_scheduler.py
+"""
+自适应发射间隔：启动阶段和拓扑变化后快速发送，状态稳定后指数退避到上限。
+
+发送方每发一条消息前调用 advance() 得到本轮等待的间隔；
+宣告给接收方的 Vtime 必须覆盖下一轮可能被放大后的间隔，否则退避期间接收方会提前把记录判为过期。
+"""
+
+from constants import HOLD_TIME_FACTOR, INTERVAL_BACKOFF
+
+
+class AdaptiveInterval:
+    def __init__(self, min_interval, max_interval, backoff=INTERVAL_BACKOFF):
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.backoff = float(backoff)
+        self.current = self.min_interval
+
+    def reset(self):
+        """状态发生变化，回到最快的发射间隔"""
+        self.current = self.min_interval
+
+    def advance(self):
+        """返回本轮的发射间隔，并为下一轮做退避"""
+        interval = self.current
+        self.current = min(self.max_interval, self.current * self.backoff)
+        return interval
+
+    def hold_time(self, interval):
+        """以 interval 发送的消息应宣告的有效期 (Vtime)"""
+        longest_gap = min(self.max_interval, interval * self.backoff)
+        return HOLD_TIME_FACTOR * max(interval, longest_gap)
@@ -0,0 +1,76 @@
+# src/forward_scheduler.py
+"""
+转发消息的抖动与合并 (RFC 5148 Section 5/6)
+
+多个邻居同时收到同一条 TC 后如果立即重传，会在共享信道上同时发送而互相碰撞。
+这里每条待转发的消息先进入队列，队列在第一条消息入队时随机选定一个 [0, max_jitter] 内的发送时刻，
+在此期间到达的其他待转发消息都合并进同一个包，到时刻后一次性发出。
+本节点自己生成 HELLO/TC 时也可以把队列里的消息捎带出去 (piggyback)。
+"""
+
+import random
+
+from constants import FORWARD_MAX_JITTER, MAX_PACKET_SIZE, PACKET_HEADER_SIZE
+
+
+class ForwardQueue:
+    def __init__(self, max_jitter=FORWARD_MAX_JITTER, max_packet_size=MAX_PACKET_SIZE):
+        self.max_jitter = float(max_jitter)
+        self.max_packet_size = int(max_packet_size)
+        self.pending = []       # 待转发的完整消息 (Message Header + Body)
+        self.flush_at = None    # 本批消息的发送时刻
+
+    def push(self, msg_bytes, current_time):
+        """加入一条待转发消息，返回 True 表示这是新一批的第一条（需要唤醒发送线程）"""
+        self.pending.append(msg_bytes)
+        if self.flush_at is None:
+            self.flush_at = current_time + random.uniform(0.0, self.max_jitter)
+            return True
+        return False
+
+    def time_until_flush(self, current_time):
+        if self.flush_at is None:
+            return None
+        return max(0.0, self.flush_at - current_time)
+
+    def pop_due(self, current_time):
+        """到达发送时刻时，返回按包大小上限切分好的消息批次 [bytes, ...]"""
+        if self.flush_at is None or current_time < self.flush_at:
+            return []
+        return self.pack(self.take_all())
+
+    def take_all(self):
+        messages = self.pending
+        self.pending = []
+        self.flush_at = None
+        return messages
+
+    def take(self, budget):
+        """取出总长度不超过 budget 的消息，用于捎带在本节点自己的 HELLO/TC 之后"""
+        taken = []
+        remaining = []
+        for msg_bytes in self.pending:
+            if len(msg_bytes) <= budget:
+                taken.append(msg_bytes)
+                budget -= len(msg_bytes)
+            else:
+                remaining.append(msg_bytes)
+        self.pending = remaining
+        if not self.pending:
+            self.flush_at = None
+        return taken
+
+    def pack(self, messages):
+        batches = []
+        current = []
+        current_size = PACKET_HEADER_SIZE
+        for msg_bytes in messages:
+            if current and current_size + len(msg_bytes) > self.max_packet_size:
+                batches.append(b"".join(current))
+                current = []
+                current_size = PACKET_HEADER_SIZE
+            current.append(msg_bytes)
+            current_size += len(msg_bytes)
+        if current:
+            batches.append(b"".join(current))
+        return batches
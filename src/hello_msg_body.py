@@ -1,6 +1,11 @@
 import struct
 import socket
+from addr_block import address_from_bytes, create_address_block, parse_address_block
+from constants import HELLO_FLAG_COMPACT, HELLO_FLAG_COMPACT_CAPABLE
 from pkt_msg_fmt import encode_mantissa,decode_mantissa
+from olsr_log import get_logger
+
+_log = get_logger("packet")
 
 """
 本文件主要设计hello_body的打包和解包,也就是hello_info和hello_body的相互转换
@@ -8,6 +13,7 @@ hello_info的格式如下
 {
         "htime_seconds": 134,       # 原始编码的 Htime
         "willingness": 3,       # 节点的意愿值
+        "compact_capable": False,   # 发送方能否解析紧凑地址块 (可选)
         "neighbor_groups": [          # 解析出的所有邻居列表
             (link_code, ["0.0.0.1", "0.0.0.2"]),
             (link_code, [ip_list]),
@@ -15,14 +21,16 @@ hello_info的格式如下
         ]
 }
 hello_body的格式则比较复杂  会在笔记中用图来表示
+紧凑编码时 Reserved 置 HELLO_FLAG_COMPACT，每个 Link Message 的地址列表换成一个地址块 (见 addr_block.py)
 """
 
 
 #打包 HELLO msg body
-def create_hello_body(hello_info):
+def create_hello_body(hello_info, compact=False):
     """
     构造 HELLO 消息体
     :param neighbor_groups: 列表，每个元素是一个元组 (link_code, [ip_list])
+    :param compact: 地址列表使用紧凑地址块编码
     """
     # 从字典中“解包”，变量名保持不变
     htime_seconds = hello_info["htime_seconds"]
@@ -33,14 +41,24 @@ def create_hello_body(hello_info):
 
     # 1. 固定头部 (4字节)
     # Reserved (2B) + Htime (1B) + Willingness (1B)
-    # RFC 6.1: Reserved must be 0
+    # RFC 6.1: Reserved must be 0，这里只用作紧凑编码的能力/编码标志，不支持的节点会忽略
+    flags = 0
+    if hello_info.get("compact_capable"):
+        flags |= HELLO_FLAG_COMPACT_CAPABLE
+    if compact:
+        flags |= HELLO_FLAG_COMPACT
     htime_byte = encode_mantissa(htime_seconds)
-    fixed_part = struct.pack('!HBB', 0, htime_byte, willingness)
+    fixed_part = struct.pack('!HBB', flags, htime_byte, willingness)
     
     link_messages_part = b''
     
     # 2. 遍历邻居组，打包每个 Link Message
     for link_code, ip_list_strings in neighbor_groups:
+        if compact:
+            block = create_address_block(ip_list_strings)
+            link_messages_part += struct.pack('!BBH', link_code, 0, 4 + len(block)) + block
+            continue
+
         # 计算当前 Link Message 的大小
         # Link Code(1) + Reserved(1) + Size(2) + N * IP(4)
         # linkcode = 0000+neighbortype+linktype 包含邻居节点类型的信息和链路类型的信息
@@ -59,6 +77,41 @@ def create_hello_body(hello_info):
 
     return fixed_part + link_messages_part #也就是hello_body
 
+def create_hello_bodies(hello_info, max_body_size, compact=False):
+    """
+    按 max_body_size 把 HELLO 拆成多个消息体 (邻居很多时避免超过 MTU 被 IP 层分片)
+    每个分片都带完整的固定头部，同一个 link_code 的邻居组可以跨分片拆开；
+    接收方对每个分片独立处理，链路/二跳/MPR Selector 的更新都只会增加或刷新记录，因此分片之间互不影响
+    分片按普通编码的大小计算，紧凑编码的分片只会更小
+    :return: [hello_body, ...]，至少包含一个消息体
+    """
+    groups_per_body = []
+    current_groups = []
+    current_size = 4  # Reserved + Htime + Willingness
+
+    for link_code, ip_list_strings in hello_info.get("neighbor_groups", []):
+        remaining = list(ip_list_strings)
+        while remaining:
+            room = (max_body_size - current_size - 4) // 4
+            if room <= 0:
+                groups_per_body.append(current_groups)
+                current_groups = []
+                current_size = 4
+                continue
+            chunk, remaining = remaining[:room], remaining[room:]
+            current_groups.append((link_code, chunk))
+            current_size += 4 + len(chunk) * 4
+
+    if current_groups or not groups_per_body:
+        groups_per_body.append(current_groups)
+
+    bodies = []
+    for groups in groups_per_body:
+        fragment_info = dict(hello_info)
+        fragment_info["neighbor_groups"] = groups
+        bodies.append(create_hello_body(fragment_info, compact))
+    return bodies
+
 # 解包 HELLO msg body
 
 
@@ -79,7 +132,7 @@ def parse_hello_body(hello_body):
     """
     # 检查长度：至少要有 Reserved(2) + Htime(1) + Willingness(1) = 4字节
     if len(hello_body) < 4:
-        print("Error: HELLO body too short")
+        _log.warning("HELLO body too short")
         return None
         
     # --- 1. 解析固定头部 ---
@@ -93,8 +146,10 @@ def parse_hello_body(hello_body):
     hello_info = {
         "htime_seconds": htime_seconds,
         "willingness": willingness,
+        "compact_capable": bool(reserved & HELLO_FLAG_COMPACT_CAPABLE),
         "neighbor_groups": []  # 存放 (link_code, [ip_list])
     }
+    compact = bool(reserved & HELLO_FLAG_COMPACT)
     
     cursor = 4
     
@@ -118,11 +173,17 @@ def parse_hello_body(hello_body):
         # 计算当前 Link Message 的结束位置
         end_of_lm = cursor + lm_size
         ip_cursor = cursor + 4
-        
-        while ip_cursor + 4 <= end_of_lm:
+
+        if compact:
+            parsed = parse_address_block(hello_body[:end_of_lm], ip_cursor)
+            if parsed is None:
+                break
+            current_ip_list = parsed[0]
+
+        while not compact and ip_cursor + 4 <= end_of_lm:
             # 提取 IP
             ip_bytes = hello_body[ip_cursor : ip_cursor+4]
-            ip_str = socket.inet_ntoa(ip_bytes)
+            ip_str = address_from_bytes(ip_bytes)
             current_ip_list.append(ip_str)
             ip_cursor += 4
             
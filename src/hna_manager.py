@@ -0,0 +1,69 @@
+import time
+
+from olsr_log import get_logger
+
+_log = get_logger("hna")
+
+
+class HNATuple:
+    def __init__(self, gateway_addr, network_addr, prefix_len):
+        self.gateway_addr = gateway_addr  # 宣告该网段的网关主地址 (A_gateway_addr)
+        self.network_addr = network_addr  # 网段地址 (A_network_addr)
+        self.prefix_len = prefix_len      # 前缀长度 (由 A_netmask 换算)
+        self.expiration_time = 0          # 过期时间 (A_time)
+
+
+class HNAManager:
+    """
+    主机与网络关联集 (Association Set, RFC 3626 Section 12.5)
+    网关通过 HNA 宣告自己连接的外部网段，路由计算时每个网段只生成一条前缀路由
+    """
+
+    def __init__(self, my_ip):
+        self.my_ip = my_ip
+        # 格式: { (gateway_addr, network_addr, prefix_len): HNATuple }
+        self.association_set = {}
+        # 按网段建立的索引，路由计算时直接在候选网关中选最近的一个
+        # 格式: { (network_addr, prefix_len): {gateway_addr, ...} }
+        self.gateways_by_prefix = {}
+
+    def _remove_tuple(self, key):
+        a_tuple = self.association_set.pop(key, None)
+        if a_tuple is None:
+            return
+        prefix = (a_tuple.network_addr, a_tuple.prefix_len)
+        gateways = self.gateways_by_prefix.get(prefix)
+        if gateways is not None:
+            gateways.discard(a_tuple.gateway_addr)
+            if not gateways:
+                del self.gateways_by_prefix[prefix]
+
+    def process_hna_message(self, originator_ip, hna_info, validity_time, current_time):
+        """
+        处理 HNA 消息 (RFC 3626 Section 12.5)
+        :return: 关联集是否发生变化，变化时需要重算路由
+        """
+        if originator_ip == self.my_ip:
+            return False
+        changed = False
+        expiration_time = current_time + validity_time
+        for network_addr, prefix_len in hna_info['networks']:
+            key = (originator_ip, network_addr, prefix_len)
+            a_tuple = self.association_set.get(key)
+            if a_tuple is None:
+                a_tuple = HNATuple(originator_ip, network_addr, prefix_len)
+                self.association_set[key] = a_tuple
+                self.gateways_by_prefix.setdefault((network_addr, prefix_len), set()).add(originator_ip)
+                _log.info("网关 %s 宣告网段 %s/%s", originator_ip, network_addr, prefix_len)
+                changed = True
+            a_tuple.expiration_time = expiration_time
+        return changed
+
+    def cleanup(self):
+        """清理过期网段关联，返回是否有记录被删除"""
+        now = time.time()
+        keys_to_remove = [k for k, v in self.association_set.items() if v.expiration_time < now]
+        for k in keys_to_remove:
+            _log.info("网关 %s 的网段 %s/%s 已过期", k[0], k[1], k[2])
+            self._remove_tuple(k)
+        return bool(keys_to_remove)
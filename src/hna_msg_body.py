@@ -0,0 +1,65 @@
+import socket
+import struct
+from olsr_log import get_logger
+
+_log = get_logger("packet")
+
+"""
+本文件负责 HNA (Host and Network Association) 消息体的打包和解包 (RFC 3626 Section 12.1)
+HNA 消息体由若干个 (Network Address(4B), Netmask(4B)) 组成，网关用它宣告自己连接的外部网段
+hna_info 的格式如下
+{
+        "networks": [("192.168.10.0", 24), (network_ip, prefix_len), ...]
+}
+报文里按 RFC 使用 4 字节掩码，内部统一使用前缀长度
+"""
+
+
+def prefix_len_to_netmask(prefix_len):
+    mask = (0xFFFFFFFF << (32 - int(prefix_len))) & 0xFFFFFFFF if prefix_len else 0
+    return socket.inet_ntoa(struct.pack('!I', mask))
+
+
+def netmask_to_prefix_len(netmask):
+    mask = struct.unpack('!I', socket.inet_aton(netmask))[0]
+    # 非连续掩码按前导 1 的个数处理
+    prefix_len = 0
+    while prefix_len < 32 and mask & (0x80000000 >> prefix_len):
+        prefix_len += 1
+    return prefix_len
+
+
+def normalize_network(network_ip, prefix_len):
+    """把主机位清零，例如 ("192.168.10.7", 24) -> "192.168.10.0" """
+    value = struct.unpack('!I', socket.inet_aton(network_ip))[0]
+    mask = (0xFFFFFFFF << (32 - int(prefix_len))) & 0xFFFFFFFF if prefix_len else 0
+    return socket.inet_ntoa(struct.pack('!I', value & mask))
+
+
+def create_hna_body(networks):
+    """
+    构造 HNA 消息体
+    :param networks: [(network_ip, prefix_len), ...]
+    """
+    parts = []
+    for network_ip, prefix_len in networks:
+        try:
+            parts.append(socket.inet_aton(network_ip))
+            parts.append(socket.inet_aton(prefix_len_to_netmask(prefix_len)))
+        except OSError:
+            _log.error("HNA 打包失败，非法网段: %s/%s", network_ip, prefix_len)
+    return b''.join(parts)
+
+
+def parse_hna_body(hna_body):
+    """
+    解析 HNA 消息体
+    :return: {'networks': [(network_ip, prefix_len), ...]}
+    """
+    networks = []
+    end = len(hna_body) // 8 * 8
+    for cursor in range(0, end, 8):
+        prefix_len = netmask_to_prefix_len(socket.inet_ntoa(hna_body[cursor+4 : cursor+8]))
+        network_ip = normalize_network(socket.inet_ntoa(hna_body[cursor : cursor+4]), prefix_len)
+        networks.append((network_ip, prefix_len))
+    return {'networks': networks}
@@ -0,0 +1,158 @@
+import struct
+
+from constants import PROBE_ATTEMPTS, PROBE_TIMEOUT
+
+"""
+本文件负责单播链路探测 (PROBE / PROBE_REPLY)
+消息体只有一个 4 字节的 Probe ID，PROBE_REPLY 原样带回，用于匹配请求
+HELLO 要等 NEIGHB_HOLD_TIME 过期才能发现邻居消失，探测在转发程序报告失败后立即确认链路是否还在
+"""
+
+
+def create_probe_body(probe_id):
+    return struct.pack("!I", probe_id & 0xFFFFFFFF)
+
+
+def parse_probe_body(probe_body):
+    if len(probe_body) < 4:
+        return None
+    return struct.unpack("!I", probe_body[:4])[0]
+
+
+class ProbeState:
+    def __init__(self, target_ip, probe_id, reason, started_at):
+        self.target_ip = target_ip  # 被探测的邻居接口地址
+        self.probe_id = probe_id
+        self.reason = reason        # 探测原因，例如 "report"
+        self.started_at = started_at
+        self.attempts = 0
+        self.deadline = 0
+
+
+class ProbeManager:
+    def __init__(self, timeout=PROBE_TIMEOUT, attempts=PROBE_ATTEMPTS):
+        self.timeout = float(timeout)
+        self.attempts = int(attempts)
+        # 格式: { target_ip: ProbeState }，每个邻居同时最多一个进行中的探测
+        self.pending = {}
+        self.next_probe_id = 0
+
+        self.probes_sent = 0
+        self.probe_replies = 0
+        self.probe_failures = 0
+
+    def start(self, target_ip, reason, current_time):
+        """开始探测，已有进行中的探测时返回 None"""
+        if target_ip in self.pending:
+            return None
+        self.next_probe_id = (self.next_probe_id + 1) & 0xFFFFFFFF
+        state = ProbeState(target_ip, self.next_probe_id, reason, current_time)
+        self.pending[target_ip] = state
+        return state
+
+    def on_sent(self, state, current_time):
+        state.attempts += 1
+        state.deadline = current_time + self.timeout
+        self.probes_sent += 1
+
+    def on_reply(self, target_ip, probe_id):
+        """收到 PROBE_REPLY，匹配成功返回对应的 ProbeState"""
+        state = self.pending.get(target_ip)
+        if state is None or state.probe_id != probe_id:
+            return None
+        del self.pending[target_ip]
+        self.probe_replies += 1
+        return state
+
+    def time_until_deadline(self, current_time):
+        if not self.pending:
+            return None
+        return min(state.deadline for state in self.pending.values()) - current_time
+
+    def pop_due(self, current_time):
+        """
+        取出已超时的探测
+        :return: (需要重发的 ProbeState 列表, 已用完尝试次数判定失败的 ProbeState 列表)
+        """
+        retry = []
+        failed = []
+        for target_ip, state in list(self.pending.items()):
+            if state.deadline > current_time:
+                continue
+            if state.attempts < self.attempts:
+                retry.append(state)
+            else:
+                del self.pending[target_ip]
+                self.probe_failures += 1
+                failed.append(state)
+        return retry, failed
+
+
+class LivenessSession:
+    def __init__(self, target_ip):
+        self.target_ip = target_ip
+        self.outstanding_id = None  # 上一轮发出、尚未收到回应的 Probe ID
+        self.misses = 0             # 连续未回应的轮数
+
+
+class LivenessMonitor:
+    """
+    BFD 风格的快速存活检测
+    只对承载活跃路由的下一跳，每 interval 秒发送一次 PROBE，连续 miss_threshold 轮没有回应即判定链路失效
+    检测时间约为 interval * miss_threshold，其余邻居仍只依赖 HELLO
+    """
+
+    # 与 ProbeManager 的 ID 空间分开，避免两类探测的回应互相匹配
+    ID_BASE = 0x80000000
+
+    def __init__(self, interval, miss_threshold):
+        self.interval = float(interval)
+        self.miss_threshold = int(miss_threshold)
+        # 格式: { target_ip: LivenessSession }
+        self.sessions = {}
+        self.next_probe_id = 0
+
+        self.probes_sent = 0
+        self.probe_replies = 0
+        self.links_downgraded = 0
+
+    def enabled(self):
+        return self.interval > 0 and self.miss_threshold > 0
+
+    def tick(self, targets):
+        """
+        进入新一轮探测
+        :param targets: 本轮需要探测的邻居接口地址集合
+        :return: (本轮要发送的 [(target_ip, probe_id), ...], 判定失效的 [target_ip, ...])
+        """
+        for target_ip in list(self.sessions):
+            if target_ip not in targets:
+                del self.sessions[target_ip]
+
+        to_send = []
+        down = []
+        for target_ip in sorted(targets):
+            session = self.sessions.get(target_ip)
+            if session is None:
+                session = self.sessions[target_ip] = LivenessSession(target_ip)
+            elif session.outstanding_id is not None:
+                session.misses += 1
+                if session.misses >= self.miss_threshold:
+                    del self.sessions[target_ip]
+                    self.links_downgraded += 1
+                    down.append(target_ip)
+                    continue
+            self.next_probe_id = (self.next_probe_id + 1) % self.ID_BASE
+            session.outstanding_id = self.ID_BASE | self.next_probe_id
+            self.probes_sent += 1
+            to_send.append((target_ip, session.outstanding_id))
+        return to_send, down
+
+    def on_reply(self, target_ip, probe_id):
+        session = self.sessions.get(target_ip)
+        if session is None or session.outstanding_id != probe_id:
+            return False
+        session.outstanding_id = None
+        session.misses = 0
+        self.probe_replies += 1
+        return True
@@ -2,6 +2,9 @@ import time
 import socket
 from constants import *
 from pkt_msg_fmt import create_link_code
+from olsr_log import get_logger
+
+_log = get_logger("link")
 
 
 class LinkTuple: #此类主要用于判断邻居节点对称与否，以及过期与否
@@ -11,6 +14,8 @@ class LinkTuple: #此类主要用于判断邻居节点对称与否，以及过
         self.l_asym_time = 0  # 异步过期时间戳 代表接收链路的有效期
         self.l_sym_time = 0   # 对称过期时间戳 代表双向握手成功的有效期
         self.l_time = 0       # 记录过期时间戳 (通常取上面两者的最大值 + 保持时间)
+        self.provisional = False  # 从热重启快照恢复、尚未被新的 HELLO 确认
+        self.compact_capable = False  # 对方 HELLO 宣告能解析紧凑地址块
 
     def is_symmetric(self):
         """判断当前链路是否对称"""
@@ -28,6 +33,8 @@ class LinkSet:
     def __init__(self, my_ip=None):
         self.links = {}  # 格式: { '192.168.1.5': LinkTuple对象类, ... }，这里面保存邻居节点的ip信息，是否对称节点
         self.my_ip = my_ip # 请替换为你的真实IP
+        # 本节点所有接口地址，多射频时对方 HELLO 里列出的是它听到的那个接口地址而不一定是主地址
+        self.local_addresses = set()
 
     def process_hello(self, sender_ip, hello_info, validity_time):# 其中的hello_info就是hello_body解包以后的信息内容，本身是一个字典，这一部分打包解包在hello_msg_fmt文件里面
         """
@@ -40,13 +47,15 @@ class LinkSet:
 
         # 1. 如果是新邻居，创建记录 [cite: 816-827]
         if sender_ip not in self.links:
-            print(f"[LinkSet] 发现新邻居: {sender_ip}")
+            _log.info("发现新邻居: %s", sender_ip)
             new_link = LinkTuple(sender_ip)
             # 新邻居默认为非对称，L_SYM_time 设为过期
             new_link.l_sym_time = current_time - 1 
             self.links[sender_ip] = new_link #ip与对象的键值对构成的字典
         
         link = self.links[sender_ip] #取出sender_ip对应的LinkTuple类的对象，对他进行操作
+        link.provisional = False
+        link.compact_capable = bool(hello_info.get('compact_capable'))
 
         # 2. 更新 L_ASYM_time (只要收到 Hello 就更新) [cite: 831-832]
         link.l_asym_time = current_time + validity_time #异步过期时间戳（时刻）
@@ -55,7 +64,7 @@ class LinkSet:
         # 遍历 Hello 消息里的所有邻居组
         found_myself = False
         for link_code, ip_list in hello_info['neighbor_groups']:#这里的邻居信息是发送hello消息一方的
-            if self.my_ip in ip_list:#如果我在对方的邻居节点中，现在又收到了对方的hello消息
+            if self.my_ip in ip_list or not self.local_addresses.isdisjoint(ip_list):#如果我在对方的邻居节点中，现在又收到了对方的hello消息
                 found_myself = True
                 # 检查对方标记的链路类型（最后两位的link_type）
                 l_type = link_code & 0x03 
@@ -63,19 +72,51 @@ class LinkSet:
                     link.l_sym_time = current_time - 1 # 对方说丢失了，我们也标记为非对称
                 elif l_type == 1 or l_type == 2: # ASYM_LINK or SYM_LINK [cite: 846]
                     link.l_sym_time = current_time + validity_time # 确认为对称！
-                    print(f"[LinkSet] 与 {sender_ip} 建立对称链路！")
+                    _log.debug("与 %s 建立对称链路", sender_ip)
                 break
         
         # 4. 更新记录总过期时间 L_time [cite: 848-850]
         link.l_time = max(link.l_sym_time, link.l_asym_time)
 
+    def restore_link(self, neighbor_ip, symmetric, hold_time, current_time):
+        """从快照恢复链路，标记为 provisional，按正常保持时间过期，收到 HELLO 后即被确认"""
+        link = LinkTuple(neighbor_ip)
+        link.l_asym_time = current_time + hold_time
+        link.l_sym_time = current_time + hold_time if symmetric else current_time - 1
+        link.l_time = max(link.l_sym_time, link.l_asym_time)
+        link.provisional = True
+        self.links[neighbor_ip] = link
+
+    def expire_link(self, neighbor_ip, current_time):
+        """探测确认链路已断开，不再等待 L_time 过期，立即删除该链路"""
+        if self.links.pop(neighbor_ip, None) is None:
+            return False
+        _log.warning("邻居 %s 探测失败，立即删除链路。", neighbor_ip)
+        return True
+
+    def downgrade_link(self, neighbor_ip, current_time):
+        """存活探测连续失败: 立即把链路降为非对称，HELLO 随后以 ASYM_LINK 宣告，对方也会撤销对称关系"""
+        link = self.links.get(neighbor_ip)
+        if link is None or not link.is_symmetric():
+            return False
+        link.l_sym_time = current_time - 1
+        link.l_time = max(link.l_sym_time, link.l_asym_time)
+        _log.warning("邻居 %s 存活探测超时，链路降为非对称。", neighbor_ip)
+        return True
+
+    def all_compact_capable(self):
+        """全部未过期链路的邻居都支持紧凑地址块时返回 True，没有链路时返回 False"""
+        current_time = time.time()
+        links = [link for link in self.links.values() if link.l_time >= current_time]
+        return bool(links) and all(link.compact_capable for link in links)
+
     def cleanup(self):
         """定期清理过期邻居"""
         current_time = time.time()
         expired_ips = [ip for ip, link in self.links.items() if link.l_time < current_time]
         # 创建一个过期ip构成的列表
         for ip in expired_ips:
-            print(f"[LinkSet] 邻居 {ip} 已过期，删除记录。")
+            _log.info("邻居 %s 已过期，删除记录。", ip)
             del self.links[ip]
 
     # 基于链路状态生成hello消息的邻居相关内容，这里自己本身与哪些节点相连的初始化信息应该要么初始设定，要么应该从电台设备爬相关信息，要么是通过hello消息本身去更新过来
@@ -0,0 +1,89 @@
+import time
+
+from olsr_log import get_logger
+
+_log = get_logger("mid")
+
+
+class MIDTuple:
+    def __init__(self, iface_addr, main_addr):
+        self.iface_addr = iface_addr  # 接口地址 (I_iface_addr)
+        self.main_addr = main_addr    # 该接口所属节点的主地址 (I_main_addr)
+        self.expiration_time = 0      # 过期时间 (I_time)
+
+
+class MIDManager:
+    """
+    接口关联集 (Interface Association Set, RFC 3626 Section 5.4)
+    多射频节点的每个接口地址都映射到它的主地址 (HELLO/TC 的 Originator)
+    邻居、二跳、拓扑和路由计算都按主地址进行，链路感知仍按接口地址进行
+    """
+
+    def __init__(self, my_ip):
+        self.my_ip = my_ip
+        # 格式: { iface_addr: MIDTuple }
+        self.interface_set = {}
+        # 按主地址建立的别名索引，路由计算时直接取某节点的全部接口地址
+        # 格式: { main_addr: {iface_addr, ...} }
+        self.aliases_by_main = {}
+
+    def _remove_tuple(self, iface_addr):
+        i_tuple = self.interface_set.pop(iface_addr, None)
+        if i_tuple is None:
+            return
+        aliases = self.aliases_by_main.get(i_tuple.main_addr)
+        if aliases is not None:
+            aliases.discard(iface_addr)
+            if not aliases:
+                del self.aliases_by_main[i_tuple.main_addr]
+
+    def add_alias(self, main_addr, iface_addr, validity_time, current_time):
+        """记录一个 接口地址 -> 主地址 的映射，返回映射是否发生变化"""
+        if iface_addr == main_addr:
+            return False
+        i_tuple = self.interface_set.get(iface_addr)
+        changed = i_tuple is None or i_tuple.main_addr != main_addr
+        if changed:
+            self._remove_tuple(iface_addr)
+            i_tuple = MIDTuple(iface_addr, main_addr)
+            self.interface_set[iface_addr] = i_tuple
+            self.aliases_by_main.setdefault(main_addr, set()).add(iface_addr)
+            _log.info("接口 %s 属于节点 %s", iface_addr, main_addr)
+        i_tuple.expiration_time = max(i_tuple.expiration_time, current_time + validity_time)
+        return changed
+
+    def process_mid_message(self, originator_ip, mid_info, validity_time, current_time):
+        """
+        处理 MID 消息 (RFC 3626 Section 5.4)
+        :return: 别名表是否发生变化，变化时需要重算路由
+        """
+        changed = False
+        for iface_addr in mid_info['interface_addresses']:
+            if iface_addr == self.my_ip:
+                continue
+            if self.add_alias(originator_ip, iface_addr, validity_time, current_time):
+                changed = True
+        return changed
+
+    def get_main_address(self, ip):
+        """接口地址 -> 主地址，未知的地址按主地址处理"""
+        i_tuple = self.interface_set.get(ip)
+        return i_tuple.main_addr if i_tuple is not None else ip
+
+    def get_aliases(self, main_addr):
+        return self.aliases_by_main.get(main_addr, ())
+
+    def expand(self, main_addrs):
+        """把一组主地址扩展成主地址及其全部接口地址"""
+        expanded = set(main_addrs)
+        for main_addr in main_addrs:
+            expanded.update(self.aliases_by_main.get(main_addr, ()))
+        return expanded
+
+    def cleanup(self):
+        """清理过期接口关联，返回是否有记录被删除"""
+        now = time.time()
+        keys_to_remove = [k for k, v in self.interface_set.items() if v.expiration_time < now]
+        for k in keys_to_remove:
+            self._remove_tuple(k)
+        return bool(keys_to_remove)
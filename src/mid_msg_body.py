@@ -0,0 +1,41 @@
+import socket
+from olsr_log import get_logger
+
+_log = get_logger("packet")
+
+"""
+本文件负责 MID (Multiple Interface Declaration) 消息体的打包和解包 (RFC 3626 Section 5.1)
+MID 消息体就是该节点除主地址以外的所有接口地址，每个 4 字节
+mid_info 的格式如下
+{
+        "interface_addresses": ["10.0.1.5", "10.0.2.5", ...]
+}
+"""
+
+
+def create_mid_body(interface_addresses):
+    """
+    构造 MID 消息体
+    :param interface_addresses: 除主地址 (Originator Address) 以外的接口地址列表
+    """
+    addr_bytes = []
+    for ip_str in interface_addresses:
+        try:
+            addr_bytes.append(socket.inet_aton(ip_str))
+        except OSError:
+            _log.error("MID 打包失败，非法地址: %s", ip_str)
+    return b''.join(addr_bytes)
+
+
+def parse_mid_body(mid_body):
+    """
+    解析 MID 消息体
+    :return: {'interface_addresses': [ip_str, ...]}
+    """
+    end = len(mid_body) // 4 * 4
+    return {
+        'interface_addresses': [
+            socket.inet_ntoa(mid_body[cursor : cursor+4])
+            for cursor in range(0, end, 4)
+        ]
+    }
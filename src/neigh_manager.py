@@ -3,6 +3,11 @@ import time
 
 from constants import *
 from mpr_selector import select_mpr
+from olsr_log import get_logger
+from olsr_metrics import Histogram
+
+_log = get_logger("neighbor")
+_mpr_log = get_logger("mpr")
 
 
 # from neigh_detec import NeighborTuple, TwoHopTuple 
@@ -35,6 +40,9 @@ class NeighborManager:
         # 【新增】MPR Selector Set
         # 格式: { 'selector_ip': MPRSelectorTuple }
         self.mpr_selectors = {}  #自己被哪些节点选作了mpr节点
+        # MPR 重算次数和每次耗时，见 olsr_metrics.py
+        self.mpr_recalculations = 0
+        self.mpr_recalc_seconds = Histogram()
 
     def update_neighbor_status(self, neighbor_ip, willingness, is_link_sym):
         """
@@ -57,7 +65,7 @@ class NeighborManager:
         else:
             neigh.status = 0 # NOT_NEIGH
             
-        print(f"[NeighborSet] 更新邻居 {neighbor_ip}: Status={neigh.status}, Will={neigh.willingness}")
+        _log.debug("更新邻居 %s: Status=%s, Will=%s", neighbor_ip, neigh.status, neigh.willingness)
 
     def process_2hop_neighbors(self, sender_ip, hello_info, validity_time, current_time):
         """
@@ -75,7 +83,7 @@ class NeighborManager:
                     #否则的话就是自己的二跳邻居，然后构筑二跳邻居存储的字典
                     key = (sender_ip, two_hop_ip)
                     if key not in self.two_hop_set:
-                        print(f"[2-Hop] 发现: me -> {sender_ip} -> {two_hop_ip}")
+                        _log.debug("二跳发现: me -> %s -> %s", sender_ip, two_hop_ip)
                         self.two_hop_set[key] = TwoHopTuple(sender_ip, two_hop_ip)# 写入字典
                     
                     self.two_hop_set[key].expiration_time = current_time + validity_time
@@ -85,7 +93,7 @@ class NeighborManager:
                 for two_hop_ip in ip_list:
                     key = (sender_ip, two_hop_ip)
                     if key in self.two_hop_set:
-                        print(f"[2-Hop] 链路断开: {sender_ip} -x-> {two_hop_ip}")
+                        _log.debug("二跳链路断开: %s -x-> %s", sender_ip, two_hop_ip)
                         del self.two_hop_set[key]
 
 
@@ -133,9 +141,17 @@ class NeighborManager:
 
     def recalculate_mpr(self):
         """
-        准备数据并调用算法
+        准备数据并调用算法，统计重算次数和耗时
         """
-        print("[MPR] 开始重算 MPR...")
+        started = time.perf_counter()
+        try:
+            return self._recalculate_mpr()
+        finally:
+            self.mpr_recalculations += 1
+            self.mpr_recalc_seconds.observe(time.perf_counter() - started)
+
+    def _recalculate_mpr(self):
+        _mpr_log.debug("开始重算 MPR...")
         
         # 1. 准备 candidates 字典 {ip: willingness}
         # 直接在这里遍历，替代了原先的冗余的 _get_symmetric_neighbors_data
@@ -153,10 +169,10 @@ class NeighborManager:
         new_mpr_set = select_mpr(candidates, coverage_map)
         
         if new_mpr_set != self.current_mpr_set:
-            print(f"[MPR] MPR集合更新: {self.current_mpr_set} -> {new_mpr_set}")
+            _mpr_log.info("MPR集合更新: %s -> %s", self.current_mpr_set, new_mpr_set)
             self.current_mpr_set = new_mpr_set
         else:
-            print(f"[MPR] MPR集合未变: {self.current_mpr_set}")
+            _mpr_log.debug("MPR集合未变: %s", self.current_mpr_set)
             
         return self.current_mpr_set
     
@@ -183,7 +199,7 @@ class NeighborManager:
         # 更新 MPR Selector Set
         if am_i_selected:
             if sender_ip not in self.mpr_selectors:
-                print(f"[MPR Selector] {sender_ip} 选我做 MPR 了！")
+                _mpr_log.info("%s 选我做 MPR 了", sender_ip)
                 self.mpr_selectors[sender_ip] = MPRSelectorTuple(sender_ip)
             
             # 更新过期时间 [cite: 1051]
@@ -192,6 +208,31 @@ class NeighborManager:
         # 注意：如果对方没再选我（hello里没我有我但类型变了），这里暂时依靠过期机制删除
         # RFC 并没有要求立即删除，而是依赖 Timer Expiration (RFC 8.4.1)
     
+    def restore_two_hop(self, neighbor_ip, two_hop_ip, expiration_time):
+        """从热重启快照恢复二跳记录"""
+        two_hop = TwoHopTuple(neighbor_ip, two_hop_ip)
+        two_hop.expiration_time = expiration_time
+        self.two_hop_set[(neighbor_ip, two_hop_ip)] = two_hop
+
+    def restore_mpr_selector(self, selector_ip, expiration_time):
+        """从热重启快照恢复 MPR Selector，保证重启后立即继续为它转发"""
+        selector = MPRSelectorTuple(selector_ip)
+        selector.expiration_time = expiration_time
+        self.mpr_selectors[selector_ip] = selector
+
+    def expire_neighbor(self, neighbor_ip):
+        """
+        邻居的所有链路都已断开时立即撤销它 (RFC 3626 Section 8.5)
+        邻居置为 NOT_SYM，并删除经由它的二跳记录和它对我的 MPR 选择
+        """
+        neigh = self.neighbors.get(neighbor_ip)
+        if neigh is not None:
+            neigh.status = 0
+        for key in [k for k in self.two_hop_set if k[0] == neighbor_ip]:
+            del self.two_hop_set[key]
+        self.mpr_selectors.pop(neighbor_ip, None)
+        _log.info("邻居 %s 的链路全部断开", neighbor_ip)
+
     def cleanup(self):
         """清理过期记录"""
         now = time.time()
@@ -204,7 +245,7 @@ class NeighborManager:
         # 清理 MPR Selectors
         sel_to_remove = [k for k, v in self.mpr_selectors.items() if v.expiration_time < now]
         for k in sel_to_remove:
-            print(f"[MPR Selector] {k} 的选择已过期")
+            _mpr_log.info("MPR Selector %s 的选择已过期", k)
             del self.mpr_selectors[k]
 
 
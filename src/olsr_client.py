@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+from typing import Any, Callable
+
+CONTROL_API_VERSION = 2
+UDP_RESPONSE_SIZE = 65535
+UNIX_RESPONSE_SIZE = 1 << 20
+# Streamed responses arrive as a burst of datagrams; leave room for them in the UDP socket buffer.
+UDP_STREAM_RCVBUF = 1 << 20
+# How often NextHopTracker tells the daemon which locally resolved routes are still in use.
+ROUTE_ACTIVITY_REFRESH_SEC = 1.0
+
+
+def _with_version(response: dict[str, Any]) -> dict[str, Any]:
+    """The result plus the table_version it was read at and the daemon epoch that version belongs to."""
+    return dict(response["result"], table_version=response.get("table_version"), epoch=response.get("epoch"))
+
+
+class ControlClient:
+    """
+    Client for the local OLSR control endpoint, shared by the forwarders.
+
+    One connection is kept open and reused for every command: a connected UDP socket to
+    control_ip:control_port, or a Unix seqpacket connection to unix_path (olsr_main.py
+    --control-unix) when given.  Requests on it are serialized and answered in order; after a
+    timeout or error the connection is dropped so a late response cannot be paired with the
+    next request.
+    """
+
+    def __init__(
+        self,
+        control_ip: str = "127.0.0.1",
+        control_port: int = 5100,
+        timeout_sec: float = 3.0,
+        unix_path: str | None = None,
+    ):
+        self.control_ip = control_ip
+        self.control_port = int(control_port)
+        self.timeout_sec = float(timeout_sec)
+        self.unix_path = unix_path
+        self._sock: socket.socket | None = None
+        self._sock_timeout: float | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        if self.unix_path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            target: Any = self.unix_path
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            target = (self.control_ip, self.control_port)
+        try:
+            if not self.unix_path:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_STREAM_RCVBUF)
+            sock.settimeout(self.timeout_sec)
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        self._sock_timeout = self.timeout_sec
+        return sock
+
+    def _drop(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def exchange(self, messages: list[bytes], timeout_sec: float | None = None) -> list[bytes]:
+        """Write every message, then read one response per message, in order."""
+        timeout = self.timeout_sec if timeout_sec is None else timeout_sec
+        response_size = UNIX_RESPONSE_SIZE if self.unix_path else UDP_RESPONSE_SIZE
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+            try:
+                if timeout != self._sock_timeout:
+                    self._sock.settimeout(timeout)
+                    self._sock_timeout = timeout
+                for message in messages:
+                    self._sock.send(message)
+                responses = []
+                for _ in messages:
+                    data = self._sock.recv(response_size)
+                    if not data and self.unix_path:
+                        raise ConnectionError("control connection closed")
+                    responses.append(data)
+                return responses
+            except OSError:
+                self._drop()
+                raise
+
+    def exchange_stream(self, message: bytes, timeout_sec: float | None = None) -> list[bytes]:
+        """Write one request and read datagrams until a streamed response ends (or a plain response arrives)."""
+        timeout = self.timeout_sec if timeout_sec is None else timeout_sec
+        response_size = UNIX_RESPONSE_SIZE if self.unix_path else UDP_RESPONSE_SIZE
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+            try:
+                if timeout != self._sock_timeout:
+                    self._sock.settimeout(timeout)
+                    self._sock_timeout = timeout
+                self._sock.send(message)
+                chunks = []
+                while True:
+                    data = self._sock.recv(response_size)
+                    if not data and self.unix_path:
+                        raise ConnectionError("control connection closed")
+                    chunks.append(data)
+                    head = json.loads(data.split(b"\n", 1)[0])
+                    if not head.get("more"):
+                        return chunks
+            except (OSError, ValueError):
+                self._drop()
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop()
+
+    def send_command(self, command: str, timeout_sec: float | None = None) -> str:
+        data = self.exchange([command.encode("utf-8")], timeout_sec)[0]
+        return data.decode("utf-8", errors="ignore")
+
+    def discover_route(self, dest_ip: str) -> str:
+        return self.send_command(f"DISCOVER_ROUTE:{dest_ip}")
+
+    def show_route_detail(self, dest_ip: str) -> str:
+        return self.send_command(f"SHOW_ROUTE_DETAIL:{dest_ip}")
+
+    def report_link_failure(self, next_hop_ip: str) -> str:
+        return self.send_command(f"REPORT_LINK_FAILURE:{next_hop_ip}")
+
+    @staticmethod
+    def encode_request(payload: dict[str, Any]) -> bytes:
+        # Route events would be pushed onto this request/response connection and read as responses.
+        items = payload.get("batch") if isinstance(payload.get("batch"), list) else [payload]
+        if any(isinstance(item, dict) and item.get("cmd") == "subscribe" for item in items):
+            raise ValueError("subscribe needs a dedicated connection; use route_events.RouteCache")
+        return json.dumps(dict(payload, v=CONTROL_API_VERSION), separators=(",", ":")).encode("utf-8")
+
+    def request(self, payload: dict[str, Any], timeout_sec: float | None = None) -> dict[str, Any]:
+        return json.loads(self.exchange([self.encode_request(payload)], timeout_sec)[0])
+
+    def pipeline(self, payloads: list[dict[str, Any]], timeout_sec: float | None = None) -> list[dict[str, Any]]:
+        """Send several JSON requests back to back and collect the responses in request order."""
+        responses = self.exchange([self.encode_request(payload) for payload in payloads], timeout_sec)
+        return [json.loads(data) for data in responses]
+
+    def lookup(self, dest_ips: list[str]) -> dict[str, Any]:
+        """Routes by destination, plus the table_version (and epoch) they were read at."""
+        response = self.request({"cmd": "lookup", "dests": list(dest_ips)})
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "lookup failed"))
+        return _with_version(response)
+
+    def lookup_routes(self, dest_ips: list[str]) -> dict[str, dict[str, Any] | None]:
+        return self.lookup(dest_ips)["routes"]
+
+    def routes(self, if_changed_since: int | None = None, epoch: float | None = None) -> dict[str, Any] | None:
+        """
+        The full route table ({"fields", "rows", "table_version", "epoch"}), or None when it is still at
+        if_changed_since.  epoch must be the one returned with that table_version: a restarted daemon
+        counts versions from 0 again.
+        """
+        payload: dict[str, Any] = {"cmd": "routes"}
+        if if_changed_since is not None:
+            if epoch is None:
+                raise ValueError("if_changed_since needs the epoch it was read at")
+            payload["if_changed_since"] = int(if_changed_since)
+            payload["epoch"] = epoch
+        response = self.request(payload)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "routes failed"))
+        if response.get("not_modified"):
+            return None
+        return _with_version(response)
+
+    def stream(self, payload: dict[str, Any], timeout_sec: float | None = None) -> dict[str, Any]:
+        """
+        Run a command with "stream": true and reassemble the result ({..., "rows": [...], "table_version", "epoch"}).
+
+        Raises RuntimeError on an error response or when a chunk or line went missing.
+        """
+        chunks = self.exchange_stream(self.encode_request(dict(payload, stream=True)), timeout_sec)
+        lines = []
+        head: dict[str, Any] = {}
+        for index, data in enumerate(chunks):
+            head_line, *rest = data.decode("utf-8").split("\n")
+            head = json.loads(head_line)
+            if not head.get("ok"):
+                raise RuntimeError(head.get("error", f"{payload.get('cmd')} failed"))
+            if head.get("not_modified"):
+                return {"not_modified": True, "table_version": head.get("table_version"), "epoch": head.get("epoch")}
+            if head.get("chunk") != index:
+                raise RuntimeError(f"stream chunk {index} missing")
+            lines.extend(rest)
+        if head.get("lines") != len(lines) or not lines:
+            raise RuntimeError(f"stream truncated: {len(lines)} of {head.get('lines')} lines")
+        result = json.loads(lines[0])
+        result["rows"] = [json.loads(line) for line in lines[1:]]
+        result["table_version"] = head.get("table_version")
+        result["epoch"] = head.get("epoch")
+        return result
+
+    def export_topology(self) -> dict[str, Any]:
+        """The daemon's whole topology graph; every row starts with its type, whose columns are in result["fields"]."""
+        return self.stream({"cmd": "export_topology"})
+
+    def pages(self, command: str, limit: int = 500) -> Any:
+        """Yield the pages of a table command (routes/neighbors/two_hop/topology), following next_cursor."""
+        cursor = None
+        while True:
+            payload: dict[str, Any] = {"cmd": command, "limit": int(limit)}
+            if cursor is not None:
+                payload["cursor"] = cursor
+            response = self.request(payload)
+            if not response.get("ok"):
+                raise RuntimeError(response.get("error", f"{command} failed"))
+            yield _with_version(response)
+            cursor = response["result"].get("next_cursor")
+            if cursor is None:
+                return
+
+    def table_version(self) -> int:
+        return self.table_state()[1]
+
+    def table_state(self) -> tuple[float, int]:
+        """(epoch, table_version); versions from different epochs are not comparable."""
+        response = self.request({"cmd": "table_version"})
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "table_version failed"))
+        return float(response["epoch"]), int(response["table_version"])
+
+    def wait_route(self, dest_ip: str, timeout_sec: float) -> dict[str, Any]:
+        """
+        Block until the daemon installs a route to dest_ip; result["route"] is None when timeout_sec elapses first.
+
+        The request is parked by the daemon, so it uses its own short-lived connection instead of
+        holding the shared one for the whole wait.
+        """
+        waiter = ControlClient(self.control_ip, self.control_port, self.timeout_sec, self.unix_path)
+        try:
+            response = waiter.request(
+                {"cmd": "wait_route", "dest": dest_ip, "timeout": timeout_sec},
+                timeout_sec=timeout_sec + self.timeout_sec,
+            )
+        finally:
+            waiter.close()
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "wait_route failed"))
+        return _with_version(response)
+
+
+class NextHopTracker:
+    """
+    Delivery bookkeeping shared by the forwarders.
+
+    record_delivery() counts consecutive local send failures per next hop; at link_failure_threshold
+    it drops cached routes through that hop and reports it to the daemon.  touch() notes a
+    destination resolved without asking the daemon (shared memory or route cache), which OLSR would
+    otherwise not see as in use; a background thread sends the touched set as one batched lookup
+    every refresh_interval_sec, on its own connection, so the send path never waits on the control port.
+    """
+
+    def __init__(
+        self,
+        control_client: ControlClient,
+        link_failure_threshold: int = 2,
+        route_cache: Any = None,
+        log: Callable[[str], None] | None = None,
+        refresh_interval_sec: float = ROUTE_ACTIVITY_REFRESH_SEC,
+    ):
+        self.control_client = control_client
+        self.link_failure_threshold = int(link_failure_threshold)
+        self.route_cache = route_cache
+        self.log = log or (lambda text: None)
+        self.refresh_interval_sec = float(refresh_interval_sec)
+        self.link_failure_reports = 0
+        self._failures: dict[str, int] = {}
+        self._touched: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresher = ControlClient(
+            control_client.control_ip, control_client.control_port, control_client.timeout_sec, control_client.unix_path
+        )
+        self._thread = threading.Thread(target=self._refresh_loop, name="route-activity", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        self._thread.join(timeout=self.refresh_interval_sec + self._refresher.timeout_sec)
+        self._refresher.close()
+
+    def touch(self, dest_ip: str) -> None:
+        with self._lock:
+            self._touched.add(dest_ip)
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_event.wait(self.refresh_interval_sec):
+            with self._lock:
+                dests, self._touched = self._touched, set()
+            if not dests:
+                continue
+            try:
+                self._refresher.lookup(sorted(dests))
+            except (OSError, RuntimeError, ValueError):
+                pass
+
+    def record_delivery(self, next_hop_ip: str, ok: bool) -> None:
+        """Count consecutive failures per next hop; at the threshold ask OLSR to probe it and drop cached routes through it until OLSR confirms them again."""
+        if self.link_failure_threshold <= 0:
+            return
+        with self._lock:
+            if ok:
+                self._failures.pop(next_hop_ip, None)
+                return
+            failures = self._failures.get(next_hop_ip, 0) + 1
+            report = failures >= self.link_failure_threshold
+            self._failures[next_hop_ip] = 0 if report else failures
+            if report:
+                self.link_failure_reports += 1
+        if report:
+            if self.route_cache is not None:
+                self.route_cache.invalidate_next_hop(next_hop_ip)
+            try:
+                self.log(f"report link failure next_hop={next_hop_ip}: {self.control_client.report_link_failure(next_hop_ip)}")
+            except OSError as exc:
+                self.log(f"report link failure next_hop={next_hop_ip} failed: {exc}")
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
 import socket
+import time
 from typing import TYPE_CHECKING
 
+from constants import CONTROL_PAGE_MAX, ROUTE_WAIT_MAX_TIMEOUT, STACK_SAMPLE_INTERVAL, TRACEMALLOC_FRAMES
+from olsr_log import get_hub
+from olsr_metrics import render_text
+from olsr_profiling import ProfilingError
+
 if TYPE_CHECKING:
     from olsr_main import OLSRNode
 
@@ -19,6 +25,7 @@ def _show_route_detail(node: "OLSRNode", dest_ip: str) -> str:
     route = node.routing_manager.get_route(dest_ip)
     if route is None:
         return f"未找到路由：{dest_ip}"
+    node.mark_route_active(route)
     return (
         f"dest={route['dest']}\n"
         f"next_hop={route['next_hop']}\n"
@@ -27,9 +34,32 @@ def _show_route_detail(node: "OLSRNode", dest_ip: str) -> str:
         f"distance={route['distance']}\n"
         f"state={route['state']}\n"
         f"valid={route['valid']}\n"
+        f"provisional={route.get('provisional', False)}\n"
         f"first_seen_at={route['first_seen_at']:.6f}\n"
         f"last_updated_at={route['last_updated_at']:.6f}\n"
-        f"protocol_started_at={node.started_at:.6f}"
+        f"protocol_started_at={node.started_at:.6f}\n"
+        f"table_version={node.routing_manager.table_version}"
+        + (f"\nnext_hop_interfaces={','.join(route['next_hop_interfaces'])}" if "next_hop_interfaces" in route else "")
+        + (f"\ngateway={route['gateway']}" if "gateway" in route else "")
+    )
+
+
+def _lookup_route(node: "OLSRNode", dest_ip: str) -> str:
+    started = time.perf_counter()
+    route = node.routing_manager.lookup_route(dest_ip)
+    lookup_us = (time.perf_counter() - started) * 1e6
+    if route is None:
+        return f"未找到路由：{dest_ip}\nlookup_us={lookup_us:.3f}"
+    node.mark_route_active(route)
+    matched = route["dest"] if "/" in route["dest"] else f"{route['dest']}/32"
+    return (
+        f"dest={dest_ip}\n"
+        f"matched_prefix={matched}\n"
+        f"next_hop_ip={route['next_hop_ip']}\n"
+        f"hop_count={route['hop_count']}\n"
+        f"next_hop_interfaces={','.join(route.get('next_hop_interfaces', [route['next_hop_ip']]))}\n"
+        f"table_version={node.routing_manager.table_version}\n"
+        f"lookup_us={lookup_us:.3f}"
     )
 
 
@@ -51,7 +81,172 @@ def _show_neighbors(node: "OLSRNode") -> str:
     return "\n".join(lines)
 
 
-def process_control_command(node: "OLSRNode", command_text: str) -> str:
+_STATUS_FLOAT_FORMATS = {
+    "liveness_interval_ms": ".1f",
+    "control_tx_bytes_per_sec": ".3f",
+}
+
+
+def status_fields(node: "OLSRNode") -> dict:
+    """SHOW_STATUS 和结构化控制协议共用的状态字段，值保持原始类型"""
+    uptime = max(1e-9, time.time() - node.started_at)
+    hub = get_hub()
+    return {
+        "my_ip": node.my_ip,
+        "udp_port": node.port,
+        "control_port": node.control_port,
+        "protocol_started_at": node.started_at,
+        "control_unix": node.control_unix,
+        "control_unix_connections": len(node.control_connections),
+        "route_count": len(node.routing_manager.routing_table),
+        "provisional_route_count": sum(1 for route in node.routing_manager.routing_table.values() if route.get("provisional")),
+        "warm_restarted": node.warm_restarted,
+        "topology_requests_sent": node.topology_requests_sent,
+        "topology_dumps_received": node.topology_dumps_received,
+        "last_recalculated_at": node.routing_manager.last_recalculated_at,
+        "tc_ttl_cycle": list(node.tc_ttl_cycle),
+        "tc_redundancy": node.tc_redundancy,
+        "topology_tuples": len(node.topology_manager.topology_set),
+        "delta_tc": node.delta_tc,
+        "tc_full_sent": node.tc_full_sent,
+        "tc_delta_sent": node.tc_delta_sent,
+        "tc_gap_requests": node.tc_gap_requests,
+        "compact_addresses": node.compact_addresses,
+        "compact_encoding_active": node.use_compact_encoding(),
+        "compact_hello_sent": node.compact_hello_sent,
+        "compact_tc_sent": node.compact_tc_sent,
+        "tc_transcoded": node.tc_transcoded,
+        "route_table_version": node.routing_manager.table_version,
+        "route_shm_publishes": node.route_exporter.publishes if node.route_exporter is not None else 0,
+        "route_subscribers": len(node.route_subscriptions.subscribers),
+        "route_events_sent": node.route_subscriptions.events_sent,
+        "route_event_resets": node.route_subscriptions.resets_sent,
+        "route_waits_pending": len(node.route_waits.waits),
+        "route_waits_answered": node.route_waits.answered,
+        "route_waits_timed_out": node.route_waits.timed_out,
+        "profiling_cprofile": node.lock.profiler is not None,
+        "profiling_stack_sampling": node.profiler.sampling_until is not None,
+        "profile_dir": node.profiler.output_dir,
+        "log_levels": hub.describe_levels(),
+        "log_written": hub.written,
+        "log_dropped": hub.dropped,
+        "local_addresses": sorted(node.local_addresses),
+        "hna_networks": [f"{net}/{plen}" for net, plen in node.hna_networks],
+        "mid_aliases": len(node.mid_manager.interface_set),
+        "hna_associations": len(node.hna_manager.association_set),
+        "prefix_route_count": len(node.routing_manager.prefix_table),
+        "route_index_entries": len(node.routing_manager.route_index),
+        "route_index_prefix_lengths": len(node.routing_manager.route_index.tables),
+        "control_tx_packets": node.tx_packets,
+        "control_tx_bytes": node.tx_bytes,
+        "control_rx_packets": node.rx_packets,
+        "control_rx_bytes": node.rx_bytes,
+        "control_forwarded_messages": node.forwarded_messages,
+        "link_failure_reports": node.link_failure_reports,
+        "probes_sent": node.probe_manager.probes_sent,
+        "probe_replies": node.probe_manager.probe_replies,
+        "probe_failures": node.probe_manager.probe_failures,
+        "liveness_interval_ms": node.liveness_monitor.interval * 1000.0,
+        "liveness_targets": len(node.liveness_monitor.sessions),
+        "liveness_probes_sent": node.liveness_monitor.probes_sent,
+        "liveness_probe_replies": node.liveness_monitor.probe_replies,
+        "liveness_links_downgraded": node.liveness_monitor.links_downgraded,
+        "control_tx_bytes_per_sec": node.tx_bytes / uptime,
+    }
+
+
+def _format_status_value(key: str, value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ",".join(str(item) for item in value)
+    if isinstance(value, float):
+        return format(value, _STATUS_FLOAT_FORMATS.get(key, ".6f"))
+    return str(value)
+
+
+def _wait_route(node: "OLSRNode", arg: str, addr) -> str | None:
+    dest_ip, _, timeout_text = arg.partition(",")
+    dest_ip = dest_ip.strip()
+    if not _is_valid_ipv4(dest_ip):
+        return f"非法地址：{dest_ip}"
+    try:
+        timeout = float(timeout_text) if timeout_text.strip() else ROUTE_WAIT_MAX_TIMEOUT
+    except ValueError:
+        return f"非法超时：{timeout_text}"
+    if not timeout > 0:
+        return f"非法超时：{timeout_text}"
+    started = time.time()
+
+    def respond(route) -> str:
+        waited_ms = (time.time() - started) * 1000.0
+        if route is None:
+            return f"等待路由超时：{dest_ip}\nwaited_ms={waited_ms:.1f}"
+        return f"{_show_route_detail(node, dest_ip)}\nwaited_ms={waited_ms:.1f}"
+
+    return node.park_route_wait(dest_ip, timeout, addr, respond)
+
+
+def _show_event_latency(node: "OLSRNode", arg: str) -> str:
+    """每种消息一行事件计数，每个阶段一行分位数 (毫秒，自收到报文起)；arg 为要附带的最近事件条数"""
+    try:
+        recent = int(arg) if arg else 0
+    except ValueError:
+        return f"非法条数：{arg}"
+    latency = node.event_latency
+    lines = []
+    for msg_type, summary in latency.summary().items():
+        lines.append(f"{msg_type} events={summary['events']} route_changes={summary['route_changes']}")
+        for stage, stats in summary["stages"].items():
+            lines.append(f"{msg_type}.{stage} " + " ".join(f"{key}={value}" for key, value in stats.items()))
+    for trace in latency.recent_traces(recent) if recent > 0 else []:
+        stages = " ".join(
+            f"{stage}={trace[stage] * 1000.0:.3f}ms" for stage in latency.STAGES if stage in trace
+        )
+        lines.append(f"at={trace['at']:.6f} type={trace['type']} changed={trace['changed']} {stages}")
+    return "\n".join(lines) if lines else "(empty)"
+
+
+def _format_profile_result(result: dict) -> str:
+    """剖析结果: 标量按 key=value 逐行输出，热点列表放在最后"""
+    lines = [f"{key}={_format_status_value(key, value)}" for key, value in result.items() if key != "top"]
+    top = result.get("top")
+    if top:
+        lines.append("top:")
+        lines.append(top.rstrip() if isinstance(top, str) else "\n".join(top))
+    return "\n".join(lines)
+
+
+def _profile_command(node: "OLSRNode", op: str, arg: str) -> str:
+    action, _, option = arg.partition(",")
+    action = action.strip().lower()
+    profiler = node.profiler
+    try:
+        if op == "PROFILE" and action == "start":
+            result = profiler.start_cprofile()
+        elif op == "PROFILE" and action == "stop":
+            result = profiler.stop_cprofile()
+        elif op == "TRACEMALLOC" and action == "start":
+            result = profiler.start_tracemalloc(int(option) if option.strip() else TRACEMALLOC_FRAMES)
+        elif op == "TRACEMALLOC" and action == "snapshot":
+            result = profiler.snapshot_tracemalloc()
+        elif op == "TRACEMALLOC" and action == "stop":
+            result = profiler.stop_tracemalloc()
+        elif op == "STACK_SAMPLE":
+            seconds = float(action)
+            interval = float(option) / 1000.0 if option.strip() else STACK_SAMPLE_INTERVAL
+            result = profiler.sample_stacks(seconds, interval)
+        else:
+            return f"非法参数：{op}:{arg}"
+    except ValueError:
+        return f"非法参数：{op}:{arg}"
+    except ProfilingError as exc:
+        return f"剖析失败：{exc}"
+    return _format_profile_result(result)
+
+
+def process_control_command(node: "OLSRNode", command_text: str, addr=None) -> str | None:
+    """addr 为请求的源地址，WAIT_ROUTE 挂起时返回 None，回应稍后由 node 发往 addr"""
     parts = command_text.strip().split(":", 1)
     op = parts[0].upper() if parts else ""
     arg = parts[1].strip() if len(parts) > 1 else ""
@@ -69,29 +264,76 @@ def process_control_command(node: "OLSRNode", command_text: str) -> str:
         return f"已触发 OLSR 路由检查：dest={arg}"
 
     if op == "SHOW_ROUTE":
-        return node.routing_manager.format_routing_table()
+        if not arg:
+            return node.routing_manager.format_routing_table()
+        limit_text, _, after = arg.partition(",")
+        after = after.strip()
+        try:
+            limit = int(limit_text)
+        except ValueError:
+            return f"非法条数：{limit_text}"
+        if not 0 < limit <= CONTROL_PAGE_MAX:
+            return f"非法条数：{limit_text}"
+        return node.routing_manager.format_routing_table(limit, after or None)
 
     if op == "SHOW_ROUTE_DETAIL":
         if not _is_valid_ipv4(arg):
             return f"非法地址：{arg}"
         return _show_route_detail(node, arg)
 
+    if op == "WAIT_ROUTE" and addr is not None:
+        return _wait_route(node, arg, addr)
+
+    if op == "LOOKUP_ROUTE":
+        if not _is_valid_ipv4(arg):
+            return f"非法地址：{arg}"
+        return _lookup_route(node, arg)
+
+    if op == "REPORT_LINK_FAILURE":
+        if not _is_valid_ipv4(arg):
+            return f"非法地址：{arg}"
+        targets, started = node.report_link_failure(arg)
+        if not targets:
+            return f"未知邻居：{arg}"
+        return (
+            f"next_hop={arg}\n"
+            f"probing={','.join(targets)}\n"
+            f"probes_started={len(started)}"
+        )
+
     if op == "SHOW_NEIGHBORS":
         return _show_neighbors(node)
 
+    if op == "LOG_LEVEL":
+        hub = get_hub()
+        if arg:
+            try:
+                hub.apply_spec(arg)
+            except ValueError as exc:
+                return f"非法日志级别：{exc}"
+        return f"log_levels={hub.describe_levels()}"
+
+    if op == "SHOW_LOG":
+        try:
+            count = int(arg) if arg else 20
+        except ValueError:
+            return f"非法条数：{arg}"
+        lines = get_hub().recent(count)
+        return "\n".join(lines) if lines else "(empty)"
+
     if op == "SHOW_STATUS":
-        last_recalculated_at = node.routing_manager.last_recalculated_at
-        last_text = f"{last_recalculated_at:.6f}" if last_recalculated_at is not None else ""
-        return (
-            f"my_ip={node.my_ip}\n"
-            f"udp_port={node.port}\n"
-            f"control_port={node.control_port}\n"
-            f"protocol_started_at={node.started_at:.6f}\n"
-            f"route_count={len(node.routing_manager.routing_table)}\n"
-            f"last_recalculated_at={last_text}"
-        )
+        return "\n".join(f"{key}={_format_status_value(key, value)}" for key, value in status_fields(node).items())
+
+    if op in ("PROFILE", "TRACEMALLOC", "STACK_SAMPLE"):
+        return _profile_command(node, op, arg)
+
+    if op == "SHOW_EVENT_LATENCY":
+        return _show_event_latency(node, arg)
+
+    if op == "METRICS":
+        return render_text(node)
 
     if op == "HELP":
-        return "支持命令: DISCOVER_ROUTE:<dest> | SHOW_ROUTE | SHOW_ROUTE_DETAIL:<dest> | SHOW_NEIGHBORS | SHOW_STATUS"
+        return "支持命令: DISCOVER_ROUTE:<dest> | SHOW_ROUTE[:<limit>[,<after>]] | SHOW_ROUTE_DETAIL:<dest> | LOOKUP_ROUTE:<dest> | WAIT_ROUTE:<dest>[,<timeout>] | REPORT_LINK_FAILURE:<next_hop> | SHOW_NEIGHBORS | SHOW_STATUS | METRICS | SHOW_EVENT_LATENCY[:<recent>] | PROFILE:start|stop | TRACEMALLOC:start[,<frames>]|snapshot|stop | STACK_SAMPLE:<seconds>[,<interval_ms>] | LOG_LEVEL[:<spec>] | SHOW_LOG[:<count>]"
 
     return "未知命令"
@@ -0,0 +1,468 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import TYPE_CHECKING
+
+from constants import (
+    CONTROL_API_VERSION,
+    CONTROL_PAGE_MAX,
+    ROUTE_WAIT_MAX_TIMEOUT,
+    STACK_SAMPLE_INTERVAL,
+    TRACEMALLOC_FRAMES,
+)
+from olsr_control import _is_valid_ipv4, status_fields
+from olsr_metrics import snapshot as metrics_snapshot
+from olsr_profiling import ProfilingError
+
+if TYPE_CHECKING:
+    from olsr_main import OLSRNode
+
+"""
+结构化控制协议 (JSON)，与文本命令共用同一个控制端口，请求以 '{' 开头时按本协议处理
+请求:
+    {"v": 2, "id": 7, "cmd": "lookup", "dests": ["10.0.0.12", "10.0.0.5"]}
+    {"v": 2, "batch": [{"cmd": "routes"}, {"cmd": "neighbors"}, ...]}   # 一次往返执行多条命令
+    {"v": 2, "cmd": "subscribe", "lease": 30}   # 订阅路由变化，推送发往请求的源地址，见 route_events.py
+    {"v": 2, "cmd": "wait_route", "dest": "10.0.0.12", "timeout": 5}   # 没有路由时挂起，装入路由或超时才回应，不能放进 batch
+    {"v": 2, "cmd": "routes", "if_changed_since": 41, "epoch": 1792377708.2}   # 守护进程没有重启且路由表版本仍是 41 时只回应 not_modified
+    {"v": 2, "cmd": "routes", "limit": 200, "cursor": "[\"10.0.1.7\"]"}   # 分页，cursor 为上一页的 next_cursor，最后一页 next_cursor 为 null
+    {"v": 2, "cmd": "export_topology", "stream": true}   # 流式回应，见 StreamResponse
+    {"v": 2, "cmd": "stack_sample", "seconds": 10}   # 剖析命令 (profile/tracemalloc/stack_sample) 回应结果文件路径，见 olsr_profiling.py
+响应 (紧凑 JSON，无多余空白)，都带当前路由表版本 table_version (只在路由签名变化时增加) 和 epoch (守护进程启动时间)，
+table_version 在守护进程重启后从 0 开始，只有 epoch 相同时两个版本号才可比较:
+    {"v": 2, "id": 7, "table_version": 42, "epoch": 1792377708.2, "ok": true, "result": {...}}
+    {"v": 2, "table_version": 42, "epoch": 1792377708.2, "results": [{"ok": true, "result": {...}}, ...]}
+    {"v": 2, "table_version": 41, "epoch": 1792377708.2, "ok": true, "not_modified": true}
+    失败时 {"v": 2, "table_version": 42, "epoch": 1792377708.2, "ok": false, "error": "..."}
+表格类结果 (routes/neighbors/two_hop/topology) 用 {"fields": [...], "rows": [[...], ...]}，字段名只出现一次
+大表用 limit/cursor 分页 (按键列排序，游标是上一页最后一行的键，表在翻页期间变化也不会重复或跳过未变的行)，
+或者用 "stream": true 让守护进程把结果按行拆成多个报文发出 (紧凑 JSON lines)，不受单个 UDP 报文大小限制
+"""
+
+ROUTE_FIELDS = ["dest", "next_hop_ip", "hop_count", "distance", "valid", "state", "provisional"]
+
+
+class ControlApiError(Exception):
+    pass
+
+
+def _route_record(node: "OLSRNode", route: dict) -> dict:
+    record = {
+        "dest": route["dest"],
+        "next_hop_ip": route["next_hop_ip"],
+        "hop_count": route["hop_count"],
+        "distance": route["distance"],
+        "valid": route["valid"],
+        "state": route["state"],
+        "provisional": route.get("provisional", False),
+        "first_seen_at": route["first_seen_at"],
+        "last_updated_at": route["last_updated_at"],
+        "protocol_started_at": node.started_at,
+    }
+    if "next_hop_interfaces" in route:
+        record["next_hop_interfaces"] = route["next_hop_interfaces"]
+    if "gateway" in route:
+        record["gateway"] = route["gateway"]
+    return record
+
+
+def _require_ip(request: dict, key: str) -> str:
+    value = request.get(key)
+    if not isinstance(value, str) or not _is_valid_ipv4(value):
+        raise ControlApiError(f"invalid address: {value}")
+    return value
+
+
+def _cmd_routes(node: "OLSRNode", request: dict) -> dict:
+    routes = node.routing_manager.get_routes()
+    routes.update(node.routing_manager.get_prefix_routes())
+    rows = [[route.get(field, False) for field in ROUTE_FIELDS] for route in routes.values()]
+    return {"fields": ROUTE_FIELDS, "rows": rows, "last_recalculated_at": node.routing_manager.last_recalculated_at}
+
+
+def _cmd_lookup(node: "OLSRNode", request: dict) -> dict:
+    dests = request.get("dests")
+    if not isinstance(dests, list):
+        raise ControlApiError("dests must be a list")
+    routes = {}
+    for dest_ip in dests:
+        if not isinstance(dest_ip, str) or not _is_valid_ipv4(dest_ip):
+            raise ControlApiError(f"invalid address: {dest_ip}")
+        route = node.routing_manager.lookup_route(dest_ip)
+        if route is None:
+            routes[dest_ip] = None
+            continue
+        node.mark_route_active(route)
+        routes[dest_ip] = _route_record(node, route)
+    return {"routes": routes}
+
+
+def _cmd_discover(node: "OLSRNode", request: dict) -> dict:
+    dest_ip = _require_ip(request, "dest")
+    route = node.routing_manager.get_route(dest_ip)
+    if route is None:
+        node.routing_manager.recalculate_routing_table()
+        route = node.routing_manager.get_route(dest_ip)
+    return {"route": _route_record(node, route) if route is not None else None}
+
+
+def _cmd_neighbors(node: "OLSRNode", request: dict) -> dict:
+    selectors = node.neighbor_manager.mpr_selectors
+    rows = [
+        [neighbor_ip, neighbor.status == 1, neighbor.willingness, neighbor_ip in selectors]
+        for neighbor_ip, neighbor in sorted(node.neighbor_manager.neighbors.items())
+    ]
+    return {"fields": ["neighbor", "symmetric", "willingness", "selected_me"], "rows": rows}
+
+
+def _cmd_two_hop(node: "OLSRNode", request: dict) -> dict:
+    now = time.time()
+    rows = [
+        [entry.neighbor_main_addr, entry.two_hop_addr, round(entry.expiration_time - now, 3)]
+        for entry in node.neighbor_manager.two_hop_set.values()
+    ]
+    return {"fields": ["neighbor", "two_hop", "expires_in"], "rows": sorted(rows)}
+
+
+def _cmd_topology(node: "OLSRNode", request: dict) -> dict:
+    now = time.time()
+    rows = [
+        [entry.last_addr, entry.dest_addr, entry.seq, round(entry.expiration_time - now, 3)]
+        for entry in node.topology_manager.topology_set.values()
+    ]
+    return {"fields": ["last", "dest", "ansn", "expires_in"], "rows": sorted(rows)}
+
+
+def _cmd_mpr(node: "OLSRNode", request: dict) -> dict:
+    return {
+        "mpr_set": sorted(node.neighbor_manager.current_mpr_set),
+        "mpr_selectors": sorted(node.neighbor_manager.mpr_selectors),
+    }
+
+
+def _cmd_status(node: "OLSRNode", request: dict) -> dict:
+    return status_fields(node)
+
+
+def _cmd_metrics(node: "OLSRNode", request: dict) -> dict:
+    return metrics_snapshot(node)
+
+
+def _cmd_event_latency(node: "OLSRNode", request: dict) -> dict:
+    recent = request.get("recent", 0)
+    if not isinstance(recent, int) or isinstance(recent, bool) or recent < 0:
+        raise ControlApiError(f"invalid recent: {recent}")
+    result = {"types": node.event_latency.summary()}
+    if recent:
+        result["recent"] = node.event_latency.recent_traces(recent)
+    return result
+
+
+def _number(request: dict, key: str, default):
+    value = request.get(key, default)
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ControlApiError(f"invalid {key}: {value}")
+    return value
+
+
+def _cmd_profile(node: "OLSRNode", request: dict) -> dict:
+    action = request.get("action")
+    try:
+        if action == "start":
+            return node.profiler.start_cprofile()
+        if action == "stop":
+            return node.profiler.stop_cprofile()
+    except ProfilingError as exc:
+        raise ControlApiError(str(exc)) from exc
+    raise ControlApiError(f"invalid action: {action}")
+
+
+def _cmd_tracemalloc(node: "OLSRNode", request: dict) -> dict:
+    action = request.get("action")
+    try:
+        if action == "start":
+            return node.profiler.start_tracemalloc(int(_number(request, "frames", TRACEMALLOC_FRAMES)))
+        if action == "snapshot":
+            return node.profiler.snapshot_tracemalloc()
+        if action == "stop":
+            return node.profiler.stop_tracemalloc()
+    except ProfilingError as exc:
+        raise ControlApiError(str(exc)) from exc
+    raise ControlApiError(f"invalid action: {action}")
+
+
+def _cmd_stack_sample(node: "OLSRNode", request: dict) -> dict:
+    seconds = _number(request, "seconds", None)
+    interval_ms = _number(request, "interval_ms", STACK_SAMPLE_INTERVAL * 1000.0)
+    try:
+        return node.profiler.sample_stacks(seconds, interval_ms / 1000.0)
+    except ProfilingError as exc:
+        raise ControlApiError(str(exc)) from exc
+
+
+def _cmd_table_version(node: "OLSRNode", request: dict) -> dict:
+    return {"last_recalculated_at": node.routing_manager.last_recalculated_at}
+
+
+def _cmd_export_topology(node: "OLSRNode", request: dict) -> dict:
+    """整个拓扑图: 一跳邻居、二跳、TC 拓扑元组、MID 别名和 HNA 网段，每行第一列是行类型，各类型的字段名在 fields 里"""
+    now = time.time()
+    rows = []
+    for neighbor_ip, neighbor in sorted(node.neighbor_manager.neighbors.items()):
+        rows.append(["neighbor", node.my_ip, neighbor_ip, neighbor.status == 1, neighbor.willingness])
+    for entry in sorted(node.neighbor_manager.two_hop_set.values(), key=lambda entry: (entry.neighbor_main_addr, entry.two_hop_addr)):
+        rows.append(["two_hop", entry.neighbor_main_addr, entry.two_hop_addr, round(entry.expiration_time - now, 3)])
+    for entry in sorted(node.topology_manager.topology_set.values(), key=lambda entry: (entry.last_addr, entry.dest_addr)):
+        rows.append(["tc", entry.last_addr, entry.dest_addr, entry.seq, round(entry.expiration_time - now, 3)])
+    for iface_addr, entry in sorted(node.mid_manager.interface_set.items()):
+        rows.append(["mid", entry.main_addr, iface_addr])
+    for gateway_addr, network_addr, prefix_len in sorted(node.hna_manager.association_set):
+        rows.append(["hna", gateway_addr, f"{network_addr}/{prefix_len}"])
+    return {
+        "node": node.my_ip,
+        "fields": {
+            "neighbor": ["from", "to", "symmetric", "willingness"],
+            "two_hop": ["via", "to", "expires_in"],
+            "tc": ["last", "dest", "ansn", "expires_in"],
+            "mid": ["main", "alias"],
+            "hna": ["gateway", "network"],
+        },
+        "rows": rows,
+    }
+
+
+def _cmd_report_link_failure(node: "OLSRNode", request: dict) -> dict:
+    next_hop_ip = _require_ip(request, "next_hop")
+    targets, started = node.report_link_failure(next_hop_ip)
+    return {"probing": targets, "probes_started": len(started)}
+
+
+def _cmd_subscribe(node: "OLSRNode", request: dict, addr) -> dict:
+    lease = request.get("lease")
+    if lease is not None and (not isinstance(lease, (int, float)) or lease <= 0):
+        raise ControlApiError(f"invalid lease: {lease}")
+    granted = node.route_subscriptions.subscribe(addr, time.time(), lease)
+    if granted is None:
+        raise ControlApiError("too many subscribers")
+    return {"lease": granted, "epoch": node.started_at, "version": node.routing_manager.table_version}
+
+
+def _cmd_unsubscribe(node: "OLSRNode", request: dict, addr) -> dict:
+    return {"removed": node.route_subscriptions.unsubscribe(addr)}
+
+
+COMMANDS = {
+    "routes": _cmd_routes,
+    "lookup": _cmd_lookup,
+    "discover": _cmd_discover,
+    "neighbors": _cmd_neighbors,
+    "two_hop": _cmd_two_hop,
+    "topology": _cmd_topology,
+    "mpr": _cmd_mpr,
+    "status": _cmd_status,
+    "metrics": _cmd_metrics,
+    "event_latency": _cmd_event_latency,
+    "profile": _cmd_profile,
+    "tracemalloc": _cmd_tracemalloc,
+    "stack_sample": _cmd_stack_sample,
+    "table_version": _cmd_table_version,
+    "export_topology": _cmd_export_topology,
+    "report_link_failure": _cmd_report_link_failure,
+}
+
+# 支持 if_changed_since 的命令: epoch 和路由表版本都等于请求给出的值时只回应 not_modified，不执行命令
+CONDITIONAL_COMMANDS = {"routes", "lookup"}
+
+# 支持 limit/cursor 分页的表格命令及其键列，行按键列排序
+PAGED_COMMANDS = {
+    "routes": ["dest"],
+    "neighbors": ["neighbor"],
+    "two_hop": ["neighbor", "two_hop"],
+    "topology": ["last", "dest"],
+}
+
+# 支持 "stream": true 的命令，结果需有 rows
+STREAM_COMMANDS = set(PAGED_COMMANDS) | {"export_topology"}
+
+# 需要请求源地址的命令，处理函数多一个 addr 参数
+CLIENT_COMMANDS = {
+    "subscribe": _cmd_subscribe,
+    "unsubscribe": _cmd_unsubscribe,
+}
+
+
+def _paginate(result: dict, key_fields: list, request: dict) -> dict:
+    """按键列排序后取 cursor 之后的 limit 行，next_cursor 为本页最后一行的键，没有后续行时为 None"""
+    limit = request.get("limit", CONTROL_PAGE_MAX)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 0 < limit <= CONTROL_PAGE_MAX:
+        raise ControlApiError(f"invalid limit: {limit} (1..{CONTROL_PAGE_MAX})")
+    columns = [result["fields"].index(field) for field in key_fields]
+    rows = sorted(result["rows"], key=lambda row: [row[column] for column in columns])
+    cursor = request.get("cursor")
+    if cursor is not None:
+        try:
+            after = json.loads(cursor) if isinstance(cursor, str) else None
+        except ValueError:
+            after = None
+        if not isinstance(after, list) or len(after) != len(columns):
+            raise ControlApiError(f"invalid cursor: {cursor}")
+        rows = [row for row in rows if [row[column] for column in columns] > after]
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = json.dumps([page[-1][column] for column in columns], separators=(",", ":"))
+    return dict(result, rows=page, next_cursor=next_cursor)
+
+
+def _run_one(node: "OLSRNode", request, addr, streaming=False) -> dict:
+    if not isinstance(request, dict):
+        return {"ok": False, "error": "request must be an object"}
+    command = request.get("cmd")
+    try:
+        if request.get("stream") and not streaming:
+            raise ControlApiError("stream not supported in batch")
+        since = request.get("if_changed_since")
+        if since is not None:
+            if command not in CONDITIONAL_COMMANDS:
+                raise ControlApiError(f"if_changed_since not supported by {command}")
+            if not isinstance(since, int) or isinstance(since, bool):
+                raise ControlApiError(f"invalid if_changed_since: {since}")
+            epoch = request.get("epoch")
+            if not isinstance(epoch, (int, float)) or isinstance(epoch, bool):
+                raise ControlApiError(f"if_changed_since requires epoch: {epoch}")
+            if since == node.routing_manager.table_version and epoch == node.started_at:
+                if command == "lookup":
+                    # 转发程序靠 lookup 重新验证缓存，未变化时也要刷新这些路由的活跃下一跳
+                    _cmd_lookup(node, request)
+                return {"ok": True, "not_modified": True}
+        if command in CLIENT_COMMANDS and addr is not None:
+            return {"ok": True, "result": CLIENT_COMMANDS[command](node, request, addr)}
+        handler = COMMANDS.get(command)
+        if handler is None:
+            return {"ok": False, "error": f"unknown command: {command}"}
+        result = handler(node, request)
+        if command in PAGED_COMMANDS and ("limit" in request or "cursor" in request):
+            result = _paginate(result, PAGED_COMMANDS[command], request)
+        return {"ok": True, "result": result}
+    except ControlApiError as exc:
+        return {"ok": False, "error": str(exc)}
+
+
+def _response_head(node: "OLSRNode", request) -> dict:
+    head = {"v": CONTROL_API_VERSION}
+    if isinstance(request, dict) and "id" in request:
+        head["id"] = request["id"]
+    head["table_version"] = node.routing_manager.table_version
+    head["epoch"] = node.started_at
+    return head
+
+
+def _finish(node: "OLSRNode", request, response: dict) -> str:
+    """所有 JSON 回应都带协议版本、当前路由表版本、epoch 和请求的 id"""
+    finished = _response_head(node, request)
+    finished.update(response)
+    return encode_response(finished)
+
+
+class StreamResponse:
+    """
+    流式回应: 结果按行拆开 (紧凑 JSON lines)，由 node 打包成多个报文依次发出，每个报文里的行用换行分隔
+    第一行是分块头 {"v", "id", "table_version", "epoch", "ok": true, "chunk": 序号, "more": 之后是否还有报文}，
+    最后一个报文的分块头另带 "lines": 总行数，客户端据此检查丢失
+    数据的第一行是结果里除 rows 以外的字段 (fields 等)，之后每行是一个 row
+    """
+
+    def __init__(self, head: dict, lines: list):
+        self.head = head
+        self.lines = lines
+
+    def _chunk_head(self, index: int, more: bool) -> str:
+        head = dict(self.head, ok=True, chunk=index, more=more)
+        if not more:
+            head["lines"] = len(self.lines)
+        return encode_response(head)
+
+    def encode(self, max_size: int) -> list:
+        # 为分块头预留最长情况 (最大的序号和行数) 的空间
+        reserve = len(self._chunk_head(len(self.lines), False).encode("utf-8")) + 1
+        groups = []
+        current = []
+        size = reserve
+        for line in self.lines:
+            line_size = len(line.encode("utf-8")) + 1
+            if current and size + line_size > max_size:
+                groups.append(current)
+                current = []
+                size = reserve
+            current.append(line)
+            size += line_size
+        groups.append(current)
+        return [
+            "\n".join([self._chunk_head(index, index < len(groups) - 1)] + group).encode("utf-8")
+            for index, group in enumerate(groups)
+        ]
+
+
+def _stream(node: "OLSRNode", request: dict, addr) -> str | StreamResponse:
+    if request.get("cmd") not in STREAM_COMMANDS:
+        return _finish(node, request, {"ok": False, "error": f"stream not supported by {request.get('cmd')}"})
+    response = _run_one(node, request, addr, streaming=True)
+    if not response.get("ok") or response.get("not_modified"):
+        return _finish(node, request, response)
+    result = response["result"]
+    lines = [encode_response({key: value for key, value in result.items() if key != "rows"})]
+    lines.extend(encode_response(row) for row in result["rows"])
+    return StreamResponse(_response_head(node, request), lines)
+
+
+def _wait_route(node: "OLSRNode", request: dict, addr) -> str | None:
+    dest_ip = _require_ip(request, "dest")
+    timeout = request.get("timeout", ROUTE_WAIT_MAX_TIMEOUT)
+    if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or not timeout > 0:
+        raise ControlApiError(f"invalid timeout: {timeout}")
+    started = time.time()
+
+    def respond(route) -> str:
+        result = {
+            "route": _route_record(node, route) if route is not None else None,
+            "waited": round(time.time() - started, 6),
+        }
+        return _finish(node, request, {"ok": True, "result": result})
+
+    return node.park_route_wait(dest_ip, timeout, addr, respond)
+
+
+def process_json_command(node: "OLSRNode", command_text: str, addr=None) -> str | StreamResponse | None:
+    """
+    在持有 node.lock 时调用，返回紧凑 JSON 文本；addr 为请求的源地址，subscribe 用它作为推送目标
+    wait_route 挂起时返回 None，回应稍后由 node 发往 addr；"stream": true 时返回 StreamResponse
+    """
+    try:
+        request = json.loads(command_text)
+    except ValueError as exc:
+        return _finish(node, None, {"ok": False, "error": f"invalid json: {exc}"})
+    if not isinstance(request, dict):
+        return _finish(node, None, {"ok": False, "error": "request must be an object"})
+    if request.get("v", CONTROL_API_VERSION) != CONTROL_API_VERSION:
+        return _finish(node, request, {"ok": False, "error": f"unsupported version: {request.get('v')}"})
+
+    if request.get("cmd") == "wait_route" and addr is not None:
+        try:
+            return _wait_route(node, request, addr)
+        except ControlApiError as exc:
+            return _finish(node, request, {"ok": False, "error": str(exc)})
+
+    if request.get("stream"):
+        return _stream(node, request, addr)
+
+    if "batch" in request:
+        batch = request["batch"]
+        if not isinstance(batch, list):
+            return _finish(node, request, {"ok": False, "error": "batch must be a list"})
+        return _finish(node, request, {"results": [_run_one(node, item, addr) for item in batch]})
+    return _finish(node, request, _run_one(node, request, addr))
+
+
+def encode_response(response: dict) -> str:
+    return json.dumps(response, separators=(",", ":"), ensure_ascii=False)
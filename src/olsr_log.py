@@ -0,0 +1,211 @@
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+from constants import LOG_DEFAULT_LEVEL, LOG_FLUSH_INTERVAL, LOG_RING_SIZE
+
+"""
+本文件实现协议守护进程的分级、结构化、异步日志
+- 每个子系统 (link/neighbor/mpr/topology/route/forward/...) 一个 Logger，级别可以单独设置
+- 低于当前级别的日志只做一次整数比较就返回，参数不会被格式化，热点路径默认没有开销
+- 记录以元组形式追加到有界的 deque 环形缓冲区，append 在 GIL 下是原子操作，生产者不加锁
+- 后台写线程定期把新记录格式化 (text 或 json) 写到 stdout/日志文件，协议锁内不做任何 I/O
+- 写线程来不及取走、被环形缓冲区挤掉的记录计入 dropped
+级别描述字符串的格式: "info" 或 "warning,forward=debug,route=info"
+"""
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR", OFF: "OFF"}
+LEVELS_BY_NAME = {name.lower(): level for level, name in LEVEL_NAMES.items()}
+
+SUBSYSTEMS = (
+    "main", "link", "neighbor", "mpr", "topology", "route", "forward", "send",
+    "mid", "hna", "probe", "sync", "snapshot", "control", "packet", "profile",
+)
+
+
+def parse_level(text):
+    level = LEVELS_BY_NAME.get(str(text).strip().lower())
+    if level is None:
+        raise ValueError(f"unknown log level: {text}")
+    return level
+
+
+def parse_level_spec(spec):
+    """
+    解析级别描述字符串
+    :return: (默认级别或 None, {subsystem: level})
+    """
+    default_level = None
+    levels = {}
+    for item in str(spec).split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" in item:
+            subsystem, level_text = item.split("=", 1)
+            subsystem = subsystem.strip().lower()
+            if subsystem not in SUBSYSTEMS:
+                raise ValueError(f"unknown log subsystem: {subsystem}")
+            levels[subsystem] = parse_level(level_text)
+        else:
+            default_level = parse_level(item)
+    return default_level, levels
+
+
+class Logger:
+    __slots__ = ("hub", "subsystem", "level")
+
+    def __init__(self, hub, subsystem, level):
+        self.hub = hub
+        self.subsystem = subsystem
+        self.level = level
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, msg, *args, **fields):
+        if level >= self.level:
+            self.hub.emit(level, self.subsystem, msg, args, fields)
+
+    def debug(self, msg, *args, **fields):
+        if self.level <= DEBUG:
+            self.hub.emit(DEBUG, self.subsystem, msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        if self.level <= INFO:
+            self.hub.emit(INFO, self.subsystem, msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        if self.level <= WARNING:
+            self.hub.emit(WARNING, self.subsystem, msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        if self.level <= ERROR:
+            self.hub.emit(ERROR, self.subsystem, msg, args, fields)
+
+
+class LogHub:
+    def __init__(self, ring_size=LOG_RING_SIZE, default_level=LOG_DEFAULT_LEVEL):
+        # 记录格式: (seq, timestamp, level, subsystem, msg, args, fields)
+        self.ring = deque(maxlen=ring_size)
+        self.seq = itertools.count(1)
+        self.default_level = parse_level(default_level)
+        self.overrides = {}
+        self.loggers = {}
+
+        self.stream = None
+        self.log_format = "text"
+        self.interval = LOG_FLUSH_INTERVAL
+        self.writer = None
+        self.wake = threading.Event()
+        self.flush_lock = threading.Lock()  # 只在写线程和 flush() 之间互斥，生产者不碰这把锁
+        self.written_seq = 0
+        self.written = 0
+        self.dropped = 0
+
+    def get_logger(self, subsystem):
+        logger = self.loggers.get(subsystem)
+        if logger is None:
+            logger = Logger(self, subsystem, self.overrides.get(subsystem, self.default_level))
+            logger = self.loggers.setdefault(subsystem, logger)
+        return logger
+
+    def set_levels(self, default_level=None, levels=None):
+        if default_level is not None:
+            self.default_level = default_level
+            # 单独设置整体级别时清掉子系统覆盖，回到统一级别
+            if not levels:
+                self.overrides = {}
+        self.overrides.update(levels or {})
+        for subsystem, logger in self.loggers.items():
+            logger.level = self.overrides.get(subsystem, self.default_level)
+
+    def apply_spec(self, spec):
+        self.set_levels(*parse_level_spec(spec))
+
+    def describe_levels(self):
+        items = [LEVEL_NAMES[self.default_level].lower()]
+        items.extend(f"{name}={LEVEL_NAMES[level].lower()}" for name, level in sorted(self.overrides.items()))
+        return ",".join(items)
+
+    def emit(self, level, subsystem, msg, args, fields):
+        self.ring.append((next(self.seq), time.time(), level, subsystem, msg, args, fields))
+        if level >= WARNING:
+            self.wake.set()
+
+    def start_writer(self, stream=None, log_format="text", interval=LOG_FLUSH_INTERVAL):
+        self.stream = stream if stream is not None else sys.stdout
+        self.log_format = log_format
+        self.interval = interval
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.loop_writer, daemon=True)
+            self.writer.start()
+
+    def loop_writer(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def flush(self):
+        if self.stream is None:
+            return
+        with self.flush_lock:
+            records = list(self.ring)
+            new_records = [record for record in records if record[0] > self.written_seq]
+            if not new_records:
+                return
+            self.dropped += new_records[0][0] - self.written_seq - 1
+            self.stream.write("".join(self.format_record(record) + "\n" for record in new_records))
+            self.stream.flush()
+            self.written_seq = new_records[-1][0]
+            self.written += len(new_records)
+
+    def recent(self, count):
+        records = list(self.ring)[-count:] if count > 0 else []
+        return [self.format_record(record, "text") for record in records]
+
+    def format_record(self, record, log_format=None):
+        _seq, timestamp, level, subsystem, msg, args, fields = record
+        try:
+            text = msg % args if args else msg
+        except (TypeError, ValueError):
+            text = f"{msg} {args}"
+        if (log_format or self.log_format) == "json":
+            payload = {"ts": round(timestamp, 6), "level": LEVEL_NAMES[level], "subsystem": subsystem, "msg": text}
+            payload.update(fields)
+            return json.dumps(payload, ensure_ascii=False, default=str)
+        stamp = time.strftime("%H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}"
+        extra = "".join(f" {key}={value}" for key, value in fields.items())
+        return f"{stamp} {LEVEL_NAMES[level]:<7} [{subsystem}] {text}{extra}"
+
+
+_hub = LogHub()
+
+
+def get_logger(subsystem):
+    return _hub.get_logger(subsystem)
+
+
+def get_hub():
+    return _hub
+
+
+def configure_logging(level_spec=LOG_DEFAULT_LEVEL, log_format="text", log_file=None):
+    """由守护进程入口调用: 设置级别并启动后台写线程，log_file 为空时写到 stdout"""
+    _hub.apply_spec(level_spec)
+    stream = open(log_file, "a", encoding="utf-8") if log_file else None
+    _hub.start_writer(stream, log_format)
+    return _hub
@@ -1,30 +1,77 @@
 import argparse
+import fcntl
 import os
 import random
+import signal
 import socket
 import struct
 import threading
 import time
 
 from constants import *
+from emission_scheduler import AdaptiveInterval
 from flooding_mpp import DuplicateSet
-from hello_msg_body import create_hello_body, parse_hello_body
+from forward_scheduler import ForwardQueue
+from hello_msg_body import create_hello_bodies, parse_hello_body
+from hna_manager import HNAManager
+from hna_msg_body import create_hna_body, normalize_network, parse_hna_body
+from link_probe import LivenessMonitor, ProbeManager, create_probe_body, parse_probe_body
 from link_sensing import LinkSet
+from mid_manager import MIDManager
+from mid_msg_body import create_mid_body, parse_mid_body
 from neigh_manager import NeighborManager
+from olsr_log import configure_logging, get_hub, get_logger
 from olsr_control import process_control_command
+from olsr_control_api import StreamResponse, encode_response, process_json_command
+from olsr_metrics import DaemonMetrics, EventLatency, InstrumentedLock, start_http_server
+from olsr_profiling import NodeProfiler
 from pkt_msg_fmt import create_message_header, create_packet_header, decode_mantissa
+from route_events import RouteSubscriptions, RouteWaits
+from route_shm import RouteTableExporter
 from routing_manager import RoutingManager
-from tc_msg_body import create_tc_body, parse_tc_body
+from state_snapshot import build_snapshot, read_snapshot, restore_snapshot, write_snapshot
+from tc_msg_body import create_tc_bodies, create_tc_delta_body, is_compact_tc_body, parse_tc_body, to_plain_tc_body
+from topo_sync_body import create_topo_dump_bodies, parse_topo_dump_body
 from topology_manager import TopologyManager
 
+_log = get_logger("main")
+_send_log = get_logger("send")
+_forward_log = get_logger("forward")
+_probe_log = get_logger("probe")
+_sync_log = get_logger("sync")
+_snapshot_log = get_logger("snapshot")
+
 
 class OLSRNode:
-    def __init__(self, my_ip, port=5005, control_port=5100):
+    def __init__(
+        self,
+        my_ip,
+        port=5005,
+        control_port=5100,
+        adaptive_intervals=True,
+        fisheye=False,
+        tc_redundancy=TC_REDUNDANCY,
+        hna_networks=None,
+        liveness_interval=LIVENESS_PROBE_INTERVAL,
+        liveness_miss_threshold=LIVENESS_MISS_THRESHOLD,
+        state_file=None,
+        topology_sync=True,
+        delta_tc=False,
+        compact_addresses=False,
+        route_shm=None,
+        control_unix=None,
+        metrics_host="127.0.0.1",
+        metrics_port=0,
+        profile_dir=PROFILE_DIR,
+    ):
         self.my_ip = my_ip
         self.port = int(port)
         self.control_port = int(control_port)
         self.running = True
+        self.stopped = False
         self.started_at = time.time()
+        self.state_file = state_file
+        self.warm_restarted = False
 
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -35,57 +82,208 @@ class OLSRNode:
         self.control_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.control_sock.bind(("127.0.0.1", self.control_port))
 
+        # 可选的 Unix seqpacket 控制端点，每个连接可以连续发送多条请求，按顺序回应
+        self.control_unix = control_unix
+        self.control_unix_sock = None
+        self.control_connections = set()
+        if control_unix:
+            if os.path.exists(control_unix):
+                os.unlink(control_unix)
+            self.control_unix_sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.control_unix_sock.bind(control_unix)
+            self.control_unix_sock.listen(CONTROL_UNIX_BACKLOG)
+
         self.link_set = LinkSet()
         self.link_set.my_ip = my_ip
         self.neighbor_manager = NeighborManager(my_ip)
         self.topology_manager = TopologyManager(my_ip)
+        self.mid_manager = MIDManager(my_ip)
+        self.hna_manager = HNAManager(my_ip)
         self.routing_manager = RoutingManager(
             my_ip,
             self.neighbor_manager,
             self.topology_manager,
+            mid_manager=self.mid_manager,
+            hna_manager=self.hna_manager,
+            link_set=self.link_set,
         )
         self.duplicate_set = DuplicateSet()
-        self.lock = threading.Lock()
+        self.forward_queue = ForwardQueue()
+        self.probe_manager = ProbeManager()
+        self.liveness_monitor = LivenessMonitor(liveness_interval, liveness_miss_threshold)
+        # 转发程序最近查询过的路由的下一跳主地址 { next_hop_ip: 最近一次查询时间 }
+        self.active_next_hops = {}
+        # 协议锁，记录每次获取的等待时间和持有时间，见 olsr_metrics.py
+        self.lock = InstrumentedLock()
 
         self.pkt_seq_num = 0
         self.msg_seq_num = 0
         self.ansn = 0
 
+        self.hello_trigger = threading.Event()
+        self.tc_trigger = threading.Event()
+        self.forward_trigger = threading.Event()
+        self.probe_trigger = threading.Event()
+        self.advertised_hello_state = ()
+        self.advertised_tc_state = ()
+        self.tc_empty_until = 0.0   # 宣告集合变空后在此之前继续发送空 TC
+        if adaptive_intervals:
+            self.hello_schedule = AdaptiveInterval(HELLO_MIN_INTERVAL, HELLO_MAX_INTERVAL)
+            self.tc_schedule = AdaptiveInterval(TC_MIN_INTERVAL, TC_MAX_INTERVAL)
+        else:
+            self.hello_schedule = AdaptiveInterval(HELLO_INTERVAL, HELLO_INTERVAL)
+            self.tc_schedule = AdaptiveInterval(TC_INTERVAL, TC_INTERVAL)
+        self.tc_ttl_cycle = TC_FISHEYE_TTLS if fisheye else (TC_DEFAULT_TTL,)
+        self.tc_ttl_index = 0
+        self.tc_redundancy = int(tc_redundancy)
+        self.delta_tc = bool(delta_tc)
+        self.tc_base = None         # 最近一次完整 TC 的 (ANSN, 邻居集合)，增量 TC 以它为基准
+        self.tc_base_ttl = 0        # 这个完整 TC 发出时的 TTL，鱼眼模式下更远的节点没有收到这个基准
+        self.tcs_since_full = 0
+        self.tc_full_sent = 0
+        self.tc_delta_sent = 0
+        self.tc_gap_requests = 0
+        self.last_gap_request_at = None
+        # 紧凑地址编码: HELLO 宣告能力，所有链路邻居都支持时 HELLO/TC 改用地址块
+        self.compact_addresses = bool(compact_addresses)
+        self.compact_hello_sent = 0
+        self.compact_tc_sent = 0
+        self.tc_transcoded = 0
+
+        # 多射频: 本节点全部接口地址 (含主地址)，MID 宣告其中除主地址外的部分
+        self.local_addresses = {my_ip}
+        self.link_set.local_addresses = self.local_addresses
+        # 网关: 通过 HNA 宣告的本地连接网段 [(network_ip, prefix_len), ...]
+        self.hna_networks = list(hna_networks or [])
+
+        self.topology_sync = bool(topology_sync)
+        self.last_topology_request_at = None
+        self.topology_requests_sent = 0
+        self.topology_dumps_received = 0
+
+        # 共享内存路由表导出，转发程序映射同一个文件后直接查下一跳
+        self.route_exporter = None
+        if route_shm:
+            self.route_exporter = RouteTableExporter(route_shm, ROUTE_SHM_CAPACITY)
+            self.routing_manager.change_listeners.append(self.export_routes)
+
+        # 路由变化订阅，变化时推送到订阅者的控制端口地址
+        self.route_subscriptions = RouteSubscriptions()
+        self.routing_manager.change_listeners.append(self.publish_route_events)
+        # 挂起的 WAIT_ROUTE 请求，路由装入时立即回应；新请求挂起时唤醒 loop_route_waits 重新计算超时
+        self.route_waits = RouteWaits()
+        self.route_wait_wakeup = threading.Event()
+        self.routing_manager.change_listeners.append(self.answer_route_waits)
+
+        self.tx_packets = 0
+        self.tx_bytes = 0
+        self.rx_packets = 0
+        self.rx_bytes = 0
+        self.forwarded_messages = 0
+        self.link_failure_reports = 0
+        # 按消息类型的收发/转发计数，METRICS 命令和可选的 HTTP 端点导出
+        self.metrics = DaemonMetrics()
+        self.metrics_host = metrics_host
+        self.metrics_port = int(metrics_port)
+        self.metrics_server = None
+        # HELLO/TC 从收到到路由表反映出来的各阶段延迟
+        self.event_latency = EventLatency()
+        # 按需的 cProfile / tracemalloc / 栈采样，由控制命令驱动
+        self.profiler = NodeProfiler(my_ip, self.lock, profile_dir)
+
     def start(self):
-        print(
-            f"[*] OLSR Node {self.my_ip} started on udp/{self.port} "
-            f"control=127.0.0.1:{self.control_port}"
+        _log.info(
+            "OLSR Node %s started on udp/%s control=127.0.0.1:%s control_unix=%s",
+            self.my_ip,
+            self.port,
+            self.control_port,
+            self.control_unix,
         )
+        if self.state_file:
+            self.load_state()
+            threading.Thread(target=self.loop_snapshot, daemon=True).start()
         threading.Thread(target=self.loop_hello, daemon=True).start()
         threading.Thread(target=self.loop_tc, daemon=True).start()
+        threading.Thread(target=self.loop_mid, daemon=True).start()
+        if self.hna_networks:
+            threading.Thread(target=self.loop_hna, daemon=True).start()
+        threading.Thread(target=self.loop_forward, daemon=True).start()
+        threading.Thread(target=self.loop_probe, daemon=True).start()
+        if self.liveness_monitor.enabled():
+            threading.Thread(target=self.loop_liveness, daemon=True).start()
         threading.Thread(target=self.loop_cleanup, daemon=True).start()
         threading.Thread(target=self.loop_control, daemon=True).start()
+        threading.Thread(target=self.loop_route_waits, daemon=True).start()
+        if self.control_unix_sock is not None:
+            threading.Thread(target=self.loop_control_unix, daemon=True).start()
+        if self.metrics_port:
+            self.metrics_server = start_http_server(self, self.metrics_host, self.metrics_port)
+            _log.info("metrics on http://%s:%s/metrics", self.metrics_host, self.metrics_port)
         self.receive_loop()
 
+    def request_stop(self, _signum=None, _frame=None):
+        """
+        SIGTERM 处理函数: 只清除 running 并给本节点的协议端口发一个空报文唤醒 receive_loop
+        信号可能在主线程持有 node.lock 时到达，保存快照、关闭共享内存导出等收尾由 receive_loop 返回后的 stop() 完成
+        """
+        self.running = False
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as waker:
+                waker.sendto(b"", ("127.0.0.1", self.port))
+        except OSError:
+            pass
+
     def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        if self.state_file:
+            self.save_state()
+        if self.route_exporter is not None:
+            with self.lock:
+                self.route_exporter.close()
         self.running = False
-        for sock in (self.sock, self.control_sock):
+        self.route_wait_wakeup.set()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        with self.lock:
+            connections = list(self.control_connections)
+        for sock in [self.sock, self.control_sock, self.control_unix_sock, *connections]:
+            if sock is None:
+                continue
             try:
                 sock.close()
             except OSError:
                 pass
+        if self.control_unix_sock is not None:
+            try:
+                os.unlink(self.control_unix)
+            except OSError:
+                pass
 
     def receive_loop(self):
         while self.running:
             try:
-                data, addr = self.sock.recvfrom(2048)
+                data, addr = self.sock.recvfrom(MAX_RECV_SIZE)
+                received_at = time.perf_counter()
             except OSError:
                 break
             except Exception as exc:
-                print(f"[Error] Receive: {exc}")
+                _log.error("Receive: %s", exc)
                 continue
+            if not self.running:
+                break
 
             sender_ip = addr[0]
-            if sender_ip == self.my_ip:
+            if sender_ip in self.local_addresses:
                 continue
-            self.process_packet(data, sender_ip)
+            self.rx_packets += 1
+            self.rx_bytes += len(data)
+            self.process_packet(data, sender_ip, received_at)
 
-    def process_packet(self, data, sender_ip):
+    def process_packet(self, data, sender_ip, received_at=None):
         if len(data) < 4:
             return
 
@@ -114,18 +312,40 @@ class OLSRNode:
                 if body_end > len(data):
                     break
                 msg_body_bytes = data[body_start:body_end]
+                self.metrics.rx.add(msg_type, msg_size)
 
-                if not self.duplicate_set.is_duplicate(orig_ip, msg_seq):
+                if msg_type == HELLO_MESSAGE:
+                    # HELLO 从不转发，多射频邻居在每个接口上发出的同一条 HELLO 都要参与链路感知，不做重复检测
+                    self.begin_event_trace(msg_type, received_at)
+                    hello_info = parse_hello_body(msg_body_bytes)
+                    self.event_latency.mark("parse")
+                    if hello_info:
+                        self.process_hello(sender_ip, hello_info, validity_time, orig_ip)
+                    self.event_latency.finish(self.routing_manager.table_version)
+                elif msg_type == PROBE_MESSAGE:
+                    self.process_probe(sender_ip, msg_body_bytes)
+                elif msg_type == PROBE_REPLY_MESSAGE:
+                    self.process_probe_reply(sender_ip, msg_body_bytes)
+                elif msg_type == TOPO_REQUEST_MESSAGE:
+                    self.process_topology_request(sender_ip)
+                elif msg_type == TOPO_DUMP_MESSAGE:
+                    self.process_topology_dump(sender_ip, msg_body_bytes)
+                elif not self.duplicate_set.is_duplicate(orig_ip, msg_seq):
                     self.duplicate_set.record_message(orig_ip, msg_seq, time.time())
 
-                    if msg_type == HELLO_MESSAGE:
-                        hello_info = parse_hello_body(msg_body_bytes)
-                        if hello_info:
-                            self.process_hello(sender_ip, hello_info, validity_time)
-                    elif msg_type == TC_MESSAGE:
+                    if msg_type == TC_MESSAGE:
+                        self.begin_event_trace(msg_type, received_at)
                         tc_info = parse_tc_body(msg_body_bytes)
+                        self.event_latency.mark("parse")
                         if tc_info:
-                            self.process_tc(orig_ip, tc_info, validity_time)
+                            self.process_tc(orig_ip, tc_info, validity_time, sender_ip)
+                        self.event_latency.finish(self.routing_manager.table_version)
+                    elif msg_type == MID_MESSAGE:
+                        self.process_mid(orig_ip, parse_mid_body(msg_body_bytes), validity_time)
+                    elif msg_type == HNA_MESSAGE:
+                        self.process_hna(orig_ip, parse_hna_body(msg_body_bytes), validity_time)
+                else:
+                    self.metrics.duplicates_dropped += 1
 
                 if self.check_forwarding_condition(sender_ip, orig_ip, msg_seq, ttl):
                     full_msg_data = data[cursor:body_end]
@@ -133,85 +353,472 @@ class OLSRNode:
 
                 cursor += msg_size
 
-    def process_hello(self, sender_ip, hello_info, validity_time):
+    def begin_event_trace(self, msg_type, received_at):
+        # 不经过 receive_loop 的报文 (received_at 为空) 从开始处理时计时
+        if received_at is None:
+            received_at = time.perf_counter()
+        self.event_latency.begin(msg_type, received_at, self.routing_manager.table_version)
+
+    def process_hello(self, sender_ip, hello_info, validity_time, originator_ip=None):
         current_time = time.time()
+        # 链路按接口地址 (sender_ip) 感知，邻居按主地址 (HELLO 的 Originator) 管理
+        main_ip = originator_ip or sender_ip
+        if main_ip != sender_ip:
+            self.mid_manager.add_alias(main_ip, sender_ip, validity_time, current_time)
         self.link_set.process_hello(sender_ip, hello_info, validity_time)
 
-        link = self.link_set.links.get(sender_ip)
-        is_sym = link.is_symmetric() if link else False
+        neigh = self.neighbor_manager.neighbors.get(main_ip)
+        was_sym = neigh is not None and neigh.status == 1
+        is_sym = self.has_symmetric_link(main_ip)
 
         self.neighbor_manager.update_neighbor_status(
-            sender_ip,
+            main_ip,
             hello_info["willingness"],
             is_sym,
         )
 
         if not is_sym:
+            self.event_latency.mark("state")
+            self.check_triggers()
             return
 
+        main_hello_info = self.to_main_addresses(hello_info)
         self.neighbor_manager.process_2hop_neighbors(
-            sender_ip,
-            hello_info,
+            main_ip,
+            main_hello_info,
             validity_time,
             current_time,
         )
         self.neighbor_manager.process_mpr_selector(
-            sender_ip,
-            hello_info,
+            main_ip,
+            main_hello_info,
             validity_time,
             current_time,
         )
+        self.event_latency.mark("state")
         self.neighbor_manager.recalculate_mpr()
+        self.event_latency.mark("mpr")
         self.routing_manager.recalculate_routing_table()
+        self.event_latency.mark("route")
+        self.check_triggers()
+        if not was_sym:
+            self.request_topology(sender_ip)
 
-    def process_tc(self, originator_ip, tc_info, validity_time):
-        self.topology_manager.process_tc_message(
-            originator_ip,
-            tc_info,
-            validity_time,
-            time.time(),
+    def process_tc(self, originator_ip, tc_info, validity_time, sender_ip=None):
+        current_time = time.time()
+        if tc_info["delta"]:
+            if not self.topology_manager.process_tc_delta(originator_ip, tc_info, validity_time, current_time):
+                # 错过了基准完整 TC: 向转发这条 TC 的邻居拉取拓扑集，之后等下一个完整 TC 重建基准
+                self.request_tc_resync(sender_ip)
+                return
+        else:
+            self.topology_manager.record_tc_base(originator_ip, tc_info["ansn"], tc_info["advertised_neighbors"])
+            self.topology_manager.process_tc_message(
+                originator_ip,
+                tc_info,
+                validity_time,
+                current_time,
+            )
+        self.event_latency.mark("state")
+        self.routing_manager.recalculate_routing_table()
+        self.event_latency.mark("route")
+
+    def has_symmetric_link(self, main_ip):
+        # 只要有一条接口链路对称，邻居就是对称的 (RFC 3626 Section 8.1)
+        for iface_ip in self.mid_manager.expand([main_ip]):
+            link = self.link_set.links.get(iface_ip)
+            if link and link.is_symmetric():
+                return True
+        return False
+
+    def process_probe(self, sender_ip, probe_body):
+        probe_id = parse_probe_body(probe_body)
+        if probe_id is None:
+            return
+        reply_body = create_probe_body(probe_id)
+        header = create_message_header(
+            PROBE_REPLY_MESSAGE,
+            PROBE_TIMEOUT,
+            len(reply_body),
+            self.my_ip,
+            1,
+            0,
+            self.get_next_msg_seq(),
+        )
+        self.send_unicast(header + reply_body, sender_ip)
+
+    def process_probe_reply(self, sender_ip, probe_body):
+        probe_id = parse_probe_body(probe_body)
+        if probe_id is None:
+            return
+        if self.liveness_monitor.on_reply(sender_ip, probe_id):
+            return
+        state = self.probe_manager.on_reply(sender_ip, probe_id)
+        if state is not None:
+            rtt_ms = (time.time() - state.started_at) * 1000.0
+            _probe_log.info("%s 回应探测 (attempts=%s, %.1f ms)，链路正常", sender_ip, state.attempts, rtt_ms)
+
+    def request_probe(self, target_ip, reason):
+        """立即向邻居接口 target_ip 发送 PROBE，返回 ProbeState，已有进行中的探测时返回 None"""
+        state = self.probe_manager.start(target_ip, reason, time.time())
+        if state is None:
+            return None
+        self.send_probe(state)
+        self.probe_trigger.set()
+        return state
+
+    def report_link_failure(self, next_hop_ip):
+        """
+        数据面反馈: 转发程序报告发往 next_hop_ip 的数据连续失败
+        next_hop_ip 可以是邻居的主地址或接口地址，探测该邻居全部对称链路的接口
+        :return: 开始探测的接口地址列表
+        """
+        self.link_failure_reports += 1
+        main_ip = self.mid_manager.get_main_address(next_hop_ip)
+        targets = [
+            iface_ip
+            for iface_ip in sorted(self.mid_manager.expand([main_ip]))
+            if iface_ip in self.link_set.links
+        ]
+        started = []
+        for iface_ip in targets:
+            if self.request_probe(iface_ip, "report") is not None:
+                started.append(iface_ip)
+        return targets, started
+
+    def mark_route_active(self, route):
+        """转发程序查询到的路由视为活跃，其下一跳进入快速存活检测"""
+        if route is not None:
+            self.active_next_hops[route["next_hop_ip"]] = time.time()
+
+    def get_liveness_targets(self):
+        now = time.time()
+        for next_hop_ip in [ip for ip, seen in self.active_next_hops.items() if now - seen > ACTIVE_ROUTE_TIMEOUT]:
+            del self.active_next_hops[next_hop_ip]
+        targets = set()
+        for next_hop_ip in self.active_next_hops:
+            for iface_ip in self.mid_manager.expand([self.mid_manager.get_main_address(next_hop_ip)]):
+                link = self.link_set.links.get(iface_ip)
+                if link and link.is_symmetric():
+                    targets.add(iface_ip)
+        return targets
+
+    def downgrade_link(self, iface_ip):
+        """存活探测失败: 链路降为非对称，并立刻重算 MPR 和路由"""
+        if not self.link_set.downgrade_link(iface_ip, time.time()):
+            return
+        self.expire_lost_neighbors()
+        self.neighbor_manager.recalculate_mpr()
+        self.routing_manager.recalculate_routing_table()
+        self.check_triggers()
+
+    def send_probe(self, state):
+        probe_body = create_probe_body(state.probe_id)
+        header = create_message_header(
+            PROBE_MESSAGE,
+            PROBE_TIMEOUT,
+            len(probe_body),
+            self.my_ip,
+            1,
+            0,
+            self.get_next_msg_seq(),
+        )
+        self.probe_manager.on_sent(state, time.time())
+        self.send_unicast(header + probe_body, state.target_ip)
+
+    def send_liveness_probe(self, target_ip, probe_id):
+        probe_body = create_probe_body(probe_id)
+        header = create_message_header(
+            PROBE_MESSAGE,
+            self.liveness_monitor.interval,
+            len(probe_body),
+            self.my_ip,
+            1,
+            0,
+            self.get_next_msg_seq(),
+        )
+        self.send_unicast(header + probe_body, target_ip)
+
+    def expire_link(self, iface_ip):
+        """探测失败: 立即删除链路，邻居没有其他对称链路时撤销邻居，并立刻重算 MPR 和路由"""
+        if not self.link_set.expire_link(iface_ip, time.time()):
+            return
+        self.expire_lost_neighbors()
+        self.neighbor_manager.recalculate_mpr()
+        self.routing_manager.recalculate_routing_table()
+        self.check_triggers()
+
+    def expire_lost_neighbors(self):
+        """RFC 3626 Section 8.5: 链路过期后，没有任何对称链路的邻居立即撤销，返回是否有邻居被撤销"""
+        lost = [
+            main_ip
+            for main_ip, neigh in self.neighbor_manager.neighbors.items()
+            if neigh.status == 1 and not self.has_symmetric_link(main_ip)
+        ]
+        for main_ip in lost:
+            self.neighbor_manager.expire_neighbor(main_ip)
+        return bool(lost)
+
+    def request_topology(self, neighbor_ip):
+        """邻居刚变为对称: 向它单播 TOPO_REQUEST，TOPO_SYNC_HOLDOFF 内最多请求一次"""
+        now = time.time()
+        if not self.topology_sync:
+            return
+        if self.last_topology_request_at is not None and now - self.last_topology_request_at < TOPO_SYNC_HOLDOFF:
+            return
+        self.last_topology_request_at = now
+        self.send_topology_request(neighbor_ip)
+        _sync_log.info("向新对称邻居 %s 请求拓扑集", neighbor_ip)
+
+    def request_tc_resync(self, neighbor_ip):
+        """增量 TC 缺少基准时请求拓扑集，TOPO_SYNC_HOLDOFF 内最多请求一次"""
+        now = time.time()
+        if neighbor_ip is None:
+            return
+        if self.last_gap_request_at is not None and now - self.last_gap_request_at < TOPO_SYNC_HOLDOFF:
+            return
+        self.last_gap_request_at = now
+        self.tc_gap_requests += 1
+        self.send_topology_request(neighbor_ip)
+        _sync_log.info("增量 TC 缺少基准，向 %s 请求拓扑集", neighbor_ip)
+
+    def send_topology_request(self, neighbor_ip):
+        self.topology_requests_sent += 1
+        header = create_message_header(
+            TOPO_REQUEST_MESSAGE,
+            TOP_HOLD_TIME,
+            0,
+            self.my_ip,
+            1,
+            0,
+            self.get_next_msg_seq(),
         )
+        self.send_unicast(header, neighbor_ip)
+
+    def process_topology_request(self, sender_ip):
+        now = time.time()
+        records = self.topology_manager.get_dump_records(now)
+        # 自己最近一次 TC 宣告的内容也一起发出，ANSN 与已发出的 TC 保持一致
+        if self.advertised_tc_state:
+            records.append((self.my_ip, self.ansn, TOP_HOLD_TIME, list(self.advertised_tc_state)))
+        dump_bodies = create_topo_dump_bodies(records, MAX_MESSAGE_BODY)
+        for dump_body in dump_bodies:
+            header = create_message_header(
+                TOPO_DUMP_MESSAGE,
+                TOP_HOLD_TIME,
+                len(dump_body),
+                self.my_ip,
+                1,
+                0,
+                self.get_next_msg_seq(),
+            )
+            self.send_unicast(header + dump_body, sender_ip)
+        _sync_log.info("向 %s 回复拓扑集 (%s 个源节点, %s 条消息)", sender_ip, len(records), len(dump_bodies))
+
+    def process_topology_dump(self, sender_ip, dump_body):
+        if sender_ip not in self.link_set.links:
+            return
+        now = time.time()
+        records = parse_topo_dump_body(dump_body)
+        for originator_ip, ansn, validity_time, neighbors in records:
+            if originator_ip == self.my_ip:
+                continue
+            # 与 TC 走同一套 ANSN 新旧规则，比本地更旧的记录会被忽略
+            self.topology_manager.process_tc_message(
+                originator_ip,
+                {"ansn": ansn, "advertised_neighbors": neighbors},
+                validity_time,
+                now,
+            )
+            # 被接受的记录就是这个 ANSN 的完整宣告集合，作为增量基准，否则重新同步后仍要等下一个完整 TC
+            if self.topology_manager.originator_ansn.get(originator_ip) == ansn:
+                self.topology_manager.record_tc_base(originator_ip, ansn, neighbors)
+        self.topology_dumps_received += 1
         self.routing_manager.recalculate_routing_table()
 
-    def generate_and_send_hello(self):
-        mpr_set = self.neighbor_manager.current_mpr_set
-        groups = self.link_set.get_hello_groups(mpr_set)
+    def process_mid(self, originator_ip, mid_info, validity_time):
+        if self.mid_manager.process_mid_message(originator_ip, mid_info, validity_time, time.time()):
+            self.routing_manager.recalculate_routing_table()
+
+    def process_hna(self, originator_ip, hna_info, validity_time):
+        if self.hna_manager.process_hna_message(originator_ip, hna_info, validity_time, time.time()):
+            self.routing_manager.recalculate_routing_table()
+
+    def to_main_addresses(self, hello_info):
+        """把 HELLO 里列出的接口地址换成主地址，本节点的任一接口地址都换成 my_ip"""
+        groups = []
+        for link_code, ip_list in hello_info["neighbor_groups"]:
+            main_list = []
+            for ip in ip_list:
+                main_ip = self.my_ip if ip in self.local_addresses else self.mid_manager.get_main_address(ip)
+                if main_ip not in main_list:
+                    main_list.append(main_ip)
+            groups.append((link_code, main_list))
+        return dict(hello_info, neighbor_groups=groups)
+
+    def get_hello_groups(self):
+        # MPR 集合是主地址，HELLO 按链路列出接口地址，MPR 邻居的每个接口都标记为 MPR_NEIGH
+        return self.link_set.get_hello_groups(self.mid_manager.expand(self.neighbor_manager.current_mpr_set))
+
+    def get_hello_state(self, groups=None):
+        if groups is None:
+            groups = self.get_hello_groups()
+        return tuple((link_code, tuple(sorted(ip_list))) for link_code, ip_list in groups)
+
+    def get_advertised_neighbors(self):
+        advertised = set(self.neighbor_manager.mpr_selectors.keys())
+        if self.tc_redundancy >= TC_REDUNDANCY_ALL:
+            advertised.update(self.neighbor_manager.get_symmetric_neighbors())
+        elif self.tc_redundancy == TC_REDUNDANCY_MPRS:
+            advertised.update(self.neighbor_manager.current_mpr_set)
+        return sorted(advertised)
+
+    def check_triggers(self):
+        if self.get_hello_state() != self.advertised_hello_state:
+            self.hello_schedule.reset()
+            self.hello_trigger.set()
+        if tuple(self.get_advertised_neighbors()) != self.advertised_tc_state:
+            self.tc_schedule.reset()
+            self.tc_trigger.set()
+
+    def generate_and_send_hello(self, interval=HELLO_INTERVAL):
+        groups = self.get_hello_groups()
+        self.advertised_hello_state = self.get_hello_state(groups)
         hello_info = {
-            "htime_seconds": HELLO_INTERVAL,
+            "htime_seconds": interval,
             "willingness": WILL_DEFAULT,
+            "compact_capable": self.compact_addresses,
             "neighbor_groups": groups,
         }
-        hello_body = create_hello_body(hello_info)
+        compact = self.use_compact_encoding()
+        hello_bodies = create_hello_bodies(hello_info, MAX_MESSAGE_BODY, compact)
+        if compact:
+            self.compact_hello_sent += len(hello_bodies)
+        for hello_body in hello_bodies:
+            header = create_message_header(
+                HELLO_MESSAGE,
+                self.hello_schedule.hold_time(interval),
+                len(hello_body),
+                self.my_ip,
+                1,
+                0,
+                self.get_next_msg_seq(),
+            )
+            self.send_own_message(header + hello_body)
+        _send_log.debug("HELLO (%s groups, %s messages)", len(groups), len(hello_bodies))
+
+    def generate_and_send_tc(self, interval=TC_INTERVAL):
+        advertised = self.get_advertised_neighbors()
+        if tuple(advertised) != self.advertised_tc_state:
+            # RFC 3626 Section 9.3: 宣告集合变化时 ANSN 才递增
+            self.ansn = (self.ansn + 1) % 65535
+            if not advertised:
+                # RFC 3626 Section 9.3: 集合变空后在之前宣告的有效期内继续发送空 TC，其他节点据此删除旧的拓扑记录
+                self.tc_empty_until = time.time() + self.tc_hold_time(interval, max(self.tc_ttl_cycle))
+        self.advertised_tc_state = tuple(advertised)
+        if not advertised and time.time() >= self.tc_empty_until:
+            return
+
+        ttl = self.get_next_tc_ttl()
+        tc_bodies = self.build_tc_bodies(advertised, ttl)
+        for tc_body in tc_bodies:
+            header = create_message_header(
+                TC_MESSAGE,
+                self.tc_hold_time(interval, ttl),
+                len(tc_body),
+                self.my_ip,
+                ttl,
+                0,
+                self.get_next_msg_seq(),
+            )
+            self.send_own_message(header + tc_body)
+        _send_log.debug("TC ttl=%s (%s messages) (Advertised: %s)", ttl, len(tc_bodies), advertised)
+
+    def tc_hold_time(self, interval, ttl):
+        """
+        远处节点只能收到 TTL 最大的那一轮，这一轮的 Vtime 需要覆盖整个 TTL 循环
+        近处节点每轮都能收到，其余轮次使用普通的保持时间
+        """
+        hold_time = self.tc_schedule.hold_time(interval)
+        if ttl == max(self.tc_ttl_cycle):
+            return hold_time * len(self.tc_ttl_cycle)
+        return hold_time
+
+    def build_tc_bodies(self, advertised, ttl=TC_DEFAULT_TTL):
+        """
+        增量 TC 开启时，只要基准有效且增量比完整 TC 小就发送增量，每 TC_FULL_EVERY 个 TC 发一次完整 TC
+        增量的 TTL 不能超过基准完整 TC 的 TTL: 鱼眼模式下小 TTL 轮次发出的基准到不了远处节点，
+        这时 TTL 更大的轮次改发完整 TC
+        """
+        compact = self.use_compact_encoding()
+        full_bodies = create_tc_bodies(self.ansn, advertised, MAX_MESSAGE_BODY, compact)
+        if (
+            self.delta_tc
+            and self.tc_base is not None
+            and ttl <= self.tc_base_ttl
+            and self.tcs_since_full < TC_FULL_EVERY - 1
+        ):
+            base_ansn, base_set = self.tc_base
+            advertised_set = set(advertised)
+            added = sorted(advertised_set - base_set)
+            removed = sorted(base_set - advertised_set)
+            delta_body = create_tc_delta_body(self.ansn, base_ansn, added, removed, compact)
+            # 转发时可能被转换回普通编码，按普通编码的大小检查上限
+            plain_size = 8 + 4 * (len(added) + len(removed))
+            if len(delta_body) < sum(len(body) for body in full_bodies) and plain_size <= MAX_MESSAGE_BODY:
+                self.tcs_since_full += 1
+                self.tc_delta_sent += 1
+                self.compact_tc_sent += int(compact)
+                return [delta_body]
+        self.tc_base = (self.ansn, set(advertised))
+        self.tc_base_ttl = ttl
+        self.tcs_since_full = 0
+        self.tc_full_sent += 1
+        if compact:
+            self.compact_tc_sent += len(full_bodies)
+        return full_bodies
+
+    def use_compact_encoding(self):
+        # HELLO/TC 是广播，只有全部链路邻居都宣告支持时才能使用紧凑编码
+        return self.compact_addresses and self.link_set.all_compact_capable()
+
+    def generate_and_send_mid(self):
+        aliases = sorted(self.local_addresses - {self.my_ip})
+        if not aliases:
+            return
+        mid_body = create_mid_body(aliases)
         header = create_message_header(
-            HELLO_MESSAGE,
-            NEIGHB_HOLD_TIME,
-            len(hello_body),
+            MID_MESSAGE,
+            MID_HOLD_TIME,
+            len(mid_body),
             self.my_ip,
-            1,
+            255,
             0,
             self.get_next_msg_seq(),
         )
-        self.send_packet(header + hello_body)
-        print(f"[Send] HELLO ({len(groups)} groups)")
+        self.send_own_message(header + mid_body)
+        _send_log.debug("MID (Interfaces: %s)", aliases)
 
-    def generate_and_send_tc(self):
-        selectors = list(self.neighbor_manager.mpr_selectors.keys())
-        if not selectors:
+    def generate_and_send_hna(self):
+        if not self.hna_networks:
             return
-
-        self.ansn = (self.ansn + 1) % 65535
-        tc_body = create_tc_body(self.ansn, selectors)
+        hna_body = create_hna_body(self.hna_networks)
         header = create_message_header(
-            TC_MESSAGE,
-            TOP_HOLD_TIME,
-            len(tc_body),
+            HNA_MESSAGE,
+            HNA_HOLD_TIME,
+            len(hna_body),
             self.my_ip,
             255,
             0,
             self.get_next_msg_seq(),
         )
-        self.send_packet(header + tc_body)
-        print(f"[Send] TC (Selectors: {selectors})")
+        self.send_own_message(header + hna_body)
+        _send_log.debug("HNA (Networks: %s)", self.hna_networks)
+
+    def get_next_tc_ttl(self):
+        ttl = self.tc_ttl_cycle[self.tc_ttl_index]
+        self.tc_ttl_index = (self.tc_ttl_index + 1) % len(self.tc_ttl_cycle)
+        return ttl
 
     def check_forwarding_condition(self, sender_ip, orig_ip, seq, ttl):
         if ttl <= 1:
@@ -222,21 +829,50 @@ class OLSRNode:
             entry = self.duplicate_set.entries.get((orig_ip, seq))
             if entry and entry.retransmitted:
                 return False
-        return sender_ip in self.neighbor_manager.mpr_selectors
+        return self.mid_manager.get_main_address(sender_ip) in self.neighbor_manager.mpr_selectors
 
     def forward_message(self, msg_data, _old_ttl, _old_hop):
         fmt = "!BBH4sBBH"
         fields = list(struct.unpack(fmt, msg_data[:12]))
         fields[4] -= 1
         fields[5] += 1
-        new_head = struct.pack(fmt, *fields)
 
         orig_ip = socket.inet_ntoa(fields[3])
         seq = fields[6]
         self.duplicate_set.mark_retransmitted(orig_ip, seq)
 
-        print(f"[Forward] forwarding message from {orig_ip}")
-        self.send_packet(new_head + msg_data[12:])
+        body = msg_data[12:]
+        if fields[0] == TC_MESSAGE and is_compact_tc_body(body) and not self.use_compact_encoding():
+            # 有邻居不支持地址块: 转换回普通编码再转发，消息头的 Size 随之更新
+            body = to_plain_tc_body(body)
+            if body is None:
+                return
+            fields[2] = 12 + len(body)
+            self.tc_transcoded += 1
+        new_head = struct.pack(fmt, *fields)
+
+        _forward_log.debug("forwarding message from %s", orig_ip)
+        self.forwarded_messages += 1
+        self.metrics.forwarded.add(fields[0], fields[2])
+        if self.forward_queue.push(new_head + body, time.time()):
+            self.forward_trigger.set()
+
+    def send_own_message(self, msg_bytes):
+        # RFC 5148 Section 6.2: 自己发消息时把排队中的待转发消息一起捎带出去
+        budget = MAX_PACKET_SIZE - PACKET_HEADER_SIZE - len(msg_bytes)
+        piggyback = self.forward_queue.take(budget) if budget > 0 else []
+        self.send_packet(msg_bytes + b"".join(piggyback))
+
+    def send_unicast(self, msg_bytes, dest_ip):
+        pkt_head = create_packet_header(len(msg_bytes), self.get_next_pkt_seq())
+        data = pkt_head + msg_bytes
+        try:
+            self.sock.sendto(data, (dest_ip, self.port))
+            self.tx_packets += 1
+            self.tx_bytes += len(data)
+            self.metrics.tx.add_packet_body(msg_bytes)
+        except OSError as exc:
+            _send_log.warning("unicast to %s: %s", dest_ip, exc)
 
     def send_packet(self, msg_bytes):
         pkt_head = create_packet_header(len(msg_bytes), self.get_next_pkt_seq())
@@ -245,6 +881,9 @@ class OLSRNode:
         if not interfaces:
             try:
                 self.sock.sendto(data, ("255.255.255.255", self.port))
+                self.tx_packets += 1
+                self.tx_bytes += len(data)
+                self.metrics.tx.add_packet_body(msg_bytes)
             except OSError:
                 pass
             return
@@ -256,30 +895,195 @@ class OLSRNode:
                 send_sock.setsockopt(socket.SOL_SOCKET, 25, intf.encode("utf-8"))
                 send_sock.sendto(data, ("255.255.255.255", self.port))
                 send_sock.close()
+                self.tx_packets += 1
+                self.tx_bytes += len(data)
+                self.metrics.tx.add_packet_body(msg_bytes)
             except Exception as exc:
-                print(f"[Send Error] on {intf}: {exc}")
+                _send_log.warning("on %s: %s", intf, exc)
+
+    def handle_control_request(self, data, addr, max_response=None):
+        """
+        文本或 JSON 控制请求，UDP 和 Unix 端点共用；addr 是 UDP 源地址或 Unix 连接
+        :return: 依次发出的回应报文列表 (流式回应有多个)，WAIT_ROUTE 挂起时返回 None (回应稍后发往 addr)
+        """
+        is_json = data.startswith(b"{")
+        try:
+            command_text = data.decode("utf-8", errors="ignore").strip()
+            with self.lock:
+                if is_json:
+                    response = process_json_command(self, command_text, addr)
+                else:
+                    response = process_control_command(self, command_text, addr)
+        except Exception as exc:
+            if is_json:
+                response = encode_response(
+                    {
+                        "v": CONTROL_API_VERSION,
+                        "table_version": self.routing_manager.table_version,
+                        "epoch": self.started_at,
+                        "ok": False,
+                        "error": f"control_error: {exc}",
+                    }
+                )
+            else:
+                response = f"control_error={exc}"
+        if response is None:
+            return None
+        if isinstance(response, StreamResponse):
+            return response.encode(CONTROL_STREAM_CHUNK)
+
+        payload = response.encode("utf-8", errors="ignore")
+        if max_response is not None and len(payload) > max_response:
+            if is_json:
+                payload = encode_response(
+                    {
+                        "v": CONTROL_API_VERSION,
+                        "table_version": self.routing_manager.table_version,
+                        "epoch": self.started_at,
+                        "ok": False,
+                        "error": f"response too large: {len(payload)} bytes, use limit/cursor or stream",
+                    }
+                ).encode("utf-8")
+            else:
+                payload = f"回应过大：{len(payload)} 字节，请分页查询 (如 SHOW_ROUTE:<limit>[,<after>])".encode("utf-8")
+        return [payload]
 
     def loop_control(self):
         while self.running:
             try:
-                data, addr = self.control_sock.recvfrom(4096)
+                # 批量请求可能带很多目的地址，按 UDP 上限接收
+                data, addr = self.control_sock.recvfrom(MAX_RECV_SIZE)
             except OSError:
                 break
             except Exception as exc:
-                print(f"[Error] Control Receive: {exc}")
+                _log.error("Control Receive: %s", exc)
                 continue
 
+            payloads = self.handle_control_request(data, addr, MAX_CONTROL_RESPONSE)
             try:
-                command_text = data.decode("utf-8", errors="ignore").strip()
-                with self.lock:
-                    response = process_control_command(self, command_text)
-            except Exception as exc:
-                response = f"control_error={exc}"
+                for payload in payloads or []:
+                    self.control_sock.sendto(payload, addr)
+            except OSError:
+                pass
 
+    def loop_control_unix(self):
+        while self.running:
             try:
-                self.control_sock.sendto(response.encode("utf-8", errors="ignore"), addr)
+                conn, _ = self.control_unix_sock.accept()
             except OSError:
-                pass
+                break
+            with self.lock:
+                self.control_connections.add(conn)
+            threading.Thread(target=self.serve_control_connection, args=(conn,), daemon=True).start()
+
+    def serve_control_connection(self, conn):
+        """一个 Unix 控制连接: 请求按到达顺序处理和回应，挂起的 WAIT_ROUTE 的回应可能晚于之后的请求"""
+        try:
+            while self.running:
+                try:
+                    data = conn.recv(MAX_RECV_SIZE)
+                except OSError:
+                    break
+                if not data:
+                    break
+                payloads = self.handle_control_request(data, conn)
+                try:
+                    for payload in payloads or []:
+                        conn.send(payload)
+                except OSError as exc:
+                    _log.warning("Control Unix Send: %s", exc)
+                    break
+        finally:
+            with self.lock:
+                self.route_subscriptions.unsubscribe(conn)
+                self.route_waits.drop(conn)
+                self.control_connections.discard(conn)
+            conn.close()
+
+    def loop_route_waits(self):
+        """回应超时的 WAIT_ROUTE，睡眠到最早的截止时间或有新请求挂起"""
+        while self.running:
+            self.route_wait_wakeup.clear()
+            now = time.time()
+            with self.lock:
+                for wait in self.route_waits.pop_expired(now):
+                    self.send_control_response(wait.respond(None), wait.addr)
+                timeout = self.route_waits.time_until_deadline(now)
+            self.route_wait_wakeup.wait(timeout)
+
+    def export_routes(self, _old_signature=None, _new_signature=None):
+        self.route_exporter.publish(self.routing_manager.index_entries, self.routing_manager.table_version)
+
+    def send_control_payload(self, payload, addr):
+        """
+        主动发出的回应和推送: addr 是 Unix 连接时写到该连接，否则发往 UDP 源地址，在持有 node.lock 时调用
+        调用方多是路由表变化的回调，发送不能阻塞: Unix 连接的接收方不读、缓冲区满时断开这个连接
+        """
+        if not isinstance(addr, socket.socket):
+            self.control_sock.sendto(payload, socket.MSG_DONTWAIT, addr)
+            return
+        try:
+            addr.send(payload, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            _log.warning("control connection not reading, dropped")
+            self.drop_control_connection(addr)
+            raise
+
+    def drop_control_connection(self, conn):
+        """丢弃连接的订阅和挂起请求，关闭读写让服务线程退出并回收连接，在持有 node.lock 时调用"""
+        self.route_subscriptions.unsubscribe(conn)
+        self.route_waits.drop(conn)
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def send_control_response(self, response, addr):
+        try:
+            self.send_control_payload(response.encode("utf-8", errors="ignore"), addr)
+        except OSError as exc:
+            _log.warning("Control Send %s: %s", addr, exc)
+
+    def park_route_wait(self, dest_ip, timeout, addr, respond):
+        """
+        WAIT_ROUTE: 已有路由时直接返回 respond(route)，否则挂起请求并返回 None
+        挂起的请求在路由装入时由 answer_route_waits 回应，超时由 loop_route_waits 回应 respond(None)
+        """
+        route = self.routing_manager.lookup_route(dest_ip)
+        if route is None:
+            self.routing_manager.recalculate_routing_table()
+            route = self.routing_manager.lookup_route(dest_ip)
+        if route is not None:
+            self.mark_route_active(route)
+            return respond(route)
+        deadline = time.time() + min(max(0.0, float(timeout)), ROUTE_WAIT_MAX_TIMEOUT)
+        if not self.route_waits.add(dest_ip, addr, deadline, respond):
+            raise RuntimeError("too many route waits")
+        self.route_wait_wakeup.set()
+        return None
+
+    def answer_route_waits(self, _old_signature=None, _new_signature=None):
+        for wait, route in self.route_waits.pop_ready(self.routing_manager.lookup_route):
+            self.mark_route_active(route)
+            self.send_control_response(wait.respond(route), wait.addr)
+
+    def publish_route_events(self, old_signature, new_signature):
+        targets = self.route_subscriptions.active(time.time())
+        if not targets:
+            return
+        payload = self.route_subscriptions.build_event(
+            old_signature,
+            new_signature,
+            self.routing_manager.table_version,
+            self.started_at,
+            MAX_CONTROL_RESPONSE,
+        )
+        for addr in targets:
+            try:
+                self.send_control_payload(payload, addr)
+                self.route_subscriptions.events_sent += 1
+            except OSError as exc:
+                _log.warning("Route Event %s: %s", addr, exc)
 
     def get_next_msg_seq(self):
         self.msg_seq_num = (self.msg_seq_num + 1) % 65535
@@ -289,23 +1093,127 @@ class OLSRNode:
         self.pkt_seq_num = (self.pkt_seq_num + 1) % 65535
         return self.pkt_seq_num
 
+    def wait_next_emission(self, trigger, interval, min_interval):
+        started_at = time.time()
+        # RFC 5148 Section 5.4: 周期消息在 [interval - MAXJITTER, interval] 内发送，只提前不推后
+        timeout = interval - random.uniform(0.0, interval * MAXJITTER_FRACTION)
+        if trigger.wait(timeout=timeout):
+            elapsed = time.time() - started_at
+            time.sleep(max(0.0, min_interval - elapsed) + random.uniform(0.0, TRIGGER_JITTER))
+        trigger.clear()
+
     def loop_hello(self):
         while self.running:
             try:
                 with self.lock:
-                    self.generate_and_send_hello()
-                time.sleep(HELLO_INTERVAL - 0.5 + random.random())
+                    interval = self.hello_schedule.advance()
+                    self.generate_and_send_hello(interval)
+                self.wait_next_emission(self.hello_trigger, interval, HELLO_MIN_INTERVAL)
             except Exception as exc:
-                print(f"[Error] Hello Loop: {exc}")
+                _log.error("Hello Loop: %s", exc)
 
     def loop_tc(self):
         while self.running:
             try:
                 with self.lock:
-                    self.generate_and_send_tc()
-                time.sleep(TC_INTERVAL - 0.5 + random.random())
+                    interval = self.tc_schedule.advance()
+                    self.generate_and_send_tc(interval)
+                self.wait_next_emission(self.tc_trigger, interval, TC_MIN_INTERVAL)
+            except Exception as exc:
+                _log.error("TC Loop: %s", exc)
+
+    def loop_mid(self):
+        while self.running:
+            try:
+                addresses = self.get_local_addresses()
+                with self.lock:
+                    self.local_addresses.clear()
+                    self.local_addresses.update(addresses)
+                    self.generate_and_send_mid()
+            except Exception as exc:
+                _log.error("MID Loop: %s", exc)
+            time.sleep(MID_INTERVAL - random.uniform(0.0, MID_INTERVAL * MAXJITTER_FRACTION))
+
+    def loop_hna(self):
+        while self.running:
+            try:
+                with self.lock:
+                    self.generate_and_send_hna()
+            except Exception as exc:
+                _log.error("HNA Loop: %s", exc)
+            time.sleep(HNA_INTERVAL - random.uniform(0.0, HNA_INTERVAL * MAXJITTER_FRACTION))
+
+    def loop_forward(self):
+        while self.running:
+            try:
+                with self.lock:
+                    delay = self.forward_queue.time_until_flush(time.time())
+                if delay is None or delay > 0:
+                    self.forward_trigger.wait(timeout=1.0 if delay is None else delay)
+                    self.forward_trigger.clear()
+                    continue
+                with self.lock:
+                    for batch in self.forward_queue.pop_due(time.time()):
+                        self.send_packet(batch)
+            except Exception as exc:
+                _log.error("Forward Loop: %s", exc)
+
+    def loop_probe(self):
+        while self.running:
+            try:
+                with self.lock:
+                    delay = self.probe_manager.time_until_deadline(time.time())
+                if delay is None or delay > 0:
+                    self.probe_trigger.wait(timeout=1.0 if delay is None else delay)
+                    self.probe_trigger.clear()
+                    continue
+                with self.lock:
+                    retry, failed = self.probe_manager.pop_due(time.time())
+                    for state in retry:
+                        self.send_probe(state)
+                    for state in failed:
+                        _probe_log.warning("%s %s 次探测均无回应 (reason=%s)", state.target_ip, state.attempts, state.reason)
+                        self.expire_link(state.target_ip)
+            except Exception as exc:
+                _log.error("Probe Loop: %s", exc)
+
+    def loop_liveness(self):
+        while self.running:
+            time.sleep(self.liveness_monitor.interval)
+            try:
+                with self.lock:
+                    to_send, down = self.liveness_monitor.tick(self.get_liveness_targets())
+                    for target_ip in down:
+                        self.downgrade_link(target_ip)
+                    for target_ip, probe_id in to_send:
+                        self.send_liveness_probe(target_ip, probe_id)
             except Exception as exc:
-                print(f"[Error] TC Loop: {exc}")
+                _log.error("Liveness Loop: %s", exc)
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return
+        snapshot = read_snapshot(self.state_file)
+        if snapshot is None:
+            return
+        with self.lock:
+            self.warm_restarted = restore_snapshot(self, snapshot)
+
+    def save_state(self):
+        with self.lock:
+            snapshot = build_snapshot(self)
+        try:
+            write_snapshot(snapshot, self.state_file)
+        except OSError as exc:
+            _snapshot_log.warning("写入失败 %s: %s", self.state_file, exc)
+
+    def loop_snapshot(self):
+        while self.running:
+            time.sleep(SNAPSHOT_INTERVAL)
+            try:
+                self.save_state()
+            except Exception as exc:
+                _log.error("Snapshot Loop: %s", exc)
 
     def loop_cleanup(self):
         while self.running:
@@ -313,9 +1221,17 @@ class OLSRNode:
             with self.lock:
                 self.link_set.cleanup()
                 self.neighbor_manager.cleanup()
+                if self.expire_lost_neighbors():
+                    self.neighbor_manager.recalculate_mpr()
                 self.topology_manager.cleanup()
+                self.mid_manager.cleanup()
+                self.hna_manager.cleanup()
                 self.duplicate_set.cleanup()
                 self.routing_manager.recalculate_routing_table()
+                self.check_triggers()
+                if self.route_exporter is not None:
+                    # 转发程序据此判断守护进程是否还活着
+                    self.route_exporter.heartbeat()
 
     def get_interfaces(self):
         interfaces = []
@@ -335,6 +1251,35 @@ class OLSRNode:
             pass
         return sorted(set(interfaces))
 
+    def get_interface_address(self, intf):
+        # SIOCGIFADDR: 读取接口上配置的 IPv4 地址
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                ifreq = fcntl.ioctl(probe.fileno(), 0x8915, struct.pack("256s", intf[:15].encode("utf-8")))
+        except OSError:
+            return None
+        return socket.inet_ntoa(ifreq[20:24])
+
+    def get_local_addresses(self):
+        addresses = {self.my_ip}
+        for intf in self.get_interfaces():
+            address = self.get_interface_address(intf)
+            if address:
+                addresses.add(address)
+        return addresses
+
+
+def parse_hna_network(text):
+    try:
+        network_ip, prefix_text = text.split("/", 1)
+        prefix_len = int(prefix_text)
+        socket.inet_aton(network_ip)
+    except (ValueError, OSError):
+        raise argparse.ArgumentTypeError(f"invalid network {text!r}, expected NETWORK/PREFIX")
+    if not 0 <= prefix_len <= 32:
+        raise argparse.ArgumentTypeError(f"invalid prefix length in {text!r}")
+    return normalize_network(network_ip, prefix_len), prefix_len
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run one OLSR overlay node.")
@@ -346,13 +1291,131 @@ def parse_args():
         default=5100,
         help="Local UDP control port bound on 127.0.0.1.",
     )
+    parser.add_argument(
+        "--control-unix",
+        help="Also serve control requests on this Unix seqpacket socket (e.g. /tmp/olsr-sta1.sock); clients keep one connection and may pipeline requests.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve GET /metrics (Prometheus text format) on this TCP port; 0 disables it. The METRICS control command returns the same text.",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="Address the --metrics-port HTTP endpoint binds to.",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=PROFILE_DIR,
+        help="Directory for PROFILE / TRACEMALLOC / STACK_SAMPLE control command results.",
+    )
+    parser.add_argument(
+        "--fixed-intervals",
+        action="store_true",
+        help="Disable adaptive HELLO/TC intervals and always use HELLO_INTERVAL/TC_INTERVAL.",
+    )
+    parser.add_argument(
+        "--fisheye",
+        action="store_true",
+        help="Cycle TC TTLs through TC_FISHEYE_TTLS instead of always flooding with TTL 255.",
+    )
+    parser.add_argument(
+        "--tc-redundancy",
+        type=int,
+        choices=(TC_REDUNDANCY_SELECTORS, TC_REDUNDANCY_MPRS, TC_REDUNDANCY_ALL),
+        default=TC_REDUNDANCY,
+        help="TC advertised set: 0=MPR selectors, 1=selectors+MPRs, 2=all symmetric neighbors.",
+    )
+    parser.add_argument(
+        "--probe-interval-ms",
+        type=float,
+        default=LIVENESS_PROBE_INTERVAL * 1000.0,
+        help="Liveness probe interval toward next hops of active routes (50-200 ms suggested, 0 disables).",
+    )
+    parser.add_argument(
+        "--probe-miss-threshold",
+        type=int,
+        default=LIVENESS_MISS_THRESHOLD,
+        help="Consecutive unanswered liveness probes before the link is downgraded.",
+    )
+    parser.add_argument(
+        "--delta-tc",
+        action="store_true",
+        help="Send delta TCs against the last full TC (every TC_FULL_EVERY-th TC is full). All nodes must support it.",
+    )
+    parser.add_argument(
+        "--compact-addresses",
+        action="store_true",
+        help="Advertise compact address-block support and use it for HELLO/TC once every link neighbor supports it.",
+    )
+    parser.add_argument(
+        "--no-topology-sync",
+        action="store_true",
+        help="Do not request a topology dump from neighbors that just became symmetric.",
+    )
+    parser.add_argument(
+        "--state-file",
+        help="Persist protocol state to this file every SNAPSHOT_INTERVAL seconds and warm-restart from it on startup.",
+    )
+    parser.add_argument(
+        "--route-shm",
+        help="Publish the route table to this memory-mapped file (e.g. /dev/shm/olsr-routes-sta1) for local forwarders.",
+    )
+    parser.add_argument(
+        "--log-level",
+        default=LOG_DEFAULT_LEVEL,
+        help="Log level, optionally per subsystem, e.g. 'info' or 'warning,forward=debug,route=info'.",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default="text",
+        help="Log record format written by the background log writer.",
+    )
+    parser.add_argument(
+        "--log-file",
+        help="Append log records to this file instead of stdout.",
+    )
+    parser.add_argument(
+        "--hna",
+        type=parse_hna_network,
+        action="append",
+        default=[],
+        metavar="NETWORK/PREFIX",
+        help="Advertise an attached network via HNA, e.g. 192.168.10.0/24. Can be repeated.",
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    node = OLSRNode(args.ip, port=args.port, control_port=args.control_port)
+    configure_logging(args.log_level, args.log_format, args.log_file)
+    node = OLSRNode(
+        args.ip,
+        port=args.port,
+        control_port=args.control_port,
+        adaptive_intervals=not args.fixed_intervals,
+        fisheye=args.fisheye,
+        tc_redundancy=args.tc_redundancy,
+        hna_networks=args.hna,
+        liveness_interval=args.probe_interval_ms / 1000.0,
+        liveness_miss_threshold=args.probe_miss_threshold,
+        state_file=args.state_file,
+        topology_sync=not args.no_topology_sync,
+        delta_tc=args.delta_tc,
+        compact_addresses=args.compact_addresses,
+        route_shm=args.route_shm,
+        control_unix=args.control_unix,
+        metrics_host=args.metrics_host,
+        metrics_port=args.metrics_port,
+        profile_dir=args.profile_dir,
+    )
+    # Mininet 脚本用 pkill (SIGTERM) 停止守护进程，与 Ctrl-C 一样走 stop() 保存快照并标记共享内存导出已关闭
+    signal.signal(signal.SIGTERM, node.request_stop)
     try:
         node.start()
     finally:
         node.stop()
+        get_hub().flush()
@@ -0,0 +1,387 @@
+import bisect
+import struct
+from collections import deque
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from constants import (
+    DATA_MESSAGE,
+    EVENT_TRACE_RECENT,
+    HELLO_MESSAGE,
+    HNA_MESSAGE,
+    MID_MESSAGE,
+    PROBE_MESSAGE,
+    PROBE_REPLY_MESSAGE,
+    TC_MESSAGE,
+    TOPO_DUMP_MESSAGE,
+    TOPO_REQUEST_MESSAGE,
+)
+
+"""
+本文件负责守护进程的运行指标: 按消息类型的收/发/转发计数和字节数、重复消息、MPR 和路由重算的次数与耗时分布、
+协议锁的等待/持有时间、HELLO/TC 从收到到路由表反映出来的各阶段延迟，以及各个表的大小
+所有计数都在持有协议锁时更新 (锁自身的统计在获得锁之后、释放之前记录)，不需要额外的锁
+导出格式:
+    METRICS 控制命令 / --metrics-port 的 HTTP 端点: Prometheus 文本格式
+    JSON 控制协议 {"cmd": "metrics"}: snapshot() 的字典
+"""
+
+MESSAGE_TYPE_NAMES = {
+    HELLO_MESSAGE: "hello",
+    TC_MESSAGE: "tc",
+    MID_MESSAGE: "mid",
+    HNA_MESSAGE: "hna",
+    DATA_MESSAGE: "data",
+    PROBE_MESSAGE: "probe",
+    PROBE_REPLY_MESSAGE: "probe_reply",
+    TOPO_REQUEST_MESSAGE: "topo_request",
+    TOPO_DUMP_MESSAGE: "topo_dump",
+}
+
+# 耗时分布的桶上界（秒），覆盖 10us 的锁等待到秒级的大网路由重算
+DURATION_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+def message_type_name(msg_type):
+    return MESSAGE_TYPE_NAMES.get(msg_type, str(msg_type))
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self):
+        return {
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+            "sum": self.total,
+            "count": self.count,
+        }
+
+
+class InstrumentedLock:
+    """
+    threading.Lock 的替身，记录每次获取的等待时间和持有时间，只支持 with 和 acquire/release
+    profiler 不为空时 (见 olsr_profiling.py)，持有锁期间启用当前线程的 cProfile
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_seconds = Histogram()
+        self.hold_seconds = Histogram()
+        self._acquired_at = 0.0
+        self.profiler = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            self.wait_seconds.observe(self._acquired_at - started)
+            if self.profiler is not None:
+                self.profiler.enter()
+        return acquired
+
+    def release(self):
+        if self.profiler is not None:
+            self.profiler.exit()
+        self.hold_seconds.observe(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_exc):
+        self.release()
+
+
+class TrafficCounters:
+    """按消息类型统计的消息数和字节数，格式: { msg_type: [messages, bytes] }"""
+
+    def __init__(self):
+        self.by_type = {}
+
+    def add(self, msg_type, size):
+        entry = self.by_type.get(msg_type)
+        if entry is None:
+            self.by_type[msg_type] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def add_packet_body(self, msg_bytes):
+        """统计一个包 (不含 Packet Header) 里的全部消息"""
+        cursor = 0
+        while len(msg_bytes) - cursor >= 12:
+            msg_type, _vtime, msg_size = struct.unpack_from("!BBH", msg_bytes, cursor)
+            if msg_size < 12:
+                break
+            self.add(msg_type, msg_size)
+            cursor += msg_size
+
+    def snapshot(self):
+        return {
+            message_type_name(msg_type): {"messages": messages, "bytes": size}
+            for msg_type, (messages, size) in sorted(self.by_type.items())
+        }
+
+
+class DaemonMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.rx = TrafficCounters()
+        self.tx = TrafficCounters()
+        self.forwarded = TrafficCounters()
+        self.duplicates_dropped = 0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class EventLatency:
+    """
+    HELLO/TC 事件在协议流水线里的各阶段时刻，都相对收到报文 (recvfrom 返回) 的时刻:
+        start: 拿到协议锁、开始处理这条消息    parse: 消息体解析完
+        state: 链路/邻居/拓扑表更新完           mpr: MPR 重算完 (仅对称邻居的 HELLO)
+        route: 路由表重算完
+    路由表版本在处理期间变化的事件另计 install 延迟 (收到 -> 路由表反映出变化)
+    同一时刻只跟踪一个事件，在持有协议锁时调用
+    """
+
+    STAGES = ("start", "parse", "state", "mpr", "route")
+
+    def __init__(self, recent=EVENT_TRACE_RECENT):
+        self.recent_size = int(recent)
+        # 格式: { msg_type: { stage: Histogram } }，install 也作为一个阶段
+        self.histograms = {}
+        # 格式: { msg_type: deque([{"at", "changed", stage: 秒, ...}]) }
+        self.recent = {}
+        self.events = {}
+        self.route_changes = {}
+        self.active = None
+
+    def begin(self, msg_type, received_at, table_version):
+        """received_at 为 time.perf_counter() 时刻"""
+        self.active = (msg_type, received_at, table_version, {"at": time.time()})
+        self.mark("start")
+
+    def mark(self, stage):
+        if self.active is not None:
+            self.active[3][stage] = time.perf_counter() - self.active[1]
+
+    def finish(self, table_version):
+        if self.active is None:
+            return
+        msg_type, _received_at, start_version, trace = self.active
+        self.active = None
+        changed = table_version != start_version and "route" in trace
+        trace["changed"] = changed
+        histograms = self.histograms.setdefault(msg_type, {})
+        for stage in self.STAGES:
+            if stage in trace:
+                histograms.setdefault(stage, Histogram()).observe(trace[stage])
+        self.events[msg_type] = self.events.get(msg_type, 0) + 1
+        if changed:
+            histograms.setdefault("install", Histogram()).observe(trace["route"])
+            self.route_changes[msg_type] = self.route_changes.get(msg_type, 0) + 1
+        recent = self.recent.get(msg_type)
+        if recent is None:
+            recent = self.recent[msg_type] = deque(maxlen=self.recent_size)
+        recent.append(trace)
+
+    def summary(self):
+        """按消息类型和阶段汇总最近的事件: count/p50/p90/p99/max (毫秒)，install 只统计改变了路由表的事件"""
+        result = {}
+        for msg_type, recent in self.recent.items():
+            stages = {}
+            for stage in self.STAGES + ("install",):
+                if stage == "install":
+                    values = sorted(trace["route"] for trace in recent if trace["changed"])
+                else:
+                    values = sorted(trace[stage] for trace in recent if stage in trace)
+                if not values:
+                    continue
+                stages[stage] = {
+                    "count": len(values),
+                    "p50_ms": round(percentile(values, 0.5) * 1000.0, 3),
+                    "p90_ms": round(percentile(values, 0.9) * 1000.0, 3),
+                    "p99_ms": round(percentile(values, 0.99) * 1000.0, 3),
+                    "max_ms": round(values[-1] * 1000.0, 3),
+                }
+            result[message_type_name(msg_type)] = {
+                "events": self.events.get(msg_type, 0),
+                "route_changes": self.route_changes.get(msg_type, 0),
+                "stages": stages,
+            }
+        return result
+
+    def recent_traces(self, count):
+        traces = []
+        for msg_type, recent in self.recent.items():
+            for trace in list(recent)[-count:]:
+                traces.append(dict(trace, type=message_type_name(msg_type)))
+        traces.sort(key=lambda trace: trace["at"])
+        return traces[-count:]
+
+
+def table_sizes(node):
+    """各个表的当前大小，导出时现算"""
+    return {
+        "links": len(node.link_set.links),
+        "neighbors": len(node.neighbor_manager.neighbors),
+        "symmetric_neighbors": sum(1 for neighbor in node.neighbor_manager.neighbors.values() if neighbor.status == 1),
+        "two_hop": len(node.neighbor_manager.two_hop_set),
+        "mpr_set": len(node.neighbor_manager.current_mpr_set),
+        "mpr_selectors": len(node.neighbor_manager.mpr_selectors),
+        "topology": len(node.topology_manager.topology_set),
+        "routes": len(node.routing_manager.routing_table),
+        "prefix_routes": len(node.routing_manager.prefix_table),
+        "mid_aliases": len(node.mid_manager.interface_set),
+        "hna": len(node.hna_manager.association_set),
+        "duplicates": len(node.duplicate_set.entries),
+        "forward_queue": len(node.forward_queue.pending),
+        "route_subscribers": len(node.route_subscriptions.subscribers),
+        "route_waits": len(node.route_waits.waits),
+    }
+
+
+def snapshot(node):
+    """在持有 node.lock 时调用"""
+    metrics = node.metrics
+    return {
+        "uptime_sec": time.time() - metrics.started_at,
+        "rx": metrics.rx.snapshot(),
+        "tx": metrics.tx.snapshot(),
+        "forwarded": metrics.forwarded.snapshot(),
+        "duplicates_dropped": metrics.duplicates_dropped,
+        "mpr_recomputes": node.neighbor_manager.mpr_recalculations,
+        "route_recomputes": node.routing_manager.recalculations,
+        "route_table_version": node.routing_manager.table_version,
+        "histograms": {
+            "mpr_recompute_seconds": node.neighbor_manager.mpr_recalc_seconds.snapshot(),
+            "route_recompute_seconds": node.routing_manager.recalc_seconds.snapshot(),
+            "lock_wait_seconds": node.lock.wait_seconds.snapshot(),
+            "lock_hold_seconds": node.lock.hold_seconds.snapshot(),
+        },
+        "event_latency_seconds": {
+            message_type_name(msg_type): {stage: histogram.snapshot() for stage, histogram in histograms.items()}
+            for msg_type, histograms in node.event_latency.histograms.items()
+        },
+        "tables": table_sizes(node),
+    }
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _histogram_lines(name, labels, histogram):
+    """累积桶、sum、count 三组样本，labels 为 'key="value",...' 或空串"""
+    prefix = f"{labels}," if labels else ""
+    suffix = f"{{{labels}}}" if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram["count"]}')
+    lines.append(f"{name}_sum{suffix} {_format_value(histogram['sum'])}")
+    lines.append(f"{name}_count{suffix} {histogram['count']}")
+    return lines
+
+
+def render_text(node):
+    """Prometheus 文本格式，在持有 node.lock 时调用"""
+    data = snapshot(node)
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP olsr_{name} {help_text}")
+        lines.append(f"# TYPE olsr_{name} {kind}")
+
+    family("uptime_seconds", "gauge", "Seconds since the metrics were reset (daemon start).")
+    lines.append(f"olsr_uptime_seconds {_format_value(data['uptime_sec'])}")
+    for direction, help_text in (
+        ("rx", "Messages received, by message type."),
+        ("tx", "Messages transmitted (own and forwarded), by message type."),
+        ("forwarded", "Messages queued for MPR forwarding, by message type."),
+    ):
+        family(f"{direction}_messages_total", "counter", help_text)
+        for msg_type, entry in data[direction].items():
+            lines.append(f'olsr_{direction}_messages_total{{type="{msg_type}"}} {entry["messages"]}')
+        family(f"{direction}_bytes_total", "counter", help_text.replace("Messages", "Message bytes", 1))
+        for msg_type, entry in data[direction].items():
+            lines.append(f'olsr_{direction}_bytes_total{{type="{msg_type}"}} {entry["bytes"]}')
+    for name, help_text in (
+        ("duplicates_dropped", "Flooded messages dropped by the duplicate set."),
+        ("mpr_recomputes", "MPR set recalculations."),
+        ("route_recomputes", "Routing table recalculations."),
+    ):
+        family(f"{name}_total", "counter", help_text)
+        lines.append(f"olsr_{name}_total {data[name]}")
+    family("route_table_version", "gauge", "Routing table version, bumped on every route change.")
+    lines.append(f"olsr_route_table_version {data['route_table_version']}")
+
+    for name, histogram in data["histograms"].items():
+        family(name, "histogram", name.replace("_", " ").capitalize() + ".")
+        lines.extend(_histogram_lines(f"olsr_{name}", "", histogram))
+
+    family("event_latency_seconds", "histogram", "Seconds from receiving a HELLO/TC to each processing stage; install only counts events that changed the routing table.")
+    for msg_type, stages in data["event_latency_seconds"].items():
+        for stage, histogram in stages.items():
+            labels = f'type="{msg_type}",stage="{stage}"'
+            lines.extend(_histogram_lines("olsr_event_latency_seconds", labels, histogram))
+
+    family("table_entries", "gauge", "Current size of each protocol table.")
+    for table, size in data["tables"].items():
+        lines.append(f'olsr_table_entries{{table="{table}"}} {size}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    node = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        with self.node.lock:
+            body = render_text(self.node).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, _format, *_args):
+        pass
+
+
+def start_http_server(node, host, port):
+    """在后台线程提供 GET /metrics，返回 server，守护进程退出时 shutdown()"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"node": node})
+    server = ThreadingHTTPServer((host, int(port)), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
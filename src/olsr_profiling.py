@@ -0,0 +1,246 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from constants import (
+    PROFILE_DIR,
+    PROFILE_TOP_ENTRIES,
+    STACK_SAMPLE_INTERVAL,
+    STACK_SAMPLE_MAX_SECONDS,
+    TRACEMALLOC_FRAMES,
+)
+from olsr_log import get_logger
+
+"""
+本文件提供运行中守护进程的按需性能剖析，由控制命令驱动，结果写入剖析目录，回应里给出文件路径:
+    cProfile: 开始后每个协议线程在持有协议锁期间各用一个 Profile，停止时合并写出 .prof (pstats 格式)
+              Python 3.11 的 cProfile 只能剖析调用 enable() 的线程，协议处理都在 node.lock 下进行，
+              所以由 InstrumentedLock 在获得锁之后 enter()、释放之前 exit()，阻塞在 recvfrom/sleep 的时间不计入
+    tracemalloc: 开始跟踪，每次快照在后台写出 .tracemalloc (Snapshot.dump 格式) 和 .txt 报告，报告给出与上一次快照的差异
+    线程栈采样: 后台线程按间隔采样 sys._current_frames()，N 秒后写出折叠栈 .folded (flamegraph.pl / speedscope 可读)
+除后台写出线程外，所有方法都在持有 node.lock 时调用
+"""
+
+_log = get_logger("profile")
+
+
+class ProfilingError(Exception):
+    pass
+
+
+class LockProfiler:
+    """按线程的 cProfile，只在持有协议锁期间启用"""
+
+    def __init__(self):
+        # 格式: { thread ident: (线程名, cProfile.Profile) }
+        self.profiles = {}
+        self.started_at = time.time()
+        self._local = threading.local()
+
+    def enter(self):
+        ident = threading.get_ident()
+        entry = self.profiles.get(ident)
+        if entry is None:
+            entry = (threading.current_thread().name, cProfile.Profile())
+            self.profiles[ident] = entry
+        self._local.active = entry[1]
+        entry[1].enable()
+
+    def exit(self):
+        profile = getattr(self._local, "active", None)
+        if profile is not None:
+            profile.disable()
+            self._local.active = None
+
+
+def _top_stats(stats, sort_key, count):
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort_key).print_stats(count)
+    return stream.getvalue()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class NodeProfiler:
+    def __init__(self, my_ip, lock, output_dir=PROFILE_DIR):
+        self.my_ip = my_ip
+        self.lock = lock
+        self.output_dir = output_dir
+        self.last_tracemalloc = None
+        self.last_tracemalloc_path = None
+        self.snapshot_pending = False
+        self.sampling_until = None
+        self.results_written = 0
+
+    def _output_path(self, kind, suffix):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"olsr-{self.my_ip}-{kind}-{stamp}-{os.getpid()}-{self.results_written}{suffix}"
+        self.results_written += 1
+        return os.path.join(self.output_dir, name)
+
+    def status(self):
+        return {
+            "cprofile": self.lock.profiler is not None,
+            "tracemalloc": tracemalloc.is_tracing(),
+            "stack_sampling": self.sampling_until is not None,
+            "profile_dir": self.output_dir,
+        }
+
+    def start_cprofile(self):
+        if self.lock.profiler is not None:
+            raise ProfilingError("cProfile 已在运行")
+        profiler = LockProfiler()
+        self.lock.profiler = profiler
+        # 当前线程已经持有锁，从这里开始计入
+        profiler.enter()
+        _log.info("cProfile started")
+        return {"started_at": profiler.started_at}
+
+    def stop_cprofile(self):
+        profiler = self.lock.profiler
+        if profiler is None:
+            raise ProfilingError("cProfile 未运行")
+        profiler.exit()
+        self.lock.profiler = None
+        # 其他线程都不持有锁，它们的 Profile 已经 disable
+        profiles = [profile for _name, profile in profiler.profiles.values()]
+        path = self._output_path("cprofile", ".prof")
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(path)
+        _log.info("cProfile stopped, written to %s", path)
+        return {
+            "path": path,
+            "duration_sec": round(time.time() - profiler.started_at, 3),
+            "threads": sorted(name for name, _profile in profiler.profiles.values()),
+            "total_calls": stats.total_calls,
+            "top": _top_stats(stats, "cumulative", PROFILE_TOP_ENTRIES),
+        }
+
+    def start_tracemalloc(self, frames=TRACEMALLOC_FRAMES):
+        if tracemalloc.is_tracing():
+            raise ProfilingError("tracemalloc 已在运行")
+        if self.snapshot_pending:
+            raise ProfilingError("上一次快照尚未写完")
+        tracemalloc.start(int(frames))
+        self.last_tracemalloc = None
+        self.last_tracemalloc_path = None
+        _log.info("tracemalloc started frames=%s", frames)
+        return {"frames": int(frames)}
+
+    def snapshot_tracemalloc(self):
+        """
+        在后台线程拍快照并写出 .tracemalloc 和 .txt 报告 (占用最多的行，或与上一次快照的差异)，立即返回两个路径
+        统计几万条分配记录要几秒，不能在持有协议锁时做
+        """
+        if not tracemalloc.is_tracing():
+            raise ProfilingError("tracemalloc 未运行")
+        if self.snapshot_pending:
+            raise ProfilingError("上一次快照尚未写完")
+        path = self._output_path("tracemalloc", ".tracemalloc")
+        report_path = path[: -len(".tracemalloc")] + ".txt"
+        current, peak = tracemalloc.get_traced_memory()
+        self.snapshot_pending = True
+        args = (path, report_path, self.last_tracemalloc, self.last_tracemalloc_path)
+        threading.Thread(target=self._write_tracemalloc, args=args, daemon=True).start()
+        result = {
+            "path": path,
+            "report_path": report_path,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "compared_to": self.last_tracemalloc_path,
+        }
+        self.last_tracemalloc_path = path
+        return result
+
+    def _write_tracemalloc(self, path, report_path, previous, previous_path):
+        # 写出失败 (包括 MemoryError 这类不捕获的异常) 时保留上一次的快照作为比较基准
+        snapshot = previous
+        try:
+            taken = tracemalloc.take_snapshot()
+            taken.dump(path)
+            if previous is None:
+                title = "top allocations by line"
+                stats = taken.statistics("lineno")
+            else:
+                title = f"allocation diff by line against {previous_path}"
+                stats = taken.compare_to(previous, "lineno")
+            with open(report_path, "w", encoding="utf-8") as handle:
+                handle.write(f"# {title}\n")
+                for stat in stats[:PROFILE_TOP_ENTRIES]:
+                    handle.write(f"{stat}\n")
+            snapshot = taken
+            _log.info("tracemalloc snapshot written to %s", path)
+        except (OSError, RuntimeError) as exc:
+            _log.error("tracemalloc snapshot: %s", exc)
+        finally:
+            with self.lock:
+                self.snapshot_pending = False
+                # 期间 tracemalloc 被停止时丢弃快照，重新开始后不与旧快照比较
+                self.last_tracemalloc = snapshot if tracemalloc.is_tracing() else None
+                if snapshot is previous:
+                    # 下一次报告的比较对象仍是上一个写成功的快照
+                    self.last_tracemalloc_path = previous_path
+
+    def stop_tracemalloc(self):
+        if not tracemalloc.is_tracing():
+            raise ProfilingError("tracemalloc 未运行")
+        tracemalloc.stop()
+        self.last_tracemalloc = None
+        self.last_tracemalloc_path = None
+        _log.info("tracemalloc stopped")
+        return {"stopped": True}
+
+    def sample_stacks(self, seconds, interval=STACK_SAMPLE_INTERVAL):
+        """启动后台采样，立即返回结果文件路径，文件在 ready_at 之后写出"""
+        if self.sampling_until is not None:
+            raise ProfilingError("栈采样已在运行")
+        if not 0 < seconds <= STACK_SAMPLE_MAX_SECONDS:
+            raise ProfilingError(f"采样时间须在 (0, {STACK_SAMPLE_MAX_SECONDS}] 秒内")
+        if interval <= 0:
+            raise ProfilingError(f"非法采样间隔：{interval}")
+        path = self._output_path("stacks", ".folded")
+        self.sampling_until = time.time() + seconds
+        threading.Thread(target=self._sample_loop, args=(path, seconds, interval), daemon=True).start()
+        _log.info("stack sampling for %.1fs every %.3fs -> %s", seconds, interval, path)
+        return {"path": path, "ready_at": self.sampling_until, "interval_sec": interval}
+
+    def _sample_loop(self, path, seconds, interval):
+        own_ident = threading.get_ident()
+        # 格式: { "线程名;最外层帧;...;最内层帧": 次数 }
+        folded = {}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)).replace(" ", "_"))
+                    key = ";".join(reversed(stack))
+                    folded[key] = folded.get(key, 0) + 1
+                samples += 1
+                time.sleep(interval)
+            with open(path, "w", encoding="utf-8") as handle:
+                for key, count in sorted(folded.items()):
+                    handle.write(f"{key} {count}\n")
+            _log.info("stack sampling done: %s samples -> %s", samples, path)
+        except OSError as exc:
+            _log.error("stack sampling: %s", exc)
+        finally:
+            with self.lock:
+                self.sampling_until = None
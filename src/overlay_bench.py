@@ -15,6 +15,10 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
+from olsr_client import ControlClient, NextHopTracker
+from route_events import RouteCache
+from route_shm import RouteTableReader
+
 APP_NAME = "overlay_bench"
 APP_VERSION = 1
 DEFAULT_DATA_PORT = 6300
@@ -74,29 +78,6 @@ def write_json_atomic(path: Path, payload: dict[str, Any]) -> None:
     tmp_path.replace(path)
 
 
-class ControlClient:
-    def __init__(self, control_ip: str = "127.0.0.1", control_port: int = 5100, timeout_sec: float = 3.0):
-        self.control_ip = control_ip
-        self.control_port = int(control_port)
-        self.timeout_sec = float(timeout_sec)
-
-    def send_command(self, command: str) -> str:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            sock.settimeout(self.timeout_sec)
-            sock.sendto(command.encode("utf-8"), (self.control_ip, self.control_port))
-            data, _ = sock.recvfrom(65535)
-            return data.decode("utf-8", errors="ignore")
-        finally:
-            sock.close()
-
-    def discover_route(self, dest_ip: str) -> str:
-        return self.send_command(f"DISCOVER_ROUTE:{dest_ip}")
-
-    def show_route_detail(self, dest_ip: str) -> str:
-        return self.send_command(f"SHOW_ROUTE_DETAIL:{dest_ip}")
-
-
 class OverlayBenchNode:
     def __init__(
         self,
@@ -111,6 +92,9 @@ class OverlayBenchNode:
         socket_sndbuf_bytes: int,
         socket_rcvbuf_bytes: int,
         quiet: bool,
+        link_failure_threshold: int = 2,
+        route_reader: RouteTableReader | None = None,
+        route_cache: RouteCache | None = None,
     ):
         self.node_ip = node_ip
         self.data_port = int(data_port)
@@ -121,6 +105,9 @@ class OverlayBenchNode:
         self.send_retries = int(send_retries)
         self.send_retry_sleep_ms = float(send_retry_sleep_ms)
         self.quiet = quiet
+        self.route_reader = route_reader
+        self.route_cache = route_cache
+        self.next_hops = NextHopTracker(control_client, link_failure_threshold, route_cache, self.log)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(socket_sndbuf_bytes))
@@ -131,15 +118,19 @@ class OverlayBenchNode:
         self._waiters: dict[tuple[str, str], queue.Queue[dict[str, Any]]] = {}
         self._waiters_lock = threading.Lock()
         self._pending_packets: dict[tuple[str, str], dict[str, Any]] = {}
-        self._route_cache: dict[str, RouteInfo] = {}
-        self._route_lock = threading.Lock()
         self._throughput_sessions: dict[str, ThroughputSession] = {}
         self.send_retry_count = 0
         self.send_retry_events = 0
         self.send_failures = 0
+        # Replies that never came back; the loss may be anywhere on the path, so no next hop is blamed.
+        self.end_to_end_timeouts = 0
 
     def close(self) -> None:
         self._stop_event.set()
+        self.next_hops.close()
+        if self.route_cache is not None:
+            self.route_cache.close()
+        self.control_client.close()
         try:
             self.sock.close()
         except OSError:
@@ -195,52 +186,94 @@ class OverlayBenchNode:
             self.pop_waiter(wait_kind, wait_id)
 
     def query_route(self, dest_ip: str) -> RouteInfo | None:
-        text = self.control_client.show_route_detail(dest_ip)
-        if text.startswith("未找到路由") or text.startswith("非法地址"):
+        route = self.read_shared_route(dest_ip)
+        if route is not None:
+            return route
+        try:
+            result = self.control_client.lookup([dest_ip])
+        except (RuntimeError, ValueError):
             return None
-        fields: dict[str, str] = {}
-        for line in text.splitlines():
-            if "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            fields[key.strip()] = value.strip()
-        required = {"dest", "next_hop_ip", "hop_count", "valid", "state"}
-        if not required.issubset(fields):
+        return self.accept_route(dest_ip, result["routes"].get(dest_ip), result.get("table_version"), result.get("epoch"))
+
+    def accept_route(
+        self, dest_ip: str, route: dict[str, Any] | None, version: int | None, epoch: float | None
+    ) -> RouteInfo | None:
+        if route is None:
             return None
-        valid = fields.get("valid", "").lower() == "true"
-        state = fields.get("state", "")
-        next_hop_ip = fields.get("next_hop_ip", "")
-        if (not valid) or state != "VALID" or not next_hop_ip:
+        if (not route.get("valid")) or route.get("state") != "VALID" or not route.get("next_hop_ip"):
             return None
+        if self.route_cache is not None:
+            self.route_cache.put(dest_ip, route, version, epoch)
         return RouteInfo(
-            dest=fields["dest"],
-            next_hop_ip=next_hop_ip,
-            hop_count=int(fields["hop_count"]),
-            valid=valid,
-            state=state,
-            first_seen_at=float(fields["first_seen_at"]) if "first_seen_at" in fields else None,
-            protocol_started_at=float(fields["protocol_started_at"]) if "protocol_started_at" in fields else None,
+            dest=route["dest"],
+            next_hop_ip=route["next_hop_ip"],
+            hop_count=int(route["hop_count"]),
+            valid=True,
+            state=route["state"],
+            first_seen_at=route.get("first_seen_at"),
+            protocol_started_at=route.get("protocol_started_at"),
         )
 
     def establish_route(self, dest_ip: str) -> tuple[RouteInfo, float]:
         start_ns = time.perf_counter_ns()
-        self.log(self.control_client.discover_route(dest_ip))
         deadline = time.monotonic() + self.route_timeout_sec
-        while time.monotonic() < deadline:
-            route = self.query_route(dest_ip)
-            if route is not None:
-                elapsed_sec = (time.perf_counter_ns() - start_ns) / 1_000_000_000.0
-                with self._route_lock:
-                    self._route_cache[dest_ip] = route
-                return route, elapsed_sec
-            time.sleep(self.route_poll_interval_sec)
-        raise TimeoutError(f"route convergence timeout for {dest_ip}")
+        route = self.query_route(dest_ip)
+        while route is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"route convergence timeout for {dest_ip}")
+            try:
+                result = self.control_client.wait_route(dest_ip, remaining)
+            except (OSError, RuntimeError, ValueError) as exc:
+                self.log(f"wait route dest={dest_ip} failed: {exc}")
+                time.sleep(self.route_poll_interval_sec)
+                continue
+            route = self.accept_route(dest_ip, result["route"], result.get("table_version"), result.get("epoch"))
+        elapsed_sec = (time.perf_counter_ns() - start_ns) / 1_000_000_000.0
+        self.log(f"route ready dest={dest_ip} next_hop={route.next_hop_ip} hop_count={route.hop_count} elapsed_ms={elapsed_sec * 1000.0:.1f}")
+        return route, elapsed_sec
+
+    def read_shared_route(self, dest_ip: str) -> RouteInfo | None:
+        if self.route_reader is None:
+            return None
+        route = self.route_reader.lookup(dest_ip)
+        if route is None or not route["valid"]:
+            return None
+        self.next_hops.touch(dest_ip)
+        return RouteInfo(
+            dest=route["dest"],
+            next_hop_ip=route["next_hop_ip"],
+            hop_count=int(route["hop_count"]),
+            valid=True,
+            state="VALID",
+        )
+
+    def read_cached_route(self, dest_ip: str) -> RouteInfo | None:
+        if self.route_cache is None:
+            return None
+        route = self.route_cache.get(dest_ip)
+        if route is None:
+            return None
+        self.next_hops.touch(dest_ip)
+        return RouteInfo(
+            dest=route["dest"],
+            next_hop_ip=route["next_hop_ip"],
+            hop_count=int(route["hop_count"]),
+            valid=True,
+            state=route["state"],
+        )
+
+    def route_table_version(self) -> tuple[float, int] | None:
+        """(epoch, table_version) of the node's daemon, or None when its control port does not answer."""
+        try:
+            return self.control_client.table_state()
+        except (OSError, RuntimeError, ValueError):
+            return None
 
     def resolve_next_hop(self, dest_ip: str) -> RouteInfo:
-        with self._route_lock:
-            cached = self._route_cache.get(dest_ip)
-        if cached is not None:
-            return cached
+        route = self.read_shared_route(dest_ip) or self.read_cached_route(dest_ip)
+        if route is not None:
+            return route
         route, _ = self.establish_route(dest_ip)
         return route
 
@@ -261,7 +294,7 @@ class OverlayBenchNode:
             raise RuntimeError(f"no next hop available for node {self.node_ip} in explicit path {path}")
         return path[next_index], next_index
 
-    def send_overlay(self, packet: dict[str, Any]) -> None:
+    def send_overlay(self, packet: dict[str, Any]) -> str:
         dest_ip = str(packet["dest_ip"])
         explicit_next = self.resolve_path_next_hop(packet)
         if explicit_next is not None:
@@ -281,7 +314,7 @@ class OverlayBenchNode:
                     f"send kind={packet.get('kind')} dest={dest_ip} next_hop={next_hop_ip} "
                     f"retry_used={retry_used} attempt={attempt + 1}"
                 )
-                return
+                return next_hop_ip
             except BlockingIOError:
                 retry_used = True
                 self.send_retry_count += 1
@@ -294,6 +327,7 @@ class OverlayBenchNode:
                     select.select([], [self.sock], [], 0.001)
             except OSError:
                 self.send_failures += 1
+                self.next_hops.record_delivery(next_hop_ip, False)
                 raise
 
     def handle_ping(self, packet: dict[str, Any]) -> None:
@@ -454,12 +488,25 @@ def add_common_node_args(parser: argparse.ArgumentParser) -> None:
     parser.add_argument("--data-port", type=int, default=DEFAULT_DATA_PORT, help="UDP port used by overlay_bench.")
     parser.add_argument("--control-ip", default="127.0.0.1", help="Local OLSR control endpoint IP.")
     parser.add_argument("--control-port", type=int, default=5100, help="Local OLSR control endpoint port.")
+    parser.add_argument("--control-unix", help="Unix socket of olsr_main.py --control-unix; control requests reuse one connection on it.")
     parser.add_argument("--route-timeout-sec", type=float, default=12.0, help="Max time to wait for route establishment.")
-    parser.add_argument("--route-poll-interval-sec", type=float, default=0.2, help="Polling interval while waiting for routes.")
+    parser.add_argument("--route-poll-interval-sec", type=float, default=0.2, help="Retry interval when a WAIT_ROUTE request fails.")
     parser.add_argument("--send-retries", type=int, default=200, help="Max retries when UDP send buffer is temporarily full.")
     parser.add_argument("--send-retry-sleep-ms", type=float, default=0.5, help="Sleep per retry after BlockingIOError.")
     parser.add_argument("--socket-sndbuf-bytes", type=int, default=DEFAULT_SOCKET_BUFFER_BYTES, help="UDP send buffer size.")
     parser.add_argument("--socket-rcvbuf-bytes", type=int, default=DEFAULT_SOCKET_BUFFER_BYTES, help="UDP receive buffer size.")
+    parser.add_argument(
+        "--link-failure-threshold",
+        type=int,
+        default=2,
+        help="Consecutive send/reply failures toward a next hop before asking OLSR to probe it (0 disables).",
+    )
+    parser.add_argument("--route-shm", help="Route table file published by olsr_main.py --route-shm; next hops are read from it without a control round trip.")
+    parser.add_argument(
+        "--no-route-cache",
+        action="store_true",
+        help="Do not subscribe to OLSR route changes; every unresolved next hop is looked up over the control port.",
+    )
     parser.add_argument("--quiet", action="store_true", help="Reduce benchmark daemon and sender log output.")
     parser.add_argument("--log-file", help="Optional log file path.")
     parser.add_argument("--json", action="store_true", help="Print only one JSON line result for sender commands.")
@@ -506,7 +553,7 @@ def build_parser() -> argparse.ArgumentParser:
 
 def build_node(args: argparse.Namespace) -> OverlayBenchNode:
     bind_port = int(getattr(args, "bind_port", args.data_port))
-    control = ControlClient(control_ip=args.control_ip, control_port=args.control_port)
+    control = ControlClient(control_ip=args.control_ip, control_port=args.control_port, unix_path=args.control_unix)
     return OverlayBenchNode(
         node_ip=args.node_ip,
         data_port=args.data_port,
@@ -519,9 +566,25 @@ def build_node(args: argparse.Namespace) -> OverlayBenchNode:
         socket_sndbuf_bytes=args.socket_sndbuf_bytes,
         socket_rcvbuf_bytes=args.socket_rcvbuf_bytes,
         quiet=args.quiet,
+        link_failure_threshold=args.link_failure_threshold,
+        route_reader=RouteTableReader(args.route_shm) if args.route_shm else None,
+        route_cache=None if args.no_route_cache else RouteCache(args.control_ip, args.control_port).start(),
     )
 
 
+def route_table_changes(
+    version_start: tuple[float, int] | None, version_end: tuple[float, int] | None
+) -> int | None:
+    """
+    Route table changes seen by the source node while the test ran; non-zero means routes flapped mid-test.
+
+    None when either probe failed or the daemon restarted in between (its versions restart from 0).
+    """
+    if version_start is None or version_end is None or version_start[0] != version_end[0]:
+        return None
+    return version_end[1] - version_start[1]
+
+
 def parse_explicit_path(args: argparse.Namespace) -> list[str] | None:
     if not args.path:
         return None
@@ -567,6 +630,7 @@ def run_latency_command(args: argparse.Namespace) -> int:
     try:
         listener = node.start_background()
         route, route_setup_sec = node.establish_route(args.dest_ip)
+        table_version_start = node.route_table_version()
         explicit_path = parse_explicit_path(args)
         payload_text = "x" * int(args.payload_size)
         rtts_ms: list[float] = []
@@ -590,16 +654,20 @@ def run_latency_command(args: argparse.Namespace) -> int:
                 packet["path_index"] = 0
             start_ns = time.perf_counter_ns()
             try:
-                node.send_overlay(packet)
+                next_hop_ip = node.send_overlay(packet)
                 reply_queue.get(timeout=float(args.reply_timeout_sec))
                 rtt_ms = (time.perf_counter_ns() - start_ns) / 1_000_000.0
                 rtts_ms.append(rtt_ms)
+                node.next_hops.record_delivery(next_hop_ip, True)
             except queue.Empty:
+                # The ping or its reply may have been lost on any hop; send_overlay already reports local send failures.
                 lost += 1
+                node.end_to_end_timeouts += 1
             finally:
                 node.pop_waiter("ping_reply", ping_id)
             if args.interval_ms > 0:
                 time.sleep(float(args.interval_ms) / 1000.0)
+        table_version_end = node.route_table_version()
         node._stop_event.set()
         listener.join(timeout=1.0)
         sent = int(args.count)
@@ -613,6 +681,7 @@ def run_latency_command(args: argparse.Namespace) -> int:
             "next_hop_ip": route.next_hop_ip,
             "hop_count": route.hop_count,
             "path": explicit_path,
+            "route_table_changes": route_table_changes(table_version_start, table_version_end),
             "sent": sent,
             "received": received,
             "lost": lost,
@@ -626,6 +695,8 @@ def run_latency_command(args: argparse.Namespace) -> int:
             "send_retry_events": node.send_retry_events,
             "send_retry_count": node.send_retry_count,
             "send_failures": node.send_failures,
+            "link_failure_reports": node.next_hops.link_failure_reports,
+            "end_to_end_timeouts": node.end_to_end_timeouts,
         }
         print_result(result, args.json)
         return 0
@@ -638,6 +709,7 @@ def run_throughput_command(args: argparse.Namespace) -> int:
     node = build_node(args)
     try:
         route, route_setup_sec = node.establish_route(args.dest_ip)
+        table_version_start = node.route_table_version()
         explicit_path = parse_explicit_path(args)
         payload_text = "x" * int(args.payload_size)
         session_id = uuid.uuid4().hex
@@ -694,6 +766,7 @@ def run_throughput_command(args: argparse.Namespace) -> int:
                 break
             except Exception:
                 continue
+        table_version_end = node.route_table_version()
         if result is None:
             raise TimeoutError(
                 f"throughput result timeout for session={session_id} "
@@ -718,6 +791,7 @@ def run_throughput_command(args: argparse.Namespace) -> int:
             "next_hop_ip": route.next_hop_ip,
             "hop_count": route.hop_count,
             "path": explicit_path,
+            "route_table_changes": route_table_changes(table_version_start, table_version_end),
             "sent_packets": sent_packets,
             "received_packets": received_packets,
             "lost_packets": loss_packets,
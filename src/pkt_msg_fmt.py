@@ -1,6 +1,9 @@
 import struct
 import socket
 import math
+from olsr_log import get_logger
+
+_log = get_logger("packet")
 
 # 常量定义 (基于 RFC 3626)
 OLSR_C = 1.0 / 16.0  # 缩放因子 C = 0.0625 [cite: 1679]
@@ -67,7 +70,7 @@ def create_message_header(msg_type, vtime_seconds, msg_body_len, originator_ip,
     try:
         ip_bytes = socket.inet_aton(originator_ip)
     except OSError:
-        print(f"Error: Invalid IP address {originator_ip}")
+        _log.error("消息头打包失败，非法地址: %s", originator_ip)
         return None
 
     # 4. 打包 (使用大端序 !)
@@ -0,0 +1,80 @@
+import socket
+import struct
+
+"""
+本文件实现路由表的最长前缀匹配索引
+按前缀长度分桶: { prefix_len: { network_int: route } }，查找时从最长的前缀长度开始逐个桶做一次哈希查找
+主机路由作为 /32 前缀放在同一个索引里，所以大多数查找第一个桶就命中
+前缀长度最多 33 种，查找代价与前缀条数无关，只与出现过的前缀长度个数有关
+"""
+
+
+def ip_to_int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def prefix_mask(prefix_len):
+    return (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF if prefix_len else 0
+
+
+class PrefixIndex:
+    def __init__(self):
+        # 格式: { prefix_len: { network_int: route } }
+        self.tables = {}
+        # 查找顺序: [(prefix_len, mask, table), ...]，按前缀长度从长到短，只在桶增删时重建
+        self.search_order = []
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    def _rebuild_search_order(self):
+        self.search_order = [
+            (prefix_len, prefix_mask(prefix_len), self.tables[prefix_len])
+            for prefix_len in sorted(self.tables, reverse=True)
+        ]
+
+    def insert(self, network_ip, prefix_len, route):
+        table = self.tables.get(prefix_len)
+        if table is None:
+            table = self.tables[prefix_len] = {}
+            self._rebuild_search_order()
+        table[ip_to_int(network_ip) & prefix_mask(prefix_len)] = route
+
+    def remove(self, network_ip, prefix_len):
+        table = self.tables.get(prefix_len)
+        if table is None:
+            return
+        table.pop(ip_to_int(network_ip) & prefix_mask(prefix_len), None)
+        if not table:
+            del self.tables[prefix_len]
+            self._rebuild_search_order()
+
+    def sync(self, old_entries, new_entries):
+        """
+        增量更新: 只删除消失的前缀、写入新增或内容变化的前缀
+        每次重算都会生成新的 route 字典，按内容比较，内容相同的条目保留索引里原来的字典
+        :param old_entries / new_entries: { (network_ip, prefix_len): route }
+        :return: (写入条数, 删除条数)
+        """
+        removed = 0
+        for key in old_entries.keys() - new_entries.keys():
+            self.remove(*key)
+            removed += 1
+        written = 0
+        for key, route in new_entries.items():
+            if old_entries.get(key) != route:
+                self.insert(key[0], key[1], route)
+                written += 1
+        return written, removed
+
+    def lookup(self, ip):
+        """最长前缀匹配，返回命中的 route，非法地址或未命中返回 None"""
+        try:
+            value = ip_to_int(ip)
+        except OSError:
+            return None
+        for _prefix_len, mask, table in self.search_order:
+            route = table.get(value & mask)
+            if route is not None:
+                return route
+        return None
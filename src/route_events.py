@@ -0,0 +1,274 @@
+import json
+import socket
+import threading
+import time
+
+from constants import CONTROL_API_VERSION, ROUTE_SUBSCRIBERS_MAX, ROUTE_SUBSCRIPTION_LEASE, ROUTE_WAITS_MAX
+
+"""
+本文件实现路由变化订阅: 客户端在控制端口上发送 {"v": 2, "cmd": "subscribe"}，守护进程记下它的地址
+之后每次路由表变化，守护进程把增加/修改/删除的路由推送到这个地址:
+    {"v": 2, "event": "routes", "epoch": 启动时间, "version": 路由表版本号,
+     "changes": [{"op": "add" | "change", "dest", "next_hop_ip", "hop_count", "valid", "state", "provisional"}, {"op": "delete", "dest"}]}
+变化太多放不进一个 UDP 报文时改发 {"event": "routes", "reset": true}，客户端清空缓存
+订阅有租期，客户端每 1/3 租期续订一次，守护进程重启 (epoch 变化) 或版本号不连续时客户端清空缓存
+同样由路由表变化驱动的还有挂起的 WAIT_ROUTE 请求 (RouteWaits)，路由装入时立即回应
+"""
+
+
+def diff_signatures(old_signature, new_signature):
+    """
+    :param old_signature/new_signature: { dest: (dest, next_hop_ip, hop_count, valid, state, provisional) }，即 RoutingManager 的路由签名
+    :return: 变化列表，格式同推送消息的 "changes"
+    """
+    changes = []
+    for dest, signature in new_signature.items():
+        previous = old_signature.get(dest)
+        if previous == signature:
+            continue
+        _dest, next_hop_ip, hop_count, valid, state, provisional = signature
+        changes.append(
+            {
+                "op": "add" if previous is None else "change",
+                "dest": dest,
+                "next_hop_ip": next_hop_ip,
+                "hop_count": hop_count,
+                "valid": valid,
+                "state": state,
+                "provisional": provisional,
+            }
+        )
+    for dest in old_signature:
+        if dest not in new_signature:
+            changes.append({"op": "delete", "dest": dest})
+    return changes
+
+
+class RouteSubscriptions:
+    """守护进程一侧: 订阅者地址和租期，在持有协议锁时调用"""
+
+    def __init__(self, lease=ROUTE_SUBSCRIPTION_LEASE, max_subscribers=ROUTE_SUBSCRIBERS_MAX):
+        self.lease = float(lease)
+        self.max_subscribers = int(max_subscribers)
+        # 格式: { (ip, port): expires_at }
+        self.subscribers = {}
+
+        self.events_sent = 0
+        self.resets_sent = 0
+
+    def subscribe(self, addr, current_time, lease=None):
+        """新增或续订，订阅者已满时返回 None，否则返回实际租期"""
+        self.expire(current_time)
+        if addr not in self.subscribers and len(self.subscribers) >= self.max_subscribers:
+            return None
+        lease = self.lease if lease is None else min(float(lease), self.lease)
+        self.subscribers[addr] = current_time + lease
+        return lease
+
+    def unsubscribe(self, addr):
+        return self.subscribers.pop(addr, None) is not None
+
+    def expire(self, current_time):
+        for addr in [addr for addr, expires_at in self.subscribers.items() if expires_at <= current_time]:
+            del self.subscribers[addr]
+
+    def active(self, current_time):
+        self.expire(current_time)
+        return list(self.subscribers)
+
+    def build_event(self, old_signature, new_signature, version, epoch, max_size):
+        event = {
+            "v": CONTROL_API_VERSION,
+            "event": "routes",
+            "epoch": epoch,
+            "version": version,
+            "changes": diff_signatures(old_signature, new_signature),
+        }
+        payload = json.dumps(event, separators=(",", ":")).encode("utf-8")
+        if len(payload) > max_size:
+            del event["changes"]
+            event["reset"] = True
+            payload = json.dumps(event, separators=(",", ":")).encode("utf-8")
+            self.resets_sent += 1
+        return payload
+
+
+class RouteWait:
+    def __init__(self, dest_ip, addr, deadline, respond):
+        self.dest_ip = dest_ip
+        self.addr = addr          # 请求的源地址，回应发往这里
+        self.deadline = deadline
+        self.respond = respond    # respond(route 或 None) -> 回应文本，由发起请求的命令处理函数提供，保持请求原来的格式
+
+
+class RouteWaits:
+    """守护进程一侧: 挂起的 WAIT_ROUTE 请求，路由表变化时检查是否可以回应，超时由控制线程取出"""
+
+    def __init__(self, max_waits=ROUTE_WAITS_MAX):
+        self.max_waits = int(max_waits)
+        self.waits = []
+
+        self.answered = 0
+        self.timed_out = 0
+
+    def add(self, dest_ip, addr, deadline, respond):
+        if len(self.waits) >= self.max_waits:
+            return False
+        self.waits.append(RouteWait(dest_ip, addr, deadline, respond))
+        return True
+
+    def pop_ready(self, lookup):
+        """
+        :param lookup: lookup(dest_ip) -> route 或 None
+        :return: [(RouteWait, route)]，已找到路由的请求
+        """
+        if not self.waits:
+            return []
+        ready = []
+        pending = []
+        for wait in self.waits:
+            route = lookup(wait.dest_ip)
+            if route is None:
+                pending.append(wait)
+            else:
+                ready.append((wait, route))
+        self.waits = pending
+        self.answered += len(ready)
+        return ready
+
+    def drop(self, addr):
+        """请求方的连接已关闭，丢弃它挂起的请求"""
+        self.waits = [wait for wait in self.waits if wait.addr != addr]
+
+    def pop_expired(self, current_time):
+        expired = [wait for wait in self.waits if wait.deadline <= current_time]
+        if expired:
+            self.waits = [wait for wait in self.waits if wait.deadline > current_time]
+            self.timed_out += len(expired)
+        return expired
+
+    def time_until_deadline(self, current_time):
+        if not self.waits:
+            return None
+        return max(0.0, min(wait.deadline for wait in self.waits) - current_time)
+
+
+class RouteCache:
+    """
+    转发程序一侧: 订阅路由变化并维护以查询地址为键的本地缓存
+    订阅还没有确认或已过期时 get() 返回 None，由调用方回退到控制端口查询
+    """
+
+    def __init__(self, control_ip, control_port, lease=ROUTE_SUBSCRIPTION_LEASE):
+        self.control_addr = (control_ip, int(control_port))
+        self.lease = float(lease)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", 0))
+        self.lock = threading.Lock()
+        # 格式: { 查询的目的地址: 路由字典 (dest, next_hop_ip, hop_count, valid, state) }
+        self.routes = {}
+        self.epoch = None
+        self.version = None
+        self.acked_at = None
+        self.running = True
+
+        self.events = 0
+        self.resets = 0
+
+    def start(self):
+        threading.Thread(target=self.loop, daemon=True).start()
+        return self
+
+    def _send(self, payload):
+        message = dict(payload, v=CONTROL_API_VERSION)
+        try:
+            self.sock.sendto(json.dumps(message, separators=(",", ":")).encode("utf-8"), self.control_addr)
+        except OSError:
+            pass
+
+    def loop(self):
+        renew_interval = self.lease / 3
+        next_renew = 0.0
+        while self.running:
+            now = time.monotonic()
+            if now >= next_renew:
+                self._send({"cmd": "subscribe", "lease": self.lease})
+                next_renew = now + renew_interval
+            self.sock.settimeout(max(0.01, next_renew - now))
+            try:
+                data, _ = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                message = json.loads(data.decode("utf-8"))
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if message.get("event") == "routes":
+                self.apply_event(message)
+            elif message.get("ok") and isinstance(message.get("result"), dict) and "lease" in message["result"]:
+                self.on_subscribed(message["result"])
+
+    def _reset(self, epoch, version):
+        self.routes.clear()
+        self.epoch = epoch
+        self.version = version
+        self.resets += 1
+
+    def on_subscribed(self, result):
+        with self.lock:
+            # 确认可能晚于之后的推送到达，只在守护进程换了或确认的版本更新时重置
+            if result["epoch"] != self.epoch or self.version is None or result["version"] > self.version:
+                self._reset(result["epoch"], result["version"])
+            self.acked_at = time.monotonic()
+
+    def apply_event(self, event):
+        with self.lock:
+            self.events += 1
+            if event.get("reset") or event["epoch"] != self.epoch or self.version is None or event["version"] != self.version + 1:
+                self._reset(event["epoch"], event["version"])
+            self.version = event["version"]
+            for change in event.get("changes", []):
+                dest = change["dest"]
+                if "/" in dest:
+                    # 前缀路由变化可能改变任意地址的最长前缀匹配结果，丢弃所有经前缀路由得到的缓存
+                    for key in [key for key, route in self.routes.items() if "/" in route["dest"]]:
+                        del self.routes[key]
+                elif change["op"] != "delete" and change["valid"] and change["state"] == "VALID":
+                    self.routes[dest] = {field: change[field] for field in ("dest", "next_hop_ip", "hop_count", "valid", "state")}
+                else:
+                    self.routes.pop(dest, None)
+
+    def live(self):
+        return self.acked_at is not None and time.monotonic() - self.acked_at < self.lease
+
+    def get(self, dest_ip):
+        with self.lock:
+            if not self.live():
+                return None
+            return self.routes.get(dest_ip)
+
+    def put(self, dest_ip, route, version, epoch):
+        """
+        缓存控制端口查询的结果，version/epoch 取自查询响应
+        早于已应用的推送时丢弃; epoch 不同说明查询和订阅面对的不是同一个守护进程，版本号不可比较，同样丢弃
+        """
+        if not route.get("valid") or route.get("state") != "VALID":
+            return
+        with self.lock:
+            if not self.live() or version is None or epoch != self.epoch or version < self.version:
+                return
+            self.routes[dest_ip] = route
+
+    def invalidate_next_hop(self, next_hop_ip):
+        with self.lock:
+            for key in [key for key, route in self.routes.items() if route["next_hop_ip"] == next_hop_ip]:
+                del self.routes[key]
+
+    def close(self):
+        self.running = False
+        self._send({"cmd": "unsubscribe"})
+        self.sock.close()
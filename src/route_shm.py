@@ -0,0 +1,234 @@
+import mmap
+import os
+import socket
+import struct
+import time
+
+from constants import ROUTE_SHM_STALE_AFTER
+from prefix_index import PrefixIndex
+
+"""
+本文件实现路由表的共享内存导出 (内存映射文件)，OLSR 守护进程写，转发程序只读映射后本地查表，不需要任何 IPC
+布局固定，小端序:
+    Header (64B): Magic(8) + Version(4) + Capacity(4) + Seq(8) + Count(4) + Flags(4) + UpdatedAt(8) + TableVersion(8) + Heartbeat(8) + 填充
+    Entry  (16B) * Capacity: Dest(4) + NextHop(4) + PrefixLen(1) + HopCount(1) + Flags(1) + 填充(1) + Distance(4, float)
+一致性用 seqlock 保证: 写者先把 Seq 加 1 (变为奇数)，写完所有条目和头部其余字段后，最后单独把 Seq 加 1 (变回偶数)
+读者先读 Seq，为奇数或读完后 Seq 变了就重读，读到的快照总是某一次完整写入的结果
+守护进程重启时 Seq 从文件里原有的值接着增加，仍映射着旧内容的读者不会因为 Seq 相同而沿用旧的解析结果
+读者按 Seq 缓存解析结果，路由表没变时每次查找只多读 8 个字节
+守护进程定时 (loop_cleanup) 在 seqlock 内刷新 Heartbeat，被 SIGKILL 或崩溃时不会设置 CLOSED 标志，
+读者发现心跳超过 ROUTE_SHM_STALE_AFTER 未更新就视为不可用，回退到控制端口；只有心跳变化时读者不重新解析条目
+"""
+
+SHM_MAGIC = b"OLSRRT\x00\x01"
+SHM_VERSION = 2
+
+HEADER_FORMAT = "<8sIIQIIdQd"
+HEADER_SIZE = 64
+SEQ_OFFSET = 16
+ENTRY_FORMAT = "<4s4sBBBxf"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+# Header Flags
+SHM_FLAG_OVERFLOW = 0x1   # 路由条数超过 Capacity，只导出了一部分，读者查不到时应回退到控制端口
+SHM_FLAG_CLOSED = 0x2     # 守护进程已退出，内容不再更新
+
+# Entry Flags
+ENTRY_VALID = 0x1
+ENTRY_PROVISIONAL = 0x2
+
+READ_RETRIES = 100
+
+
+def shm_file_size(capacity):
+    return HEADER_SIZE + capacity * ENTRY_SIZE
+
+
+def _next_even_seq(header):
+    """文件里已有导出时从它的 Seq 向上取偶数再加 2，否则从 0 开始"""
+    if len(header) < HEADER_SIZE or header[:8] != SHM_MAGIC:
+        return 0
+    seq = struct.unpack_from("<Q", header, SEQ_OFFSET)[0]
+    return ((seq + 1) & ~1) + 2
+
+
+class RouteTableExporter:
+    """守护进程一侧: 在持有协议锁时调用 publish()，只有一个写者"""
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = int(capacity)
+        size = shm_file_size(self.capacity)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            self.seq = _next_even_seq(os.pread(fd, HEADER_SIZE, 0))
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self.publishes = 0
+        # 最近一次写入的 (Count, Flags, TableVersion, UpdatedAt)，刷新心跳时原样写回
+        self.header = (0, 0, 0, 0.0)
+        self._begin_write()
+        self._end_write(0, 0, 0)
+
+    def _write_header(self, count, flags, table_version, updated_at, heartbeat):
+        struct.pack_into(
+            HEADER_FORMAT,
+            self.mm,
+            0,
+            SHM_MAGIC,
+            SHM_VERSION,
+            self.capacity,
+            self.seq,
+            count,
+            flags,
+            updated_at,
+            table_version,
+            heartbeat,
+        )
+
+    def _begin_write(self):
+        self.seq += 1
+        struct.pack_into("<Q", self.mm, SEQ_OFFSET, self.seq)
+
+    def _end_write(self, count, flags, table_version, updated_at=None):
+        # 头部其余字段也在 Seq 为奇数时写入，最后单独写回偶数 Seq
+        now = time.time()
+        self.header = (count, flags, table_version, now if updated_at is None else updated_at)
+        self._write_header(*self.header, now)
+        self.seq += 1
+        struct.pack_into("<Q", self.mm, SEQ_OFFSET, self.seq)
+
+    def heartbeat(self):
+        """定时调用，条目和头部其余字段不变，只刷新 Heartbeat；close() 之后调用时忽略"""
+        if self.mm.closed:
+            return
+        self._begin_write()
+        self._end_write(*self.header)
+
+    def publish(self, entries, table_version):
+        """
+        :param entries: { (network_ip, prefix_len): route }，即 RoutingManager.index_entries
+        """
+        items = list(entries.items())
+        flags = SHM_FLAG_OVERFLOW if len(items) > self.capacity else 0
+        items = items[: self.capacity]
+
+        self._begin_write()
+        offset = HEADER_SIZE
+        for (network_ip, prefix_len), route in items:
+            entry_flags = (ENTRY_VALID if route.get("valid") else 0) | (ENTRY_PROVISIONAL if route.get("provisional") else 0)
+            struct.pack_into(
+                ENTRY_FORMAT,
+                self.mm,
+                offset,
+                socket.inet_aton(network_ip),
+                socket.inet_aton(route["next_hop_ip"]),
+                prefix_len,
+                min(255, int(route["hop_count"])),
+                entry_flags,
+                float(route["distance"]),
+            )
+            offset += ENTRY_SIZE
+        self._end_write(len(items), flags, table_version)
+        self.publishes += 1
+
+    def close(self):
+        self._begin_write()
+        self._end_write(0, SHM_FLAG_CLOSED, 0)
+        self.mm.close()
+
+
+class RouteTableReader:
+    """转发程序一侧: 只读映射，文件不存在时 lookup() 返回 None，由调用方回退到控制端口"""
+
+    def __init__(self, path, stale_after=ROUTE_SHM_STALE_AFTER):
+        self.path = path
+        self.stale_after = float(stale_after)
+        self.mm = None
+        self.cached_seq = None
+        self.index = PrefixIndex()
+        self.flags = 0
+        self.table_version = 0
+        self.updated_at = 0.0
+        self.heartbeat_at = 0.0
+        self.cached_header = None
+
+    def _open(self):
+        try:
+            with open(self.path, "rb") as handle:
+                mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(mm) < HEADER_SIZE or mm[:8] != SHM_MAGIC:
+            mm.close()
+            return False
+        self.mm = mm
+        return True
+
+    def _refresh(self):
+        if self.mm is None and not self._open():
+            return False
+        seq = struct.unpack_from("<Q", self.mm, SEQ_OFFSET)[0]
+        if seq == self.cached_seq:
+            return True
+        for _ in range(READ_RETRIES):
+            seq = struct.unpack_from("<Q", self.mm, SEQ_OFFSET)[0]
+            if seq & 1:
+                continue
+            header = struct.unpack_from(HEADER_FORMAT, self.mm, 0)
+            _magic, version, capacity, _seq, count, flags, updated_at, table_version, heartbeat_at = header
+            if version != SHM_VERSION or count > capacity or len(self.mm) < shm_file_size(capacity):
+                return False
+            # 只刷新了心跳时沿用已解析的条目
+            table_header = (count, flags, table_version, updated_at)
+            body = None if table_header == self.cached_header else self.mm[HEADER_SIZE : HEADER_SIZE + count * ENTRY_SIZE]
+            if struct.unpack_from("<Q", self.mm, SEQ_OFFSET)[0] != seq:
+                continue
+            break
+        else:
+            return self.cached_seq is not None
+
+        self.heartbeat_at = heartbeat_at
+        self.cached_seq = seq
+        if body is None:
+            return True
+        index = PrefixIndex()
+        for dest_bytes, next_hop_bytes, prefix_len, hop_count, entry_flags, distance in struct.iter_unpack(ENTRY_FORMAT, body):
+            dest = socket.inet_ntoa(dest_bytes)
+            index.insert(
+                dest,
+                prefix_len,
+                {
+                    "dest": dest if prefix_len == 32 else f"{dest}/{prefix_len}",
+                    "next_hop_ip": socket.inet_ntoa(next_hop_bytes),
+                    "hop_count": hop_count,
+                    "distance": distance,
+                    "valid": bool(entry_flags & ENTRY_VALID),
+                    "provisional": bool(entry_flags & ENTRY_PROVISIONAL),
+                },
+            )
+        self.index = index
+        self.flags = flags
+        self.table_version = table_version
+        self.updated_at = updated_at
+        self.cached_header = table_header
+        return True
+
+    def available(self):
+        """守护进程已退出 (CLOSED) 或心跳过期 (进程被杀死或卡住) 时返回 False"""
+        if not self._refresh() or self.flags & SHM_FLAG_CLOSED:
+            return False
+        return time.time() - self.heartbeat_at <= self.stale_after
+
+    def lookup(self, dest_ip):
+        """最长前缀匹配，返回路由字典；共享内存不可用、守护进程已退出或未命中时返回 None"""
+        if not self.available():
+            return None
+        return self.index.lookup(dest_ip)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
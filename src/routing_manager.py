@@ -1,16 +1,44 @@
 import time
 
 from dijkstra import dijkstra
+from olsr_metrics import Histogram
+from prefix_index import PrefixIndex
+from olsr_log import DEBUG, get_logger
+
+_log = get_logger("route")
 
 
 class RoutingManager:
-    def __init__(self, my_ip, neighbor_manager, topology_manager):
+    def __init__(
+        self,
+        my_ip,
+        neighbor_manager,
+        topology_manager,
+        mid_manager=None,
+        hna_manager=None,
+        link_set=None,
+    ):
         self.my_ip = my_ip
         self.neighbor_manager = neighbor_manager
         self.topology_manager = topology_manager
+        self.mid_manager = mid_manager
+        self.hna_manager = hna_manager
+        self.link_set = link_set
         self.routing_table = {}
+        # HNA 前缀路由，每个网段一条，不再为网段内的主机逐个建表
+        # 格式: { (network_addr, prefix_len): route }
+        self.prefix_table = {}
+        # 最长前缀匹配索引，主机路由按 /32 放入，随路由表增量更新
+        self.route_index = PrefixIndex()
+        self.index_entries = {}
         self.route_first_seen = {}
         self.last_recalculated_at = None
+        # 路由表版本号，每次路由表内容变化加 1；变化时按注册顺序调用 listener(old_signature, new_signature)
+        self.table_version = 0
+        self.change_listeners = []
+        # 重算次数和每次耗时，见 olsr_metrics.py
+        self.recalculations = 0
+        self.recalc_seconds = Histogram()
 
     def _route_signature(self, route):
         return (
@@ -19,10 +47,116 @@ class RoutingManager:
             int(route["hop_count"]),
             bool(route["valid"]),
             route["state"],
+            bool(route.get("provisional", False)),
+        )
+
+    def _make_route(self, dest, next_hop, hop_count, distance, old_routes, now):
+        if dest not in self.route_first_seen:
+            self.route_first_seen[dest] = now
+
+        previous = old_routes.get(dest)
+        unchanged = (
+            previous is not None
+            and previous.get("next_hop_ip") == next_hop
+            and int(previous.get("hop_count", 0)) == int(hop_count)
+            and previous.get("valid") is True
+            and previous.get("state") == "VALID"
         )
+        return {
+            "dest": dest,
+            "next_hop": next_hop,
+            "next_hop_ip": next_hop,
+            "hop_count": int(hop_count),
+            "distance": float(distance),
+            "state": "VALID",
+            "valid": True,
+            "first_seen_at": self.route_first_seen[dest],
+            "last_updated_at": previous.get("last_updated_at", now) if unchanged else now,
+        }
+
+    def _get_confirmed_neighbors(self):
+        """有至少一条已被 HELLO 确认 (非 provisional) 的对称链路的邻居主地址"""
+        if self.link_set is None:
+            return None
+        confirmed = set()
+        for iface_addr, link in self.link_set.links.items():
+            if link.provisional or not link.is_symmetric():
+                continue
+            confirmed.add(self.mid_manager.get_main_address(iface_addr) if self.mid_manager else iface_addr)
+        return confirmed
+
+    def _get_neighbor_interfaces(self):
+        """{邻居主地址: [对称链路的接口地址, ...]}，多射频邻居可以在这些接口上并行发送"""
+        interfaces = {}
+        if self.link_set is None:
+            return interfaces
+        for iface_addr, link in self.link_set.links.items():
+            if not link.is_symmetric():
+                continue
+            main_addr = self.mid_manager.get_main_address(iface_addr) if self.mid_manager else iface_addr
+            interfaces.setdefault(main_addr, []).append(iface_addr)
+        return {main_addr: sorted(addrs) for main_addr, addrs in interfaces.items()}
+
+    def _add_alias_routes(self, new_routing_table, neighbor_interfaces, old_routes, now):
+        """RFC 3626 Section 10 (3): 为每个可达节点的其他接口地址添加与主地址相同的路由"""
+        if self.mid_manager is None:
+            return
+        for main_addr, route in list(new_routing_table.items()):
+            for alias in self.mid_manager.get_aliases(main_addr):
+                if alias in new_routing_table or alias == self.my_ip:
+                    continue
+                # 直接相连的接口走该接口本身，其余接口跟随主地址的下一跳
+                direct = alias in neighbor_interfaces.get(main_addr, ())
+                alias_route = self._make_route(
+                    alias,
+                    alias if direct else route["next_hop_ip"],
+                    1 if direct else route["hop_count"],
+                    1.0 if direct else route["distance"],
+                    old_routes,
+                    now,
+                )
+                alias_route["next_hop_interfaces"] = route["next_hop_interfaces"]
+                alias_route["provisional"] = route["provisional"]
+                new_routing_table[alias] = alias_route
+
+    def _build_prefix_table(self, new_routing_table, old_prefixes, now):
+        """RFC 3626 Section 12.6: 每个网段选择距离最近的可达网关"""
+        prefix_table = {}
+        if self.hna_manager is None:
+            return prefix_table
+        for (network_addr, prefix_len), gateways in self.hna_manager.gateways_by_prefix.items():
+            reachable = [new_routing_table[gw] for gw in gateways if gw in new_routing_table]
+            if not reachable:
+                continue
+            gateway_route = min(reachable, key=lambda route: (route["distance"], route["dest"]))
+            dest = f"{network_addr}/{prefix_len}"
+            route = self._make_route(
+                dest,
+                gateway_route["next_hop_ip"],
+                gateway_route["hop_count"],
+                gateway_route["distance"],
+                old_prefixes,
+                now,
+            )
+            route["gateway"] = gateway_route["dest"]
+            route["network"] = network_addr
+            route["prefix_len"] = prefix_len
+            route["next_hop_interfaces"] = gateway_route["next_hop_interfaces"]
+            route["provisional"] = gateway_route["provisional"]
+            prefix_table[(network_addr, prefix_len)] = route
+        return prefix_table
 
     def recalculate_routing_table(self):
+        started = time.perf_counter()
+        try:
+            return self._recalculate_routing_table()
+        finally:
+            self.recalculations += 1
+            self.recalc_seconds.observe(time.perf_counter() - started)
+
+    def _recalculate_routing_table(self):
         old_routes = self.routing_table
+        old_prefixes = {route["dest"]: route for route in self.prefix_table.values()}
         graph = {self.my_ip: []}
 
         for neigh_ip, neigh_tuple in self.neighbor_manager.neighbors.items():
@@ -47,6 +181,8 @@ class RoutingManager:
         dist, parent = dijkstra(graph, self.my_ip)
 
         now = time.time()
+        neighbor_interfaces = self._get_neighbor_interfaces()
+        confirmed_neighbors = self._get_confirmed_neighbors()
         new_routing_table = {}
         for target_node in dist:
             if target_node == self.my_ip or dist[target_node] == float("inf"):
@@ -61,66 +197,96 @@ class RoutingManager:
             if curr != self.my_ip or prev is None:
                 continue
 
-            if target_node not in self.route_first_seen:
-                self.route_first_seen[target_node] = now
-
-            previous = old_routes.get(target_node)
-            unchanged = (
-                previous is not None
-                and previous.get("next_hop_ip") == prev
-                and int(previous.get("hop_count", 0)) == int(dist[target_node])
-                and previous.get("valid") is True
-                and previous.get("state") == "VALID"
+            route = self._make_route(
+                target_node,
+                prev,
+                dist[target_node],
+                dist[target_node],
+                old_routes,
+                now,
             )
+            route["next_hop_interfaces"] = neighbor_interfaces.get(prev, [prev])
+            # 下一跳链路仍来自热重启快照时，路由可以使用但标记为 provisional
+            route["provisional"] = confirmed_neighbors is not None and prev not in confirmed_neighbors
+            new_routing_table[target_node] = route
 
-            new_routing_table[target_node] = {
-                "dest": target_node,
-                "next_hop": prev,
-                "next_hop_ip": prev,
-                "hop_count": int(dist[target_node]),
-                "distance": float(dist[target_node]),
-                "state": "VALID",
-                "valid": True,
-                "first_seen_at": self.route_first_seen[target_node],
-                "last_updated_at": previous.get("last_updated_at", now) if unchanged else now,
-            }
+        self._add_alias_routes(new_routing_table, neighbor_interfaces, old_routes, now)
+        new_prefix_table = self._build_prefix_table(new_routing_table, old_prefixes, now)
 
         self.routing_table = new_routing_table
+        self.prefix_table = new_prefix_table
+        self._update_route_index()
         self.last_recalculated_at = now
         old_signature = {dest: self._route_signature(route) for dest, route in old_routes.items()}
+        old_signature.update({dest: self._route_signature(route) for dest, route in old_prefixes.items()})
         new_signature = {dest: self._route_signature(route) for dest, route in new_routing_table.items()}
+        new_signature.update({route["dest"]: self._route_signature(route) for route in new_prefix_table.values()})
         if old_signature != new_signature:
-            self.print_routing_table()
+            self.table_version += 1
+            for listener in self.change_listeners:
+                listener(old_signature, new_signature)
+            _log.info("路由表更新", routes=len(new_routing_table), prefix_routes=len(new_prefix_table))
+            if _log.is_enabled(DEBUG):
+                self.print_routing_table()
+
+    def _update_route_index(self):
+        # HNA 宣告的 /32 网段与主机路由同键时主机路由优先，后写入的覆盖先写入的
+        new_entries = dict(self.prefix_table)
+        new_entries.update({(dest, 32): route for dest, route in self.routing_table.items()})
+        self.route_index.sync(self.index_entries, new_entries)
+        self.index_entries = new_entries
 
     def get_route(self, dest_ip):
-        route = self.routing_table.get(dest_ip)
+        route = self.lookup_route(dest_ip)
         if route is None:
             return None
         return dict(route)
 
+    def lookup_route(self, dest_ip):
+        """最长前缀匹配: 主机路由 (/32) 优先，其次是最长的 HNA 前缀路由，返回内部 route 不做拷贝"""
+        return self.route_index.lookup(dest_ip)
+
+    def get_prefix_routes(self):
+        return {
+            route["dest"]: dict(route)
+            for _key, route in sorted(self.prefix_table.items(), key=lambda item: item[0])
+        }
+
     def get_routes(self):
         return {
             dest: dict(route)
             for dest, route in sorted(self.routing_table.items(), key=lambda item: item[0])
         }
 
-    def format_routing_table(self):
+    def format_routing_table(self, limit=None, after=None):
+        """
+        limit 不为空时按目的地址排序分页: 只输出 after 之后的 limit 条，还有后续时末行为 next=<本页最后一个目的地址>
+        """
         lines = [
             "Destination     | Next Hop        | Hop Count",
             "=============================================",
         ]
         routes = self.get_routes()
-        for route in routes.values():
-            if not route.get("valid"):
-                continue
+        routes.update(self.get_prefix_routes())
+        valid_routes = [route for route in routes.values() if route.get("valid")]
+        next_after = None
+        if limit is not None:
+            valid_routes.sort(key=lambda route: route["dest"])
+            if after:
+                valid_routes = [route for route in valid_routes if route["dest"] > after]
+            if len(valid_routes) > limit:
+                valid_routes = valid_routes[:limit]
+                next_after = valid_routes[-1]["dest"]
+        for route in valid_routes:
             lines.append(
                 f"{route['dest']:<15} | {route['next_hop_ip']:<15} | {int(route['hop_count'])}"
+                + (f"  (via gateway {route['gateway']})" if "gateway" in route else "")
             )
         if len(lines) == 2:
             lines.append("(empty)")
+        if next_after is not None:
+            lines.append(f"next={next_after}")
         return "\n".join(lines)
 
     def print_routing_table(self):
-        print("\n=== Routing Table Updated ===")
-        print(self.format_routing_table())
-        print("=" * 45 + "\n")
+        _log.debug("\n=== Routing Table Updated ===\n%s\n%s", self.format_routing_table(), "=" * 45)
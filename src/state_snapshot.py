@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+from constants import *
+from olsr_log import get_logger
+
+_log = get_logger("snapshot")
+
+"""
+本文件负责协议状态快照的保存和加载 (Warm Restart)
+守护进程定期把链路、邻居、二跳、MPR Selector、拓扑、MID/HNA 和路由表写入一个紧凑的 JSON 文件
+重启时加载快照，所有记录标记为 provisional，保持时间扣除快照保存后经过的时间，节点无需等待几轮 HELLO/TC 就能转发
+已经超过保持时间的记录不再恢复，进程停了很久之后重启不会用过期的拓扑转发
+随后收到的 HELLO/TC 会确认 (清除 provisional) 或让过期机制淘汰这些记录
+
+同时保存 ANSN 和消息序列号，加载时再加上一个余量:
+否则重启后序列号从 0 开始，邻居的重复集和拓扑集会把新消息当作旧消息丢弃
+"""
+
+SNAPSHOT_VERSION = 1
+
+
+def build_snapshot(node):
+    """在持有 node.lock 时调用，返回可序列化的快照字典"""
+    return {
+        "v": SNAPSHOT_VERSION,
+        "saved_at": round(time.time(), 3),
+        "my_ip": node.my_ip,
+        "ansn": node.ansn,
+        "msg_seq": node.msg_seq_num,
+        "pkt_seq": node.pkt_seq_num,
+        "links": [
+            [ip, 1 if link.is_symmetric() else 0]
+            for ip, link in node.link_set.links.items()
+        ],
+        "neighbors": [
+            [ip, neigh.status, neigh.willingness]
+            for ip, neigh in node.neighbor_manager.neighbors.items()
+        ],
+        "two_hop": [list(key) for key in node.neighbor_manager.two_hop_set],
+        "mpr_selectors": list(node.neighbor_manager.mpr_selectors),
+        "topology": [
+            [t_tuple.dest_addr, t_tuple.last_addr, t_tuple.seq]
+            for t_tuple in node.topology_manager.topology_set.values()
+        ],
+        "mid": [
+            [i_tuple.iface_addr, i_tuple.main_addr]
+            for i_tuple in node.mid_manager.interface_set.values()
+        ],
+        "hna": [list(key) for key in node.hna_manager.association_set],
+        "routes": [
+            [dest, route["next_hop_ip"], route["hop_count"], round(route["first_seen_at"], 3)]
+            for dest, route in node.routing_manager.routing_table.items()
+        ],
+    }
+
+
+def write_snapshot(snapshot, path):
+    """原子写入: 先写临时文件再替换，进程在写入中途退出也不会留下半个快照"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(snapshot, handle, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            snapshot = json.load(handle)
+    except (OSError, ValueError) as exc:
+        _log.warning("无法读取快照 %s: %s", path, exc)
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("v") != SNAPSHOT_VERSION:
+        _log.warning("快照版本不匹配，忽略: %s", path)
+        return None
+    return snapshot
+
+
+def restore_snapshot(node, snapshot):
+    """
+    在持有 node.lock 且协议线程启动前调用
+    记录的剩余有效期 = 正常保持时间 - 快照的年龄，已经过期的一类记录整类跳过；序列号总是恢复
+    :return: 是否恢复了协议记录
+    """
+    if snapshot.get("my_ip") != node.my_ip:
+        _log.warning("快照属于 %s，与本节点 %s 不符，忽略", snapshot.get("my_ip"), node.my_ip)
+        return False
+
+    now = time.time()
+    node.ansn = (int(snapshot.get("ansn", 0)) + SNAPSHOT_ANSN_MARGIN) % 65535
+    node.msg_seq_num = (int(snapshot.get("msg_seq", 0)) + SNAPSHOT_SEQ_MARGIN) % 65535
+    node.pkt_seq_num = (int(snapshot.get("pkt_seq", 0)) + SNAPSHOT_SEQ_MARGIN) % 65535
+
+    # 时钟回拨时按刚保存处理
+    age = max(0.0, now - float(snapshot.get("saved_at", now)))
+    neighb_hold = NEIGHB_HOLD_TIME - age
+    top_hold = TOP_HOLD_TIME - age
+    mid_hold = MID_HOLD_TIME - age
+    hna_hold = HNA_HOLD_TIME - age
+    if max(neighb_hold, top_hold, mid_hold, hna_hold) <= 0:
+        _log.warning("快照已是 %.1fs 前保存的，记录均已过期，只恢复序列号", age)
+        return False
+
+    if neighb_hold > 0:
+        for ip, sym in snapshot.get("links", []):
+            node.link_set.restore_link(ip, bool(sym), neighb_hold, now)
+        for ip, status, willingness in snapshot.get("neighbors", []):
+            node.neighbor_manager.update_neighbor_status(ip, int(willingness), int(status) == 1)
+        for neighbor_ip, two_hop_ip in snapshot.get("two_hop", []):
+            node.neighbor_manager.restore_two_hop(neighbor_ip, two_hop_ip, now + neighb_hold)
+        for selector_ip in snapshot.get("mpr_selectors", []):
+            node.neighbor_manager.restore_mpr_selector(selector_ip, now + neighb_hold)
+    if top_hold > 0:
+        for dest_ip, last_ip, seq in snapshot.get("topology", []):
+            node.topology_manager.restore_tuple(dest_ip, last_ip, int(seq), now + top_hold)
+    if mid_hold > 0:
+        for iface_ip, main_ip in snapshot.get("mid", []):
+            node.mid_manager.add_alias(main_ip, iface_ip, mid_hold, now)
+    if hna_hold > 0:
+        for gateway_ip, network_ip, prefix_len in snapshot.get("hna", []):
+            node.hna_manager.process_hna_message(
+                gateway_ip,
+                {"networks": [(network_ip, int(prefix_len))]},
+                hna_hold,
+                now,
+            )
+    for dest, _next_hop, _hop_count, first_seen_at in snapshot.get("routes", []):
+        node.routing_manager.route_first_seen[dest] = float(first_seen_at)
+
+    node.neighbor_manager.recalculate_mpr()
+    node.routing_manager.recalculate_routing_table()
+    _log.info(
+        "已加载 %.1fs 前的快照",
+        age,
+        links=len(node.link_set.links),
+        topology=len(node.topology_manager.topology_set),
+        routes=len(node.routing_manager.routing_table),
+    )
+    return True
@@ -1,26 +1,78 @@
 import struct
 import socket
 
-def create_tc_body(ansn, advertised_neighbors):
+from addr_block import address_from_bytes, create_address_block, parse_address_block
+from constants import TC_FLAG_COMPACT, TC_FLAG_DELTA
+from olsr_log import get_logger
+
+_log = get_logger("packet")
+
+def create_tc_body(ansn, advertised_neighbors, compact=False):
     """
     构造 TC 消息体 (Pack)
     :param ansn: Advertised Neighbor Sequence Number (int, 0-65535)
     :param advertised_neighbors: list of neighbor IP strings
+    :param compact: 邻居列表使用紧凑地址块编码，Reserved 置 TC_FLAG_COMPACT
     """
     # 1. 固定头部: ANSN (2B) + Reserved (2B)
     # !HH 代表两个 unsigned short (大端序)
+    if compact:
+        return struct.pack('!HH', ansn, TC_FLAG_COMPACT) + create_address_block(advertised_neighbors)
     fixed_part = struct.pack('!HH', ansn, 0)
     
     # 2. 邻居列表部分
-    neigh_part = b''
+    # TC_REDUNDANCY=2 时会宣告全部对称邻居，先收集再一次性 join，避免逐个拼接 bytes 的 O(n^2) 开销
+    addr_bytes = []
     for ip_str in advertised_neighbors:
         try:
             # 将字符串 IP 转为 4 字节二进制
-            neigh_part += socket.inet_aton(ip_str)
+            addr_bytes.append(socket.inet_aton(ip_str))
         except OSError:
-            print(f"[TC Pack Error] Invalid IP: {ip_str}")
+            _log.error("TC 打包失败，非法地址: %s", ip_str)
             
-    return fixed_part + neigh_part
+    return fixed_part + b''.join(addr_bytes)
+
+def create_tc_bodies(ansn, advertised_neighbors, max_body_size, compact=False):
+    """
+    按 max_body_size 把 TC 拆成多个消息体，所有分片共享同一个 ANSN
+    接收方按 RFC 9.5 处理: 更新的 ANSN 先替换旧记录，相同 ANSN 的后续分片只做合并
+    分片按普通编码的大小计算，紧凑编码的分片只会更小，转发时也能原样转换回普通编码
+    :return: [tc_body, ...]，至少包含一个消息体
+    """
+    per_body = max(1, (max_body_size - 4) // 4)
+    neighbors = list(advertised_neighbors)
+    if not neighbors:
+        return [create_tc_body(ansn, [], compact)]
+    return [
+        create_tc_body(ansn, neighbors[start : start + per_body], compact)
+        for start in range(0, len(neighbors), per_body)
+    ]
+
+def create_tc_delta_body(ansn, base_ansn, added, removed, compact=False):
+    """
+    构造增量 TC 消息体，Reserved 字段置 TC_FLAG_DELTA
+    格式: ANSN(2B) + Flags(2B) + Base ANSN(2B) + 新增个数(2B) + 新增地址... + 删除地址...
+    接收方用 Base ANSN 对应的完整邻居集合加上新增、去掉删除得到当前宣告集合
+    紧凑编码时新增和删除的地址合成一个地址块
+    """
+    addresses = list(added) + list(removed)
+    if compact:
+        fixed_part = struct.pack('!HHHH', ansn, TC_FLAG_DELTA | TC_FLAG_COMPACT, base_ansn, len(added))
+        return fixed_part + create_address_block(addresses)
+    fixed_part = struct.pack('!HHHH', ansn, TC_FLAG_DELTA, base_ansn, len(added))
+    return fixed_part + b''.join(socket.inet_aton(ip) for ip in addresses)
+
+def is_compact_tc_body(tc_body_data):
+    return len(tc_body_data) >= 4 and bool(struct.unpack('!H', tc_body_data[2:4])[0] & TC_FLAG_COMPACT)
+
+def to_plain_tc_body(tc_body_data):
+    """把紧凑编码的 TC 消息体转换回普通编码，供转发给不支持地址块的邻居；无法解析时返回 None"""
+    tc_info = parse_tc_body(tc_body_data)
+    if tc_info is None:
+        return None
+    if tc_info['delta']:
+        return create_tc_delta_body(tc_info['ansn'], tc_info['base_ansn'], tc_info['added'], tc_info['removed'])
+    return create_tc_body(tc_info['ansn'], tc_info['advertised_neighbors'])
 
 def parse_tc_body(tc_body_data):
     """
@@ -33,22 +85,54 @@ def parse_tc_body(tc_body_data):
 
     # 1. 解析固定头部
     ansn, reserved = struct.unpack('!HH', tc_body_data[:4])
+    if reserved & TC_FLAG_DELTA:
+        return parse_tc_delta_body(ansn, tc_body_data, bool(reserved & TC_FLAG_COMPACT))
     
     # 2. 解析邻居列表
-    advertised_neighbors = []
-    cursor = 4
-    
-    # 循环读取剩余的所有 4 字节块
-    while cursor + 4 <= len(tc_body_data):
-        ip_bytes = tc_body_data[cursor : cursor+4]
-        try:
-            ip_str = socket.inet_ntoa(ip_bytes)
-            advertised_neighbors.append(ip_str)
-        except OSError:
-            pass # 忽略非法 IP
-        cursor += 4
+    if reserved & TC_FLAG_COMPACT:
+        parsed = parse_address_block(tc_body_data, 4)
+        if parsed is None:
+            return None
+        advertised_neighbors = parsed[0]
+    else:
+        # 剩余部分按 4 字节一组切分，多余的不足 4 字节的尾巴直接忽略
+        end = 4 + (len(tc_body_data) - 4) // 4 * 4
+        advertised_neighbors = [
+            address_from_bytes(tc_body_data[cursor : cursor+4])
+            for cursor in range(4, end, 4)
+        ]
         
     return {
         'ansn': ansn,
+        'delta': False,
         'advertised_neighbors': advertised_neighbors
-    }
\ No newline at end of file
+    }
+
+def parse_tc_delta_body(ansn, tc_body_data, compact=False):
+    """
+    解析增量 TC 消息体
+    :return: 字典 {'ansn': int, 'delta': True, 'base_ansn': int, 'added': [ip_str, ...], 'removed': [ip_str, ...]}
+    """
+    if len(tc_body_data) < 8:
+        return None
+    base_ansn, added_count = struct.unpack('!HH', tc_body_data[4:8])
+    if compact:
+        parsed = parse_address_block(tc_body_data, 8)
+        if parsed is None:
+            return None
+        addresses = parsed[0]
+    else:
+        end = 8 + (len(tc_body_data) - 8) // 4 * 4
+        addresses = [
+            address_from_bytes(tc_body_data[cursor : cursor+4])
+            for cursor in range(8, end, 4)
+        ]
+    if added_count > len(addresses):
+        return None
+    return {
+        'ansn': ansn,
+        'delta': True,
+        'base_ansn': base_ansn,
+        'added': addresses[:added_count],
+        'removed': addresses[added_count:],
+    }
@@ -0,0 +1,77 @@
+import socket
+import struct
+
+from pkt_msg_fmt import decode_mantissa, encode_mantissa
+
+"""
+本文件负责拓扑同步消息体的打包和解包
+新加入的节点在邻居刚变为对称时单播 TOPO_REQUEST (消息体为空)，邻居单播回复 TOPO_DUMP
+TOPO_DUMP 消息体由若干条记录组成，每条记录相当于一个压缩的 TC:
+    Originator(4B) + ANSN(2B) + Vtime(1B) + Count(1B) + Count 个邻居地址(每个 4B)
+接收方按 TC 的 ANSN 规则逐条处理，所以同一个 Originator 的记录可以拆到多条记录/多个消息体里
+records 的格式如下
+[
+        (originator_ip, ansn, validity_seconds, [neighbor_ip, ...]),
+        ...
+]
+"""
+
+RECORD_HEADER_SIZE = 8
+MAX_RECORD_NEIGHBORS = 255
+
+
+def _pack_record(originator_ip, ansn, validity_time, neighbors):
+    head = struct.pack(
+        "!4sHBB",
+        socket.inet_aton(originator_ip),
+        ansn,
+        encode_mantissa(validity_time),
+        len(neighbors),
+    )
+    return head + b"".join(socket.inet_aton(ip) for ip in neighbors)
+
+
+def create_topo_dump_bodies(records, max_body_size):
+    """
+    把记录打包成若干个不超过 max_body_size 的消息体
+    :return: [dump_body, ...]，没有记录时返回空列表
+    """
+    per_record = min(MAX_RECORD_NEIGHBORS, max(1, (max_body_size - RECORD_HEADER_SIZE) // 4))
+    bodies = []
+    current = []
+    current_size = 0
+    for originator_ip, ansn, validity_time, neighbors in records:
+        neighbors = list(neighbors)
+        for start in range(0, len(neighbors), per_record):
+            chunk = neighbors[start : start + per_record]
+            record = _pack_record(originator_ip, ansn, validity_time, chunk)
+            if current and current_size + len(record) > max_body_size:
+                bodies.append(b"".join(current))
+                current = []
+                current_size = 0
+            current.append(record)
+            current_size += len(record)
+    if current:
+        bodies.append(b"".join(current))
+    return bodies
+
+
+def parse_topo_dump_body(dump_body):
+    """
+    解析 TOPO_DUMP 消息体，截断的尾部记录直接忽略
+    :return: [(originator_ip, ansn, validity_seconds, [neighbor_ip, ...]), ...]
+    """
+    records = []
+    cursor = 0
+    while len(dump_body) - cursor >= RECORD_HEADER_SIZE:
+        orig_bytes, ansn, vtime, count = struct.unpack(
+            "!4sHBB", dump_body[cursor : cursor + RECORD_HEADER_SIZE]
+        )
+        cursor += RECORD_HEADER_SIZE
+        end = cursor + count * 4
+        if end > len(dump_body):
+            break
+        neighbors = [socket.inet_ntoa(dump_body[pos : pos + 4]) for pos in range(cursor, end, 4)]
+        records.append((socket.inet_ntoa(orig_bytes), ansn, decode_mantissa(vtime), neighbors))
+        cursor = end
+    return records
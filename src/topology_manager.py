@@ -1,5 +1,8 @@
 import time
 from constants import TOP_HOLD_TIME # 通常是 15秒 (3 * TC_INTERVAL)
+from olsr_log import get_logger
+
+_log = get_logger("topology")
 
 class TopologyTuple:
     def __init__(self, dest_addr, last_addr, seq):
@@ -7,6 +10,7 @@ class TopologyTuple:
         self.last_addr = last_addr  # 上一跳/网关节点 (T_last_addr)
         self.seq = seq              # 序列号 (T_seq)
         self.expiration_time = 0    # 过期时间 (T_time)
+        self.provisional = False    # 从热重启快照恢复、尚未被新的 TC 确认
 
 
 # =================【新增：序列号比较逻辑】=================
@@ -33,6 +37,27 @@ class TopologyManager:
         #dest_addr (目标): 被宣告的邻居 IP（即 MPR Selector，接收广播的节点）。
         #last_addr (源/上一跳): 发送 TC 消息的节点 IP（即 MPR，宣告这条链路的节点）。
 
+        # 按源节点建立的索引，避免每收到一个 TC 都遍历整个拓扑集
+        # TC_REDUNDANCY 提高后每个 TC 宣告的邻居变多，拓扑集会成倍增长
+        # 格式: { last_addr: {dest_addr, ...} } 以及 { last_addr: ansn }
+        self.originator_index = {}
+        self.originator_ansn = {}
+
+        # 增量 TC 的基准: 每个源节点最近一次完整 TC 的 ANSN 和邻居集合
+        # 格式: { last_addr: (base_ansn, {dest_addr, ...}) }
+        self.originator_base = {}
+
+    def _remove_tuple(self, key):
+        t_tuple = self.topology_set.pop(key, None)
+        if t_tuple is None:
+            return
+        dests = self.originator_index.get(t_tuple.last_addr)
+        if dests is not None:
+            dests.discard(t_tuple.dest_addr)
+            if not dests:
+                del self.originator_index[t_tuple.last_addr]
+                self.originator_ansn.pop(t_tuple.last_addr, None)
+
     def process_tc_message(self, originator_ip, tc_body, validity_time, current_time):
         """
         处理接收到的 TC 消息，更新拓扑集 (RFC 9.5)
@@ -42,18 +67,8 @@ class TopologyManager:
         # 1. 验证 ANSN (Advertised Neighbor Sequence Number)
         # 我们需要检查是否已经收到过这个 Originator 发来的更新的 TC
         # RFC 规则：如果内存里有比当前包更新的 ANSN，丢弃当前包
-        
-        # 这里的逻辑稍微有点绕：我们需要找到所有 T_last_addr == originator_ip 的记录
-        # 来对比 sequence number。
-        
-        last_known_seq = -1
-        has_entry = False
-        # 遍历查找该源节点的已知最大序列号 (这不是最高效的写法，但最直观)
-        for t_tuple in self.topology_set.values():
-            if t_tuple.last_addr == originator_ip:
-                last_known_seq = t_tuple.seq
-                has_entry = True
-                break # 通常同一个源节点的 seq 是一致的，找到一个就行
+        has_entry = originator_ip in self.originator_ansn
+        last_known_seq = self.originator_ansn.get(originator_ip, -1)
 
         received_seq = tc_body['ansn']
 
@@ -66,37 +81,89 @@ class TopologyManager:
         # 2. 如果收到更新的序列号 (received_seq > last_known_seq)
         # 删除旧的拓扑记录
         if has_entry and is_seq_newer(received_seq, last_known_seq):
-            keys_to_remove = []
-            for key, t_tuple in self.topology_set.items():
-                if t_tuple.last_addr == originator_ip:
-                    keys_to_remove.append(key)
-            for k in keys_to_remove:
-                del self.topology_set[k]
+            for dest_ip in list(self.originator_index.get(originator_ip, ())):
+                self._remove_tuple((dest_ip, originator_ip))
 
         # 3. 添加/更新新的拓扑记录 (RFC 9.5 Rule 4)
         # T_dest_addr = TC 里的邻居 IP
         # T_last_addr = TC 的 Originator
-        # validity_time = TOP_HOLD_TIME # 应该从 Message Header 的 Vtime 获取，这里简化使用常量
-        
-        for neighbor_ip in tc_body['advertised_neighbors']:
+        expiration_time = current_time + validity_time
+        advertised = tc_body['advertised_neighbors']
+        if not advertised:
+            return
+        dests = self.originator_index.setdefault(originator_ip, set())
+        self.originator_ansn[originator_ip] = received_seq
+
+        for neighbor_ip in advertised:
             key = (neighbor_ip, originator_ip)
+            t_tuple = self.topology_set.get(key)
             
-            if key not in self.topology_set:
+            if t_tuple is None:
                 # 创建新记录
                 t_tuple = TopologyTuple(neighbor_ip, originator_ip, received_seq)
                 self.topology_set[key] = t_tuple
-                print(f"[Topology] 新增链路: {originator_ip} -> {neighbor_ip}")
+                dests.add(neighbor_ip)
+                _log.debug("新增链路: %s -> %s", originator_ip, neighbor_ip)
             else:
                 # 更新现有记录
-                t_tuple = self.topology_set[key]
                 t_tuple.seq = received_seq
+                t_tuple.provisional = False
             
             # 刷新过期时间
-            t_tuple.expiration_time = current_time + validity_time
+            t_tuple.expiration_time = expiration_time
+
+    def record_tc_base(self, originator_ip, ansn, advertised_neighbors):
+        """收到完整 TC 时记录增量基准，同一 ANSN 的多个分片合并成一个集合"""
+        base = self.originator_base.get(originator_ip)
+        if base is not None and base[0] == ansn:
+            base[1].update(advertised_neighbors)
+        elif base is None or is_seq_newer(ansn, base[0]):
+            self.originator_base[originator_ip] = (ansn, set(advertised_neighbors))
+
+    def process_tc_delta(self, originator_ip, delta_info, validity_time, current_time):
+        """
+        处理增量 TC: 宣告集合 = Base ANSN 对应的完整集合 + 新增 - 删除，然后按普通 TC 的 ANSN 规则处理
+        :return: 是否成功应用；没有对应的基准 (错过了完整 TC) 时返回 False，由调用方请求完整拓扑
+        """
+        base = self.originator_base.get(originator_ip)
+        if base is None or base[0] != delta_info['base_ansn']:
+            return False
+        advertised = (base[1] | set(delta_info['added'])) - set(delta_info['removed'])
+        self.process_tc_message(
+            originator_ip,
+            {'ansn': delta_info['ansn'], 'advertised_neighbors': sorted(advertised)},
+            validity_time,
+            current_time,
+        )
+        return True
+
+    def get_dump_records(self, current_time):
+        """
+        按源节点导出拓扑集，用于回复 TOPO_REQUEST
+        :return: [(originator_ip, ansn, remaining_validity, [dest_ip, ...]), ...]
+        """
+        records = []
+        for last_addr, dests in self.originator_index.items():
+            remaining = max(self.topology_set[(dest, last_addr)].expiration_time for dest in dests) - current_time
+            if remaining <= 0:
+                continue
+            records.append((last_addr, self.originator_ansn[last_addr], remaining, sorted(dests)))
+        return records
+
+    def restore_tuple(self, dest_addr, last_addr, seq, expiration_time):
+        """从热重启快照恢复拓扑记录，之后按正常的 ANSN 规则被新 TC 确认或替换"""
+        t_tuple = TopologyTuple(dest_addr, last_addr, seq)
+        t_tuple.expiration_time = expiration_time
+        t_tuple.provisional = True
+        self.topology_set[(dest_addr, last_addr)] = t_tuple
+        self.originator_index.setdefault(last_addr, set()).add(dest_addr)
+        self.originator_ansn[last_addr] = seq
 
     def cleanup(self):
         """清理过期拓扑"""
         now = time.time()
         keys_to_remove = [k for k, v in self.topology_set.items() if v.expiration_time < now]
         for k in keys_to_remove:
-            del self.topology_set[k]
\ No newline at end of file
+            self._remove_tuple(k)
+        for originator_ip in [ip for ip in self.originator_base if ip not in self.originator_index]:
+            del self.originator_base[originator_ip]
@@ -16,6 +16,10 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+from olsr_client import ControlClient, NextHopTracker
+from route_events import RouteCache
+from route_shm import RouteTableReader
+
 APP_NAME = "video_forwarder"
 APP_VERSION = 1
 DEFAULT_DATA_PORT = 6200
@@ -38,29 +42,6 @@ class Tee:
             stream.flush()
 
 
-class ControlClient:
-    def __init__(self, control_ip: str = "127.0.0.1", control_port: int = 5100, timeout_sec: float = 3.0):
-        self.control_ip = control_ip
-        self.control_port = int(control_port)
-        self.timeout_sec = float(timeout_sec)
-
-    def send_command(self, command: str) -> str:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            sock.settimeout(self.timeout_sec)
-            sock.sendto(command.encode("utf-8"), (self.control_ip, self.control_port))
-            data, _ = sock.recvfrom(65535)
-            return data.decode("utf-8", errors="ignore")
-        finally:
-            sock.close()
-
-    def discover_route(self, dest_ip: str) -> str:
-        return self.send_command(f"DISCOVER_ROUTE:{dest_ip}")
-
-    def show_route_detail(self, dest_ip: str) -> str:
-        return self.send_command(f"SHOW_ROUTE_DETAIL:{dest_ip}")
-
-
 def file_sha256(path: Path) -> str:
     digest = hashlib.sha256()
     with path.open("rb") as handle:
@@ -104,6 +85,9 @@ class VideoForwarder:
         output_dir: Path,
         route_timeout_sec: float,
         route_poll_interval_sec: float,
+        link_failure_threshold: int = 2,
+        route_reader: RouteTableReader | None = None,
+        route_cache: RouteCache | None = None,
     ):
         self.node_ip = node_ip
         self.data_port = int(data_port)
@@ -111,6 +95,9 @@ class VideoForwarder:
         self.output_dir = output_dir
         self.route_timeout_sec = float(route_timeout_sec)
         self.route_poll_interval_sec = float(route_poll_interval_sec)
+        self.route_reader = route_reader
+        self.route_cache = route_cache
+        self.next_hops = NextHopTracker(control_client, link_failure_threshold, route_cache, self.log)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.bind(("0.0.0.0", self.data_port))
@@ -123,59 +110,92 @@ class VideoForwarder:
 
     def close(self) -> None:
         self._stop_event.set()
+        self.next_hops.close()
+        if self.route_cache is not None:
+            self.route_cache.close()
+        self.control_client.close()
         self.sock.close()
 
     def log(self, text: str) -> None:
         print(f"[{self.node_ip}] {text}", flush=True)
 
-    def send_packet(self, packet: dict[str, Any]) -> None:
+    def send_packet(self, packet: dict[str, Any]) -> str:
         dest_ip = str(packet["dest_ip"])
         next_hop_ip = self.wait_for_route(dest_ip)
         payload = json.dumps(packet, ensure_ascii=True, separators=(",", ":")).encode("utf-8")
-        self.sock.sendto(payload, (next_hop_ip, self.data_port))
+        try:
+            self.sock.sendto(payload, (next_hop_ip, self.data_port))
+        except OSError:
+            self.next_hops.record_delivery(next_hop_ip, False)
+            raise
         self.log(
             f"send kind={packet.get('kind')} transfer_id={packet.get('transfer_id')} "
             f"next_hop={next_hop_ip} final_dest={dest_ip}"
         )
+        return next_hop_ip
 
     def wait_for_route(self, dest_ip: str) -> str:
         stop_at = time.time() + self.route_timeout_sec
-        first_attempt = True
-        while time.time() < stop_at:
-            route = self.query_route(dest_ip)
+        route = self.query_route(dest_ip)
+        while route is None:
+            remaining = stop_at - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"route lookup timeout for {dest_ip}")
+            try:
+                result = self.control_client.wait_route(dest_ip, remaining)
+            except (OSError, RuntimeError, ValueError) as exc:
+                self.log(f"wait route dest={dest_ip} failed: {exc}")
+                time.sleep(self.route_poll_interval_sec)
+                continue
+            route = self.accept_route(dest_ip, result["route"], result.get("table_version"), result.get("epoch"))
             if route is not None:
-                return route.next_hop_ip
-            if first_attempt:
-                self.log(self.control_client.discover_route(dest_ip))
-                first_attempt = False
-            else:
-                self.control_client.discover_route(dest_ip)
-            time.sleep(self.route_poll_interval_sec)
-        raise TimeoutError(f"route lookup timeout for {dest_ip}")
+                self.log(f"route ready dest={dest_ip} next_hop={route.next_hop_ip} waited_ms={result['waited'] * 1000.0:.1f}")
+        return route.next_hop_ip
 
     def query_route(self, dest_ip: str) -> RouteInfo | None:
-        text = self.control_client.show_route_detail(dest_ip)
-        if text.startswith("未找到路由") or text.startswith("非法地址"):
+        if self.route_reader is not None:
+            route = self.route_reader.lookup(dest_ip)
+            if route is not None and route["valid"]:
+                self.next_hops.touch(dest_ip)
+                return RouteInfo(
+                    dest=route["dest"],
+                    next_hop_ip=route["next_hop_ip"],
+                    hop_count=int(route["hop_count"]),
+                    valid=True,
+                    state="VALID",
+                )
+        if self.route_cache is not None:
+            route = self.route_cache.get(dest_ip)
+            if route is not None:
+                self.next_hops.touch(dest_ip)
+                return RouteInfo(
+                    dest=route["dest"],
+                    next_hop_ip=route["next_hop_ip"],
+                    hop_count=int(route["hop_count"]),
+                    valid=True,
+                    state=route["state"],
+                )
+        try:
+            result = self.control_client.lookup([dest_ip])
+        except (RuntimeError, ValueError):
             return None
-        fields: dict[str, str] = {}
-        for line in text.splitlines():
-            if "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            fields[key.strip()] = value.strip()
-        if not fields:
+        return self.accept_route(dest_ip, result["routes"].get(dest_ip), result.get("table_version"), result.get("epoch"))
+
+    def accept_route(
+        self, dest_ip: str, route: dict[str, Any] | None, version: int | None, epoch: float | None
+    ) -> RouteInfo | None:
+        if route is None:
             return None
-        valid = fields.get("valid", "").lower() == "true"
-        state = fields.get("state", "")
-        next_hop_ip = fields.get("next_hop_ip", "")
-        if (not valid) or state != "VALID" or not next_hop_ip:
+        if (not route.get("valid")) or route.get("state") != "VALID" or not route.get("next_hop_ip"):
             return None
+        if self.route_cache is not None:
+            self.route_cache.put(dest_ip, route, version, epoch)
         return RouteInfo(
-            dest=fields.get("dest", dest_ip),
-            next_hop_ip=next_hop_ip,
-            hop_count=int(fields.get("hop_count", "0")),
-            valid=valid,
-            state=state,
+            dest=route.get("dest", dest_ip),
+            next_hop_ip=route["next_hop_ip"],
+            hop_count=int(route.get("hop_count", 0)),
+            valid=True,
+            state=route["state"],
         )
 
     def build_ack_key(self, packet: dict[str, Any]) -> tuple[str, str, int]:
@@ -373,6 +393,8 @@ class FileSender:
         self.ack_timeout_sec = float(ack_timeout_sec)
         self.max_retries = int(max_retries)
         self.transfer_id = uuid.uuid4().hex
+        # ACKs that never came back; the loss may be anywhere on the path, so no next hop is blamed.
+        self.end_to_end_timeouts = 0
 
     def send_with_ack(self, packet: dict[str, Any], ack_for: str, chunk_id: int = -1) -> dict[str, Any]:
         last_error: Exception | None = None
@@ -380,8 +402,14 @@ class FileSender:
             try:
                 ack_queue = self.forwarder.register_ack_waiter(self.transfer_id, ack_for, chunk_id)
                 try:
-                    self.forwarder.send_packet(packet)
-                    ack = ack_queue.get(timeout=self.ack_timeout_sec)
+                    next_hop_ip = self.forwarder.send_packet(packet)
+                    try:
+                        ack = ack_queue.get(timeout=self.ack_timeout_sec)
+                    except queue.Empty:
+                        # send_packet already reports local send failures against the next hop.
+                        self.end_to_end_timeouts += 1
+                        raise
+                    self.forwarder.next_hops.record_delivery(next_hop_ip, True)
                 finally:
                     self.forwarder.pop_ack_waiter(self.transfer_id, ack_for, chunk_id)
                 status = str(ack.get("status", "ok"))
@@ -447,7 +475,7 @@ class FileSender:
             "file_sha256": file_sha,
         }
         ack = self.send_with_ack(eof_packet, "eof")
-        self.forwarder.log(f"send complete transfer_id={self.transfer_id} ack={ack}")
+        self.forwarder.log(f"send complete transfer_id={self.transfer_id} end_to_end_timeouts={self.end_to_end_timeouts} ack={ack}")
 
 
 def parse_args() -> argparse.Namespace:
@@ -456,15 +484,28 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--data-port", type=int, default=DEFAULT_DATA_PORT, help="UDP port used by the file forwarder.")
     parser.add_argument("--control-ip", default="127.0.0.1", help="Local OLSR control endpoint IP.")
     parser.add_argument("--control-port", type=int, default=5100, help="Local OLSR control endpoint port.")
+    parser.add_argument("--control-unix", help="Unix socket of olsr_main.py --control-unix; control requests reuse one connection on it.")
     parser.add_argument("--output-dir", default=str(DEFAULT_OUTPUT_DIR), help="Directory used to store received files.")
     parser.add_argument("--log-file", help="Optional file path used to store forwarder stdout/stderr logs.")
     parser.add_argument("--route-timeout-sec", type=float, default=12.0, help="Max time to wait for a route lookup.")
-    parser.add_argument("--route-poll-interval-sec", type=float, default=0.5, help="Polling interval while waiting for routes.")
+    parser.add_argument("--route-poll-interval-sec", type=float, default=0.5, help="Retry interval when a WAIT_ROUTE request fails.")
+    parser.add_argument("--route-shm", help="Route table file published by olsr_main.py --route-shm; next hops are read from it without a control round trip.")
+    parser.add_argument(
+        "--no-route-cache",
+        action="store_true",
+        help="Do not subscribe to OLSR route changes; every packet looks up its next hop over the control port.",
+    )
     parser.add_argument("--send-file", help="Optional local file path to send after the forwarder starts.")
     parser.add_argument("--dest-ip", help="Destination IP for --send-file.")
     parser.add_argument("--chunk-size", type=int, default=900, help="Raw bytes per chunk before base64.")
     parser.add_argument("--ack-timeout-sec", type=float, default=5.0, help="Ack timeout for each transmitted packet.")
     parser.add_argument("--max-retries", type=int, default=8, help="Max retries per packet when sending a file.")
+    parser.add_argument(
+        "--link-failure-threshold",
+        type=int,
+        default=2,
+        help="Consecutive send/ack failures toward a next hop before asking OLSR to probe it (0 disables).",
+    )
     parser.add_argument("--exit-after-send", action="store_true", help="Exit after --send-file finishes.")
     return parser.parse_args()
 
@@ -488,7 +529,7 @@ def main() -> int:
 
     configure_log_file(args.log_file)
 
-    control_client = ControlClient(control_ip=args.control_ip, control_port=args.control_port)
+    control_client = ControlClient(control_ip=args.control_ip, control_port=args.control_port, unix_path=args.control_unix)
     forwarder = VideoForwarder(
         node_ip=args.node_ip,
         data_port=args.data_port,
@@ -496,6 +537,9 @@ def main() -> int:
         output_dir=Path(args.output_dir).expanduser().resolve(),
         route_timeout_sec=args.route_timeout_sec,
         route_poll_interval_sec=args.route_poll_interval_sec,
+        link_failure_threshold=args.link_failure_threshold,
+        route_reader=RouteTableReader(args.route_shm) if args.route_shm else None,
+        route_cache=None if args.no_route_cache else RouteCache(args.control_ip, args.control_port).start(),
     )
 
     sender_thread: threading.Thread | None = None
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from olsr_main import OLSRNode  # noqa: E402
+
+
+@pytest.fixture
+def node(tmp_path):
+    """绑定临时端口的节点，不启动后台线程；需要的测试自行启动"""
+    olsr_node = OLSRNode("10.0.0.1", port=0, control_port=0, profile_dir=str(tmp_path))
+    yield olsr_node
+    olsr_node.stop()
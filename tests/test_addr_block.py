@@ -0,0 +1,89 @@
+import struct
+
+from addr_block import create_address_block, parse_address_block
+from constants import TC_FLAG_DELTA
+from hello_msg_body import create_hello_body, parse_hello_body
+from tc_msg_body import create_tc_body, create_tc_delta_body, is_compact_tc_body, parse_tc_body, to_plain_tc_body
+
+NEIGHBORS = ["10.0.0.2", "10.0.0.3", "10.0.0.17"]
+HELLO_INFO = {
+    "htime_seconds": 2.0,
+    "willingness": 3,
+    "compact_capable": True,
+    "neighbor_groups": [(6, ["10.0.0.2", "10.0.0.3"]), (10, ["10.0.1.4"])],
+}
+
+
+def test_address_block_round_trip():
+    block = create_address_block(NEIGHBORS)
+    # 公共前缀 10.0.0 只写一次
+    assert len(block) == 3 + 3 + len(NEIGHBORS)
+    assert parse_address_block(b"xx" + block, 2) == (NEIGHBORS, 2 + len(block))
+    assert parse_address_block(create_address_block([])) == ([], 3)
+
+
+def test_address_block_without_common_head():
+    ips = ["10.0.0.1", "192.168.0.1"]
+    block = create_address_block(ips)
+    assert len(block) == 3 + 4 * len(ips)
+    assert parse_address_block(block)[0] == ips
+
+
+def test_truncated_or_invalid_address_block():
+    block = create_address_block(NEIGHBORS)
+    assert parse_address_block(block[:2]) is None
+    assert parse_address_block(block[:-1]) is None
+    assert parse_address_block(struct.pack("!HB", 1, 4) + b"\x0a\x00\x00\x02") is None
+
+
+def test_hello_round_trip_plain_and_compact():
+    plain = create_hello_body(HELLO_INFO)
+    compact = create_hello_body(HELLO_INFO, compact=True)
+    for body in (plain, compact):
+        hello_info = parse_hello_body(body)
+        assert hello_info["willingness"] == 3
+        assert hello_info["compact_capable"] is True
+        assert hello_info["neighbor_groups"] == HELLO_INFO["neighbor_groups"]
+
+
+def test_truncated_compact_hello_keeps_complete_link_messages():
+    body = create_hello_body(HELLO_INFO, compact=True)
+    hello_info = parse_hello_body(body[:-1])
+    assert hello_info["neighbor_groups"] == HELLO_INFO["neighbor_groups"][:1]
+    assert parse_hello_body(body[:3]) is None
+
+
+def test_tc_round_trip_plain_and_compact():
+    for compact in (False, True):
+        body = create_tc_body(41, NEIGHBORS, compact)
+        assert is_compact_tc_body(body) is compact
+        assert parse_tc_body(body) == {"ansn": 41, "delta": False, "advertised_neighbors": NEIGHBORS}
+
+
+def test_delta_tc_round_trip_plain_and_compact():
+    expected = {"ansn": 42, "delta": True, "base_ansn": 40, "added": ["10.0.0.5"], "removed": ["10.0.0.2", "10.0.0.3"]}
+    for compact in (False, True):
+        body = create_tc_delta_body(42, 40, ["10.0.0.5"], ["10.0.0.2", "10.0.0.3"], compact)
+        assert parse_tc_body(body) == expected
+
+
+def test_to_plain_tc_body_keeps_ansn_and_size():
+    plain = to_plain_tc_body(create_tc_body(41, NEIGHBORS, compact=True))
+    assert plain == create_tc_body(41, NEIGHBORS)
+    assert len(plain) == 4 + 4 * len(NEIGHBORS)
+    assert not is_compact_tc_body(plain)
+
+    delta = to_plain_tc_body(create_tc_delta_body(42, 40, ["10.0.0.5"], ["10.0.0.2"], compact=True))
+    assert len(delta) == 8 + 4 * 2
+    assert parse_tc_body(delta)["ansn"] == 42
+    assert parse_tc_body(delta)["base_ansn"] == 40
+
+
+def test_truncated_compact_tc_is_rejected():
+    body = create_tc_body(41, NEIGHBORS, compact=True)
+    assert parse_tc_body(body[:-1]) is None
+    assert to_plain_tc_body(body[:-1]) is None
+    delta = create_tc_delta_body(42, 40, ["10.0.0.5"], ["10.0.0.2"], compact=True)
+    assert parse_tc_body(delta[:-1]) is None
+    # 新增个数超过地址块中的地址数
+    assert parse_tc_body(struct.pack("!HHHH", 42, TC_FLAG_DELTA, 40, 3) + create_address_block(["10.0.0.5"])) is None
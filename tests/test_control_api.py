@@ -0,0 +1,56 @@
+import json
+import time
+
+from constants import CONTROL_API_VERSION
+from olsr_control_api import process_json_command
+
+NEIGHBOR = "10.0.0.2"
+
+
+def _request(node, request):
+    with node.lock:
+        return json.loads(process_json_command(node, json.dumps(dict(request, v=CONTROL_API_VERSION))))
+
+
+def _connect_neighbor(node):
+    node.link_set.restore_link(NEIGHBOR, True, 30.0, time.time())
+    node.neighbor_manager.update_neighbor_status(NEIGHBOR, 3, True)
+    node.routing_manager.recalculate_routing_table()
+
+
+def test_not_modified_needs_matching_epoch(node):
+    _connect_neighbor(node)
+    first = _request(node, {"cmd": "routes"})
+    assert first["epoch"] == node.started_at
+    version = first["table_version"]
+
+    same = _request(node, {"cmd": "routes", "if_changed_since": version, "epoch": first["epoch"]})
+    assert same["not_modified"] is True
+
+    # 重启后的守护进程版本号从 0 重新计数，旧 epoch 下的同一版本号不能当作未变化
+    restarted = _request(node, {"cmd": "routes", "if_changed_since": version, "epoch": first["epoch"] - 60.0})
+    assert "not_modified" not in restarted
+    assert restarted["result"]["rows"]
+
+    missing = _request(node, {"cmd": "routes", "if_changed_since": version})
+    assert missing["ok"] is False
+
+
+def test_not_modified_lookup_still_marks_route_active(node):
+    _connect_neighbor(node)
+    first = _request(node, {"cmd": "lookup", "dests": [NEIGHBOR]})
+    node.active_next_hops.clear()
+
+    response = _request(
+        node,
+        {"cmd": "lookup", "dests": [NEIGHBOR], "if_changed_since": first["table_version"], "epoch": first["epoch"]},
+    )
+    assert response["not_modified"] is True
+    assert NEIGHBOR in node.active_next_hops
+
+
+def test_old_api_version_is_rejected(node):
+    with node.lock:
+        response = json.loads(process_json_command(node, json.dumps({"v": 1, "cmd": "routes"})))
+    assert response["ok"] is False
+    assert response["epoch"] == node.started_at
@@ -0,0 +1,58 @@
+import time
+
+from constants import MAX_MESSAGE_BODY
+from tc_msg_body import create_tc_bodies, create_tc_delta_body, parse_tc_body
+from topo_sync_body import create_topo_dump_bodies
+
+ORIGINATOR = "10.0.0.9"
+NEIGHBOR = "10.0.0.2"
+
+
+def _delta(ansn, base_ansn, added, removed):
+    return parse_tc_body(create_tc_delta_body(ansn, base_ansn, added, removed))
+
+
+def _advertised(node, originator_ip):
+    return sorted(node.topology_manager.originator_index.get(originator_ip, ()))
+
+
+def test_delta_after_gap_is_accepted_once_dump_resyncs(node):
+    node.link_set.restore_link(NEIGHBOR, True, 30.0, time.time())
+
+    # 错过了 ANSN 5 的完整 TC，增量找不到基准
+    node.process_tc(ORIGINATOR, _delta(6, 5, ["10.0.0.13"], []), 30.0, NEIGHBOR)
+    assert _advertised(node, ORIGINATOR) == []
+    assert node.tc_gap_requests == 1
+
+    # 邻居回复的拓扑集记录了 ANSN 5 的完整集合，同时成为增量基准
+    for body in create_topo_dump_bodies([(ORIGINATOR, 5, 30.0, ["10.0.0.11", "10.0.0.12"])], MAX_MESSAGE_BODY):
+        node.process_topology_dump(NEIGHBOR, body)
+    assert _advertised(node, ORIGINATOR) == ["10.0.0.11", "10.0.0.12"]
+
+    node.process_tc(ORIGINATOR, _delta(6, 5, ["10.0.0.13"], ["10.0.0.11"]), 30.0, NEIGHBOR)
+    assert _advertised(node, ORIGINATOR) == ["10.0.0.12", "10.0.0.13"]
+    assert node.tc_gap_requests == 1
+
+
+def test_stale_dump_record_does_not_replace_base(node):
+    node.link_set.restore_link(NEIGHBOR, True, 30.0, time.time())
+    for body in create_tc_bodies(7, ["10.0.0.11"], MAX_MESSAGE_BODY):
+        node.process_tc(ORIGINATOR, parse_tc_body(body), 30.0, NEIGHBOR)
+    for body in create_topo_dump_bodies([(ORIGINATOR, 6, 30.0, ["10.0.0.12"])], MAX_MESSAGE_BODY):
+        node.process_topology_dump(NEIGHBOR, body)
+    assert node.topology_manager.originator_base[ORIGINATOR] == (7, {"10.0.0.11"})
+
+
+def test_delta_not_sent_beyond_ttl_of_its_base(node):
+    node.delta_tc = True
+    neighbors = [f"10.0.1.{index}" for index in range(1, 11)]
+    node.build_tc_bodies(neighbors, 2)
+    assert node.tc_full_sent == 1
+    node.ansn += 1
+    # TTL 2 发出的基准到不了 4 跳之外，TTL 4 的轮次发完整 TC
+    node.build_tc_bodies(neighbors[1:], 4)
+    assert (node.tc_full_sent, node.tc_delta_sent) == (2, 0)
+    node.ansn += 1
+    bodies = node.build_tc_bodies(neighbors[2:], 2)
+    assert (node.tc_full_sent, node.tc_delta_sent) == (2, 1)
+    assert parse_tc_body(bodies[0])["base_ansn"] == 1
@@ -0,0 +1,82 @@
+import json
+import socket
+import threading
+import time
+
+from olsr_client import ControlClient, NextHopTracker
+
+
+class FakeDaemon:
+    """Answers every control request on a local UDP port and keeps what it received."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.requests = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                data, addr = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            text = data.decode("utf-8")
+            self.requests.append(json.loads(text) if text.startswith("{") else text)
+            self.sock.sendto(b'{"ok":true,"table_version":1,"epoch":1.0,"result":{"routes":{}}}', addr)
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.sock.close()
+
+
+class FakeCache:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate_next_hop(self, next_hop_ip):
+        self.invalidated.append(next_hop_ip)
+
+
+def test_touched_routes_are_refreshed_in_one_batch():
+    daemon = FakeDaemon()
+    client = ControlClient("127.0.0.1", daemon.port, timeout_sec=1.0)
+    tracker = NextHopTracker(client, refresh_interval_sec=0.05)
+    try:
+        for _ in range(100):
+            tracker.touch("10.0.0.3")
+            tracker.touch("10.0.0.2")
+        deadline = time.time() + 2.0
+        while not daemon.requests and time.time() < deadline:
+            time.sleep(0.01)
+        tracker.close()
+    finally:
+        client.close()
+        daemon.close()
+    lookups = [request for request in daemon.requests if isinstance(request, dict)]
+    assert lookups == [{"cmd": "lookup", "dests": ["10.0.0.2", "10.0.0.3"], "v": 2}]
+
+
+def test_failures_are_reported_at_the_threshold():
+    daemon = FakeDaemon()
+    client = ControlClient("127.0.0.1", daemon.port, timeout_sec=1.0)
+    cache = FakeCache()
+    tracker = NextHopTracker(client, link_failure_threshold=2, route_cache=cache)
+    try:
+        tracker.record_delivery("10.0.0.2", False)
+        tracker.record_delivery("10.0.0.2", True)
+        tracker.record_delivery("10.0.0.2", False)
+        assert tracker.link_failure_reports == 0
+        tracker.record_delivery("10.0.0.2", False)
+        assert tracker.link_failure_reports == 1
+    finally:
+        tracker.close()
+        client.close()
+        daemon.close()
+    assert cache.invalidated == ["10.0.0.2"]
+    assert daemon.requests == ["REPORT_LINK_FAILURE:10.0.0.2"]
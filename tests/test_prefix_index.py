@@ -0,0 +1,63 @@
+import time
+
+from prefix_index import PrefixIndex
+
+NEIGHBOR = "10.0.0.2"
+
+
+def _route(dest, next_hop):
+    return {"dest": dest, "next_hop_ip": next_hop, "hop_count": 1, "valid": True}
+
+
+def test_sync_writes_only_changed_entries():
+    index = PrefixIndex()
+    old_entries = {
+        ("10.0.0.2", 32): _route("10.0.0.2", "10.0.0.2"),
+        ("10.0.0.3", 32): _route("10.0.0.3", "10.0.0.2"),
+        ("192.168.1.0", 24): _route("192.168.1.0/24", "10.0.0.2"),
+    }
+    assert index.sync({}, old_entries) == (3, 0)
+
+    # 重算生成的是新字典，内容相同的不重写
+    same_entries = {key: dict(route) for key, route in old_entries.items()}
+    assert index.sync(old_entries, same_entries) == (0, 0)
+
+    new_entries = {key: dict(route) for key, route in same_entries.items()}
+    new_entries[("10.0.0.3", 32)]["next_hop_ip"] = "10.0.0.4"
+    del new_entries[("192.168.1.0", 24)]
+    assert index.sync(same_entries, new_entries) == (1, 1)
+    assert index.lookup("10.0.0.3")["next_hop_ip"] == "10.0.0.4"
+    assert index.lookup("192.168.1.7") is None
+
+
+def _connect_neighbor(node):
+    node.link_set.restore_link(NEIGHBOR, True, 30.0, time.time())
+    node.neighbor_manager.update_neighbor_status(NEIGHBOR, 3, True)
+
+
+def test_unchanged_recalculation_does_not_rewrite_index(node):
+    _connect_neighbor(node)
+    node.hna_manager.process_hna_message(NEIGHBOR, {"networks": [("192.168.1.0", 24)]}, 30.0, time.time())
+    routing_manager = node.routing_manager
+    routing_manager.recalculate_routing_table()
+
+    counts = []
+    sync = routing_manager.route_index.sync
+    routing_manager.route_index.sync = lambda old, new: counts.append(sync(old, new))
+    routing_manager.recalculate_routing_table()
+    routing_manager.recalculate_routing_table()
+    assert counts == [(0, 0), (0, 0)]
+
+
+def test_host_route_wins_over_hna_host_prefix(node):
+    _connect_neighbor(node)
+    gateway = "10.0.0.9"
+    node.topology_manager.process_tc_message(NEIGHBOR, {"ansn": 1, "advertised_neighbors": [gateway]}, 30.0, time.time())
+    # 网关把邻居的地址作为 /32 网段宣告，邻居本身的主机路由仍然直达
+    node.hna_manager.process_hna_message(gateway, {"networks": [(NEIGHBOR, 32)]}, 30.0, time.time())
+    node.routing_manager.recalculate_routing_table()
+
+    route = node.routing_manager.lookup_route(NEIGHBOR)
+    assert route["dest"] == NEIGHBOR
+    assert route["hop_count"] == 1
+    assert node.routing_manager.index_entries[(NEIGHBOR, 32)] is node.routing_manager.routing_table[NEIGHBOR]
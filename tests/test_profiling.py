@@ -0,0 +1,27 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from olsr_profiling import NodeProfiler
+
+
+def test_failed_snapshot_clears_pending_and_keeps_previous(tmp_path, monkeypatch):
+    profiler = NodeProfiler("10.0.0.1", threading.RLock(), str(tmp_path))
+    previous = object()
+    profiler.last_tracemalloc = previous
+    # snapshot_tracemalloc 已经把新路径记为下一次的比较对象
+    new_path = str(tmp_path / "new.tracemalloc")
+    profiler.last_tracemalloc_path = new_path
+    profiler.snapshot_pending = True
+
+    def fail():
+        raise MemoryError
+
+    monkeypatch.setattr(tracemalloc, "take_snapshot", fail)
+    monkeypatch.setattr(tracemalloc, "is_tracing", lambda: True)
+    with pytest.raises(MemoryError):
+        profiler._write_tracemalloc(new_path, str(tmp_path / "new.txt"), previous, "previous.tracemalloc")
+    assert profiler.snapshot_pending is False
+    assert profiler.last_tracemalloc is previous
+    assert profiler.last_tracemalloc_path == "previous.tracemalloc"
@@ -0,0 +1,30 @@
+from route_events import RouteCache
+
+ROUTE = {"dest": "10.0.0.3", "next_hop_ip": "10.0.0.2", "hop_count": 2, "valid": True, "state": "VALID"}
+
+
+def _subscribed_cache(epoch, version):
+    cache = RouteCache("127.0.0.1", 9)
+    cache.on_subscribed({"epoch": epoch, "version": version, "lease": cache.lease})
+    return cache
+
+
+def test_put_keeps_lookup_from_same_epoch():
+    cache = _subscribed_cache(100.0, 5)
+    try:
+        cache.put("10.0.0.3", ROUTE, 5, 100.0)
+        assert cache.get("10.0.0.3") == ROUTE
+    finally:
+        cache.close()
+
+
+def test_put_drops_stale_version_and_other_epoch():
+    cache = _subscribed_cache(100.0, 5)
+    try:
+        cache.put("10.0.0.3", ROUTE, 4, 100.0)
+        assert cache.get("10.0.0.3") is None
+        # 重启后的守护进程版本号从 0 重新计数，较大的版本号也不代表更新
+        cache.put("10.0.0.3", ROUTE, 50, 200.0)
+        assert cache.get("10.0.0.3") is None
+    finally:
+        cache.close()
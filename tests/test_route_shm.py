@@ -0,0 +1,116 @@
+import struct
+import time
+
+from route_shm import SEQ_OFFSET, RouteTableExporter, RouteTableReader
+
+
+def _route(dest, next_hop, hop_count=2, provisional=False):
+    return {
+        "dest": dest,
+        "next_hop_ip": next_hop,
+        "hop_count": hop_count,
+        "distance": float(hop_count),
+        "valid": True,
+        "provisional": provisional,
+    }
+
+
+def test_publish_and_longest_prefix_lookup(tmp_path):
+    path = str(tmp_path / "routes.shm")
+    exporter = RouteTableExporter(path, 16)
+    reader = RouteTableReader(path)
+    exporter.publish(
+        {
+            ("10.0.0.5", 32): _route("10.0.0.5", "10.0.0.2", provisional=True),
+            ("192.168.1.0", 24): _route("192.168.1.0/24", "10.0.0.3", 3),
+        },
+        7,
+    )
+
+    route = reader.lookup("10.0.0.5")
+    assert route["next_hop_ip"] == "10.0.0.2"
+    assert route["provisional"] is True
+    assert reader.lookup("192.168.1.77")["next_hop_ip"] == "10.0.0.3"
+    assert reader.lookup("172.16.0.1") is None
+    assert reader.table_version == 7
+    assert exporter.seq % 2 == 0
+
+    exporter.close()
+    assert reader.lookup("10.0.0.5") is None
+    reader.close()
+
+
+def test_reader_ignores_header_written_mid_update(tmp_path):
+    path = str(tmp_path / "routes.shm")
+    exporter = RouteTableExporter(path, 16)
+    reader = RouteTableReader(path)
+    exporter.publish({("10.0.0.5", 32): _route("10.0.0.5", "10.0.0.2")}, 1)
+    assert reader.lookup("10.0.0.5")["next_hop_ip"] == "10.0.0.2"
+
+    # 写者停在一次更新中间: Seq 为奇数，Count 和 TableVersion 已经是新值
+    exporter._begin_write()
+    exporter._write_header(0, 0, 2, 0.0, 0.0)
+    assert reader.lookup("10.0.0.5")["next_hop_ip"] == "10.0.0.2"
+    assert reader.table_version == 1
+
+    exporter._end_write(0, 0, 2)
+    assert reader.lookup("10.0.0.5") is None
+    assert reader.table_version == 2
+    exporter.close()
+    reader.close()
+
+
+def test_header_fields_written_while_seq_is_odd(tmp_path):
+    exporter = RouteTableExporter(str(tmp_path / "routes.shm"), 16)
+    seen = []
+    write_header = exporter._write_header
+
+    def record(*args):
+        seen.append(struct.unpack_from("<Q", exporter.mm, SEQ_OFFSET)[0])
+        write_header(*args)
+
+    exporter._write_header = record
+    exporter.publish({("10.0.0.5", 32): _route("10.0.0.5", "10.0.0.2")}, 1)
+    exporter.close()
+    assert seen and all(seq % 2 == 1 for seq in seen)
+
+
+def test_restarted_exporter_continues_seq(tmp_path):
+    path = str(tmp_path / "routes.shm")
+    exporter = RouteTableExporter(path, 16)
+    exporter.publish({("10.0.0.5", 32): _route("10.0.0.5", "10.0.0.2")}, 1)
+    reader = RouteTableReader(path)
+    assert reader.lookup("10.0.0.5") is not None
+    cached_seq = reader.cached_seq
+    # 没有 close() 就退出 (例如被 SIGKILL)，重启后写入同样多次也不能回到读者缓存的 Seq
+    restarted = RouteTableExporter(path, 16)
+    assert restarted.seq > cached_seq
+    restarted.publish({("10.0.0.6", 32): _route("10.0.0.6", "10.0.0.3")}, 1)
+    assert reader.lookup("10.0.0.5") is None
+    assert reader.lookup("10.0.0.6")["next_hop_ip"] == "10.0.0.3"
+    restarted.close()
+    reader.close()
+
+
+def test_reader_falls_back_when_heartbeat_stops(tmp_path):
+    path = str(tmp_path / "routes.shm")
+    exporter = RouteTableExporter(path, 16)
+    exporter.publish({("10.0.0.5", 32): _route("10.0.0.5", "10.0.0.2")}, 1)
+    reader = RouteTableReader(path, stale_after=0.2)
+    assert reader.lookup("10.0.0.5") is not None
+    index = reader.index
+
+    # 心跳只换 Seq，不重新解析条目
+    exporter.heartbeat()
+    assert reader.lookup("10.0.0.5") is not None
+    assert reader.index is index
+    assert reader.table_version == 1
+
+    # 守护进程被杀死: 没有 CLOSED 标志，心跳不再更新
+    time.sleep(0.3)
+    assert not reader.available()
+    assert reader.lookup("10.0.0.5") is None
+    exporter.heartbeat()
+    assert reader.lookup("10.0.0.5") is not None
+    exporter.close()
+    reader.close()
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from constants import NEIGHB_HOLD_TIME, SNAPSHOT_SEQ_MARGIN, TOP_HOLD_TIME
+from olsr_main import OLSRNode
+from state_snapshot import build_snapshot, restore_snapshot
+
+NEIGHBOR = "10.0.0.2"
+REMOTE = "10.0.0.9"
+
+
+@pytest.fixture
+def restarted(tmp_path):
+    olsr_node = OLSRNode("10.0.0.1", port=0, control_port=0, profile_dir=str(tmp_path))
+    yield olsr_node
+    olsr_node.stop()
+
+
+def _snapshot(node, age):
+    node.link_set.restore_link(NEIGHBOR, True, 30.0, time.time())
+    node.neighbor_manager.update_neighbor_status(NEIGHBOR, 3, True)
+    node.topology_manager.process_tc_message(NEIGHBOR, {"ansn": 1, "advertised_neighbors": [REMOTE]}, 30.0, time.time())
+    node.msg_seq_num = 40
+    snapshot = build_snapshot(node)
+    snapshot["saved_at"] -= age
+    return snapshot
+
+
+def test_hold_times_are_reduced_by_snapshot_age(node, restarted):
+    assert restore_snapshot(restarted, _snapshot(node, 2.0))
+    now = time.time()
+    link = restarted.link_set.links[NEIGHBOR]
+    assert link.l_sym_time == pytest.approx(now + NEIGHB_HOLD_TIME - 2.0, abs=0.5)
+    t_tuple = restarted.topology_manager.topology_set[(REMOTE, NEIGHBOR)]
+    assert t_tuple.expiration_time == pytest.approx(now + TOP_HOLD_TIME - 2.0, abs=0.5)
+    assert restarted.routing_manager.lookup_route(REMOTE)["next_hop_ip"] == NEIGHBOR
+
+
+def test_expired_records_are_not_restored(node, restarted):
+    assert restore_snapshot(restarted, _snapshot(node, NEIGHB_HOLD_TIME + 1.0))
+    assert NEIGHBOR not in restarted.link_set.links
+    assert (REMOTE, NEIGHBOR) in restarted.topology_manager.topology_set
+    assert restarted.routing_manager.lookup_route(REMOTE) is None
+
+
+def test_stale_snapshot_only_restores_sequence_numbers(node, restarted):
+    assert not restore_snapshot(restarted, _snapshot(node, 3600.0))
+    assert restarted.link_set.links == {}
+    assert restarted.topology_manager.topology_set == {}
+    assert restarted.msg_seq_num == 40 + SNAPSHOT_SEQ_MARGIN
@@ -0,0 +1,48 @@
+import struct
+
+from pkt_msg_fmt import decode_mantissa
+from tc_msg_body import parse_tc_body
+
+
+def _capture_tcs(node, monkeypatch, advertised):
+    sent = []
+    monkeypatch.setattr(node, "get_advertised_neighbors", lambda: list(advertised))
+    monkeypatch.setattr(node, "send_own_message", sent.append)
+    return sent
+
+
+def _decode(message):
+    _, vtime, _, _, ttl, _, _ = struct.unpack("!BBH4sBBH", message[:12])
+    return ttl, decode_mantissa(vtime), parse_tc_body(message[12:])
+
+
+def test_only_max_ttl_round_extends_vtime(node, monkeypatch):
+    node.tc_ttl_cycle = (2, 4, 255)
+    sent = _capture_tcs(node, monkeypatch, ["10.0.0.2"])
+    for _ in node.tc_ttl_cycle:
+        node.generate_and_send_tc(5)
+    hold_time = node.tc_schedule.hold_time(5)
+    vtimes = {ttl: vtime for ttl, vtime, _ in map(_decode, sent)}
+    # 8-bit 浮点编码有舍入误差
+    assert abs(vtimes[2] - hold_time) < 0.1 * hold_time
+    assert abs(vtimes[4] - hold_time) < 0.1 * hold_time
+    assert abs(vtimes[255] - 3 * hold_time) < 0.1 * 3 * hold_time
+
+
+def test_empty_tcs_continue_for_one_hold_time(node, monkeypatch):
+    advertised = ["10.0.0.2"]
+    sent = _capture_tcs(node, monkeypatch, advertised)
+    node.generate_and_send_tc(5)
+    full_ansn = _decode(sent[-1])[2]["ansn"]
+
+    advertised.clear()
+    node.generate_and_send_tc(5)
+    node.generate_and_send_tc(5)
+    assert len(sent) == 3
+    _, _, empty_tc = _decode(sent[-1])
+    assert empty_tc["advertised_neighbors"] == []
+    assert empty_tc["ansn"] == (full_ansn + 1) % 65535
+
+    node.tc_empty_until = 0.0
+    node.generate_and_send_tc(5)
+    assert len(sent) == 3
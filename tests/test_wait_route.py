@@ -0,0 +1,43 @@
+import json
+import socket
+import threading
+
+from olsr_control import process_control_command
+from olsr_control_api import process_json_command
+
+
+def _json(node, request, addr):
+    with node.lock:
+        return json.loads(process_json_command(node, json.dumps(request), addr))
+
+
+def test_text_wait_route_rejects_non_positive_timeout(node):
+    addr = ("127.0.0.1", 9)
+    with node.lock:
+        assert process_control_command(node, "WAIT_ROUTE:10.0.0.9,0", addr) == "非法超时：0"
+        assert process_control_command(node, "WAIT_ROUTE:10.0.0.9,-1", addr) == "非法超时：-1"
+    assert node.route_waits.waits == []
+
+
+def test_json_wait_route_rejects_non_positive_timeout(node):
+    addr = ("127.0.0.1", 9)
+    for timeout in (0, 0.0, -2, True):
+        response = _json(node, {"cmd": "wait_route", "dest": "10.0.0.9", "timeout": timeout}, addr)
+        assert response["ok"] is False
+        assert "invalid timeout" in response["error"]
+    assert node.route_waits.waits == []
+
+
+def test_short_wait_route_times_out_without_killing_loop(node):
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(("127.0.0.1", 0))
+    client.settimeout(2.0)
+    threading.Thread(target=node.loop_route_waits, daemon=True).start()
+    try:
+        for _ in range(2):
+            with node.lock:
+                assert process_control_command(node, "WAIT_ROUTE:10.0.0.9,0.001", client.getsockname()) is None
+            data, _ = client.recvfrom(4096)
+            assert data.decode("utf-8").startswith("等待路由超时：10.0.0.9")
+    finally:
+        client.close()
@@ -24,6 +24,7 @@ TOPOLOGY_FILE = Path(__file__).resolve().parents[1] / "configs" / "mininet_wifi_
 VIDEO_DATA_PORT = 6200
 BENCH_DATA_PORT = 6300
 BENCH_RESULTS_DIR = Path(__file__).resolve().parents[1] / "logs" / "overlay_bench_results"
+CONTROL_API_VERSION = 2
 
 
 def load_topology() -> dict:
@@ -65,20 +66,30 @@ def send_control(node, command: str, timeout_sec: float = 3.0, port: int = 5100)
         "sock=socket.socket(socket.AF_INET, socket.SOCK_DGRAM); "
         f"sock.settimeout({timeout_sec}); "
         f"sock.sendto({command!r}.encode('utf-8'), ('127.0.0.1', {port})); "
-        "data,_=sock.recvfrom(8192); "
+        "data,_=sock.recvfrom(65535); "
         "print(data.decode('utf-8', 'ignore'))"
     )
     return run_cmd(node, f"python3 -c {shlex.quote(script)}")
 
 
-def parse_key_value_lines(text: str) -> dict[str, str]:
-    result: dict[str, str] = {}
-    for line in text.splitlines():
-        if "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        result[key.strip()] = value.strip()
-    return result
+def send_control_json(node, payload: dict, timeout_sec: float = 3.0, port: int = 5100) -> dict:
+    request = dict(payload, v=CONTROL_API_VERSION)
+    text = send_control(node, json.dumps(request, separators=(",", ":")), timeout_sec=timeout_sec, port=port)
+    try:
+        response = json.loads(text)
+    except ValueError as exc:
+        raise RuntimeError(f"invalid control response from {node.name}: {text!r}") from exc
+    if not response.get("ok"):
+        raise RuntimeError(f"control request failed on {node.name}: {response.get('error')}")
+    return response["result"]
+
+
+def route_shm_path(node_name: str) -> str:
+    return f"/dev/shm/olsr-routes-{node_name}"
+
+
+def control_unix_path(node_name: str) -> str:
+    return f"/tmp/olsr-control-{node_name}.sock"
 
 
 def start_olsr(node, repo_root: Path) -> None:
@@ -90,7 +101,7 @@ def start_olsr(node, repo_root: Path) -> None:
     cmd = (
         f"cd {repo_text} && "
         f"PYTHONPATH={src_text} "
-        f"nohup python3 -u src/olsr_main.py {node.IP()} > {log_text} 2>&1 &"
+        f"nohup python3 -u src/olsr_main.py {node.IP()} --route-shm {route_shm_path(node.name)} --control-unix {control_unix_path(node.name)} > {log_text} 2>&1 &"
     )
     node.cmd(cmd)
 
@@ -113,7 +124,8 @@ def start_video_forwarder(
     log_text = shlex.quote(str(log_dir / f"{node.name}-video_forwarder.log"))
     cmd_parts = [
         f"cd {repo_text}",
-        f"PYTHONPATH={src_text} nohup python3 src/video_forwarder.py --node-ip {node_ip} --data-port {int(data_port)}",
+        f"PYTHONPATH={src_text} nohup python3 src/video_forwarder.py --node-ip {node_ip} --data-port {int(data_port)} "
+        f"--route-shm {route_shm_path(node.name)} --control-unix {control_unix_path(node.name)}",
     ]
     if output_dir is not None:
         output_dir.mkdir(parents=True, exist_ok=True)
@@ -136,7 +148,7 @@ def start_overlay_bench_daemon(node, node_ip: str, repo_root: Path, data_port: i
         f"cd {repo_text} && "
         f"PYTHONPATH={src_text} "
         f"nohup python3 src/overlay_bench.py daemon --node-ip {node_ip} --data-port {int(data_port)} "
-        f"--quiet --log-file {log_text} > /dev/null 2>&1 &"
+        f"--route-shm {route_shm_path(node.name)} --control-unix {control_unix_path(node.name)} --quiet --log-file {log_text} > /dev/null 2>&1 &"
     )
     node.cmd(cmd)
 
@@ -178,13 +190,11 @@ def resolve_overlay_path(stations_by_name: dict[str, object], topology: dict, so
     visited = {source_ip}
 
     while current_ip != dest_ip:
-        detail = send_control(stations_by_name[current_name], f"SHOW_ROUTE_DETAIL:{dest_ip}")
-        fields = parse_key_value_lines(detail)
-        next_hop_ip = fields.get("next_hop_ip", "")
-        valid = fields.get("valid", "").lower() == "true"
-        state = fields.get("state", "")
-        if (not next_hop_ip) or (not valid) or state != "VALID":
-            raise RuntimeError(f"path resolution failed at {current_name}: {detail}")
+        result = send_control_json(stations_by_name[current_name], {"cmd": "lookup", "dests": [dest_ip]})
+        route = result["routes"].get(dest_ip) or {}
+        next_hop_ip = route.get("next_hop_ip", "")
+        if (not next_hop_ip) or (not route.get("valid")) or route.get("state") != "VALID":
+            raise RuntimeError(f"path resolution failed at {current_name}: {route}")
         if next_hop_ip in visited:
             raise RuntimeError(f"path resolution loop detected at next_hop={next_hop_ip}")
         path.append(next_hop_ip)
@@ -220,6 +230,33 @@ def print_node_state(node) -> None:
     info(send_control(node, "SHOW_ROUTE") + "\n")
 
 
+CONTROL_STAT_KEYS = (
+    "control_tx_packets",
+    "control_tx_bytes",
+    "control_rx_packets",
+    "control_rx_bytes",
+    "control_forwarded_messages",
+)
+
+
+def collect_control_stats(stations) -> dict:
+    """Sum the control-traffic counters over all stations; stations that do not answer are listed in missing_stations."""
+    totals: dict = {key: 0 for key in CONTROL_STAT_KEYS}
+    missing = []
+    for sta in stations:
+        try:
+            fields = send_control_json(sta, {"cmd": "status"})
+            counters = {key: int(fields.get(key, 0)) for key in CONTROL_STAT_KEYS}
+        except (RuntimeError, TypeError, ValueError) as exc:
+            info(f"[{sta.name}] control stats unavailable: {exc}\n")
+            missing.append(sta.name)
+            continue
+        for key, value in counters.items():
+            totals[key] += value
+    totals["missing_stations"] = missing
+    return totals
+
+
 def apply_link_loss(stations, loss_percent: float) -> None:
     if loss_percent <= 0:
         return
@@ -358,7 +395,8 @@ def prepare_overlay_bench(
         f"cd {shlex.quote(str(repo_root))} && "
         f"PYTHONPATH={shlex.quote(str(repo_root / 'src'))} "
         f"python3 src/overlay_bench.py route --node-ip {source_ip_of(topology, source_name)} "
-        f"--dest-ip {dest_ip} --data-port {int(data_port)} --quiet --json"
+        f"--dest-ip {dest_ip} --data-port {int(data_port)} --route-shm {route_shm_path(source_name)} "
+        f"--control-unix {control_unix_path(source_name)} --quiet --json"
     )
     route_result = json.loads(run_cmd(source_node, route_cmd))
 
@@ -390,7 +428,8 @@ def run_overlay_throughput_bench(
         f"--payload-size {int(payload_size)} --interval-ms {float(interval_ms)} "
         f"--report-timeout-sec {float(report_timeout_sec)} "
         f"--path {shlex.quote(','.join(resolved_path))} "
-        f"--quiet --json"
+        f"--route-shm {route_shm_path(source_name)} "
+        f"--control-unix {control_unix_path(source_name)} --quiet --json"
     )
     return json.loads(run_cmd(source_node, throughput_cmd))
 
@@ -454,7 +493,8 @@ def run_overlay_latency_bench(
         f"--payload-size {int(payload_size)} --interval-ms {float(interval_ms)} "
         f"--reply-timeout-sec {float(reply_timeout_sec)} "
         f"--path {shlex.quote(','.join(resolved_path))} "
-        f"--quiet --json"
+        f"--route-shm {route_shm_path(source_name)} "
+        f"--control-unix {control_unix_path(source_name)} --quiet --json"
     )
     return json.loads(run_cmd(source_node, latency_cmd))
 
@@ -13,6 +13,7 @@ from mininet_wifi_complex_12sta import (
     BENCH_DATA_PORT,
     apply_link_loss,
     build_topology,
+    collect_control_stats,
     load_topology,
     run_overlay_bench,
     source_ip_of,
@@ -231,6 +232,7 @@ def run_single_loss_case(
             interval_ms=args.bench_interval_ms,
             report_timeout_sec=args.bench_report_timeout_sec,
         )
+        control_stats = collect_control_stats(stations)
 
         return {
             "loss_percent": loss_percent,
@@ -248,6 +250,7 @@ def run_single_loss_case(
             "pdr": throughput_result.get("pdr"),
             "offered_load_mbps": throughput_result.get("offered_load_mbps"),
             "goodput_mbps": throughput_result.get("goodput_mbps"),
+            "control_stats": control_stats,
             "route_result": route_result,
             "throughput_result": throughput_result,
         }